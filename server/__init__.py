@@ -1,6 +1,9 @@
 from flask import Flask
 from flask_cors import CORS
 from server.database import init_app_database
+from server.metrics import init_app_metrics
+from server.scheduler import init_app_scheduler
+from server.timing import init_app_timing
 
 from server.routes import routes
 
@@ -18,11 +21,20 @@ def create_app():
     # register CORS
     CORS(app)
 
+    # request metrics and GET /metrics, see src/common/metrics.py
+    init_app_metrics(app)
+
+    # per-stage timings, see src/common/timing.py
+    init_app_timing(app)
+
     # register database
     init_app_database(app)
     for route in routes:
         app.register_blueprint(route)
 
+    # precompute the predictions in the background, if enabled
+    init_app_scheduler(app)
+
     # test connection
     app.route("/ok")(lambda: "OK")
     return app
@@ -1,26 +1,51 @@
-import mariadb
+import time
+from datetime import datetime, timedelta
 
-from flask import current_app, g
+import click
+from flask import current_app, g, request
+from flask.cli import with_appcontext
+
+from src.common.metrics import DB_CONNECT_SECONDS, DB_CONNECTS
+from src.storage import MariaDBStorage, SQLiteStorage
 
 
 def _connect_to_database():
-    """establish and return a connection object"""
+    """establish and return a storage object wrapping the connection"""
+    backend = current_app.config.get("DATABASE_BACKEND", "mariadb")
+    start = time.perf_counter()
     try:
-        conn = mariadb.connect(
-            user=current_app.config["MARIADB_USER"],
-            password=current_app.config["MARIADB_PASSWORD"],
-            host=current_app.config["MARIADB_HOST"],
-            port=current_app.config["MARIADB_PORT"],
-            database=current_app.config["MARIADB_DATABASE"],
-        )
-    except mariadb.Error as e:
+        if backend == "sqlite":
+            conn = SQLiteStorage.connect(current_app.config["SQLITE_PATH"])
+        else:
+            conn = MariaDBStorage.connect(
+                user=current_app.config["MARIADB_USER"],
+                password=current_app.config["MARIADB_PASSWORD"],
+                host=current_app.config["MARIADB_HOST"],
+                port=current_app.config["MARIADB_PORT"],
+                database=current_app.config["MARIADB_DATABASE"],
+            )
+    except Exception as e:
         current_app.logger.warn(f"Could not connect to database: '{e}'")
+        DB_CONNECTS.inc(backend=backend, outcome="error")
         conn = None
     else:
-        current_app.logger.info(f"Successfully connected to database")
+        DB_CONNECTS.inc(backend=backend, outcome="ok")
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - start, backend=backend)
+        current_app.logger.info(f"Successfully connected to {backend} database")
     return conn
 
 
+def storage_factory(app):
+    """returns a function opening a new connection outside of requests,
+    e.g. in background threads; the caller closes it"""
+
+    def connect():
+        with app.app_context():
+            return _connect_to_database()
+
+    return connect
+
+
 def get_database_conn():
     """creates and/or returns conn object stored in g._db_conn"""
     if "_db_conn" not in g:
@@ -48,6 +73,17 @@ def execute_query(*args, **kwargs):
     return cursor.fetchall()
 
 
+def persist_predictions_requested():
+    """whether the predictions of this request are written to the database
+
+    defaults to the PERSIST_PREDICTIONS setting, `?persist=0|1` overrides it
+    """
+    flag = request.args.get("persist")
+    if flag is None:
+        return current_app.config.get("PERSIST_PREDICTIONS", False)
+    return flag.lower() in ("1", "true", "yes")
+
+
 def register_database_to_context():
     """registers function to retrieve connection in g.get_conn"""
     g.get_conn = get_database_conn
@@ -55,7 +91,53 @@ def register_database_to_context():
     g.query = execute_query
 
 
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Create the tables and time indexes of the configured database."""
+    from src.bidding.order_book import OrderBook
+    from src.bidding.submissions import SubmissionStore
+    from src.co2.co2_saved import co2_rollup
+    from src.energy.energy_onsite import energy_rollup
+
+    register_database_to_context()
+    conn = g.get_conn()
+    conn.create_schema()
+    for rollup in (energy_rollup, co2_rollup):
+        rollup.create_tables(conn)
+    OrderBook().create_table(conn)
+    SubmissionStore(None).create_table(conn)
+    click.echo("Initialized the database")
+
+
+@click.command("bench-db")
+@click.option("--days", default=7, help="Length of the queried time range.")
+@click.option("--repeat", default=5, help="Runs per query, the best is kept.")
+@with_appcontext
+def bench_db_command(days, repeat):
+    """Time the bidder and CO2 queries against the configured database."""
+    from src.bidding.util import BIDDERS
+    from src.co2.co2_saved import QUERIES
+
+    register_database_to_context()
+    templates = {f"co2.{key}": query for key, query in QUERIES.items()}
+    for name, bidder in BIDDERS.items():
+        if name != "default":
+            templates.update(
+                {f"{name}.{key}": query for key, query in bidder.data.items()}
+            )
+    end = datetime.utcnow()
+    timings = g.get_conn().benchmark(
+        templates, repeat, start_date=end - timedelta(days=days), end_date=end
+    )
+    click.echo(f"backend: {current_app.config.get('DATABASE_BACKEND', 'mariadb')}")
+    for name, seconds in timings.items():
+        click.echo(f"{name:40s} {seconds * 1000:10.2f} ms")
+
+
 def init_app_database(app):
     """application init to register functions and cli commands"""
     app.teardown_appcontext(teardown_database)
     app.before_request(register_database_to_context)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(bench_db_command)
@@ -9,6 +9,15 @@ class Config(object):
     MARIADB_DATABASE = "llanwrytd"
     SECRET_KEY = SECRET_KEY
     MARIADB_PORT = 3306
+    # "mariadb" or "sqlite" for an embedded database in SQLITE_PATH
+    DATABASE_BACKEND = os.environ.get("DATABASE_BACKEND", "mariadb")
+    SQLITE_PATH = os.environ.get("SQLITE_PATH", "aimlac.sqlite3")
+    # write predictions to powerPrediction/pricePrediction directly
+    PERSIST_PREDICTIONS = os.environ.get("PERSIST_PREDICTIONS", "") == "1"
+    # precompute predictions in the background, see src/common/scheduler.py
+    PREDICTION_SCHEDULER = os.environ.get("PREDICTION_SCHEDULER", "") == "1"
+    # per-stage timings and Server-Timing headers, see src/common/timing.py
+    SERVER_TIMING = os.environ.get("SERVER_TIMING", "") == "1"
 
 
 class Development(Config):
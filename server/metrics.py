@@ -0,0 +1,49 @@
+import time
+
+from flask import Response, g, request
+
+from src.common.metrics import IN_FLIGHT, REQUESTS, REQUEST_SECONDS, metrics
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def init_app_metrics(app):
+    """counts the requests of every route and serves GET /metrics
+
+    set METRICS_DIR to a directory shared by the gunicorn workers so /metrics
+    reports all of them, whichever worker serves the scrape
+    """
+    metrics.start_flushing()
+
+    def record(status):
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUESTS.inc(route=route, method=request.method, status=status)
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - g.metrics_start, route=route, method=request.method
+        )
+
+    @app.before_request
+    def begin_request_metrics():
+        g.metrics_start = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def count_request(response):
+        if "metrics_start" in g:
+            record(response.status_code)
+            g.metrics_counted = True
+        return response
+
+    @app.teardown_request
+    def end_request_metrics(exc):
+        if "metrics_start" not in g:
+            return
+        # requests failing outside the routes skip after_request
+        if not g.pop("metrics_counted", False):
+            record(500)
+        g.pop("metrics_start")
+        IN_FLIGHT.dec()
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype=CONTENT_TYPE)
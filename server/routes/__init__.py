@@ -1,7 +1,20 @@
 import server.routes.bidding as bidding
 import server.routes.co2 as co2
+import server.routes.energy as energy
+import server.routes.models as models
 import server.routes.predict_power as predict_power
 import server.routes.predict_price as predict_price
+import server.routes.scheduler as scheduler
+import server.routes.timing as timing
 
 # create binding to export
-routes = [bidding.bp, predict_power.bp, co2.bp, predict_price.bp]
+routes = [
+    bidding.bp,
+    predict_power.bp,
+    co2.bp,
+    predict_price.bp,
+    models.bp,
+    energy.bp,
+    scheduler.bp,
+    timing.bp,
+]
@@ -1,10 +1,28 @@
 from flask import Blueprint, g, request
 from datetime import date, timedelta
+import json
+import time
+
+import click
+import requests
+
+from server.database import storage_factory
 from src.bidding import BIDDERS
+from src.bidding.compare import evaluate_bidders, side_by_side
+from src.bidding.order_book import shared_metrics
+from src.bidding.rse_client import RSEClient, get_client
+from src.bidding.rse_stub import RSEStub
+from src.bidding.util import get_output_template
 
 bp = Blueprint("bid", __name__, url_prefix="/bid")
 
 
+@bp.record_once
+def share_order_book(state):
+    """the workers compare their orders against the books in the database"""
+    get_client(connect=storage_factory(state.app))
+
+
 @bp.route("/list", methods=["GET"])
 def list_bidders():
     try:
@@ -21,14 +39,122 @@ def list_bidders():
         return {"message": str(e)}, 500
 
 
+def planning_horizon(body: dict) -> dict:
+    """`applying_date` and `days` of a request body, if given"""
+    horizon = {}
+    if body.get("applying_date"):
+        horizon["applying_date"] = date.fromisoformat(body["applying_date"])
+    if body.get("days"):
+        horizon["days"] = int(body["days"])
+    return horizon
+
+
 @bp.route("/set", methods=["POST"])
 def set_bids():
     try:
         if request.data and request.json:
             bidder = request.json.get("bidder", "default")
+            asynchronous = bool(request.json.get("async", False))
+            full = bool(request.json.get("full", False))
+            horizon = planning_horizon(request.json)
         else:
             bidder = "default"
-        resp = BIDDERS.get(bidder, BIDDERS["default"])()
-        return resp.json()
+            asynchronous = full = False
+            horizon = {}
+        resp = BIDDERS.get(bidder, BIDDERS["default"])(
+            asynchronous=asynchronous, full=full, **horizon
+        )
+        if asynchronous:
+            # poll /bid/status/<id> for the result
+            return {"id": resp, "status": "pending"}, 202
+        if resp.status == "skipped":
+            return {"message": "order book unchanged", "orders": 0}, 200
+        if resp.response is None:
+            return {"message": resp.error, "attempts": resp.attempts}, 502
+        return resp.response.json(), resp.response.status_code
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/compare", methods=["POST"])
+def compare_bidders():
+    """dry run: books of several bidders on the same data, nothing is submitted
+
+    body (optional): {"bidders": [...], "applying_date": "YYYY-MM-DD", "days": 1}
+    """
+    try:
+        body = request.json if request.data else {}
+        results, queries = evaluate_bidders(
+            body.get("bidders"), **planning_horizon(body)
+        )
+        books = {
+            name: result["orders"]
+            for name, result in results.items()
+            if "orders" in result
+        }
+        bidders = {
+            name: (
+                {"orders": json.loads(result["orders"].to_json(orient="records"))}
+                if "orders" in result
+                else result
+            )
+            for name, result in results.items()
+        }
+        table = json.loads(side_by_side(books).to_json(orient="records"))
+        return {"queries": queries, "bidders": bidders, "side_by_side": table}, 200
     except Exception as e:
         return {"message": str(e)}, 500
+
+
+@bp.route("/status/<submission_id>", methods=["GET"])
+def submission_status(submission_id):
+    try:
+        # submissions of any worker, see src/bidding/submissions.py
+        status = get_client().status(submission_id)
+        if status is None:
+            return {"message": f"unknown submission: {submission_id}"}, 404
+        return status, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/metrics", methods=["GET"])
+def submission_metrics():
+    try:
+        # counted by all workers, see src/common/metrics.py
+        return shared_metrics(), 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.cli.command("bench-rse")
+@click.option("-n", default=50, help="Number of submissions.")
+@click.option("--latency", default=0.02, help="Latency of the stub in seconds.")
+def bench_rse_command(n, latency):
+    """Time order submissions against a local RSE stub."""
+    orders = get_output_template()
+    with RSEStub(latency=latency) as stub:
+        url = f"http://{stub.addr}/auction/bidding/set"
+        payload = {"key": None, "orders": orders.to_dict(orient="records")}
+        start = time.perf_counter()
+        for _ in range(n):
+            # one connection per request, as before the pooled client
+            requests.post(url, json=payload, headers={"Connection": "close"})
+        fresh = time.perf_counter() - start
+
+        client = RSEClient(stub.addr, None)
+        start = time.perf_counter()
+        for _ in range(n):
+            client.submit(orders, full=True)
+        pooled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        futures = [client.submit_async(orders, full=True)[1] for _ in range(n)]
+        for future in futures:
+            future.result()
+        concurrent = time.perf_counter() - start
+        client.close()
+
+    click.echo(f"fresh connections   {fresh / n * 1000:8.2f} ms/order set")
+    click.echo(f"pooled session      {pooled / n * 1000:8.2f} ms/order set")
+    click.echo(f"pooled, async       {concurrent / n * 1000:8.2f} ms/order set")
@@ -1,14 +1,76 @@
-from flask import Blueprint
-from src.co2.co2_saved import co2_saved
+from datetime import datetime
+
+import click
+import pandas as pd
+from flask import Blueprint, current_app, g, request
+from server.database import register_database_to_context
+from src.co2.co2_saved import (
+    backfill_co2_rollup,
+    co2_saved_incremental,
+    co2_saved_range,
+)
+from src.energy import refresh_energy_rollup
 
 bp = Blueprint("co2", __name__, url_prefix="/co2")
 
+# days of energy_onsite rolled up per /co2/set, the rest of a long history
+# follows at the next polls or with `flask co2 refresh-energy`
+REFRESH_DAYS_PER_POLL = 1
+
+# window -> (length, default resolution)
+WINDOWS = {
+    "day": (pd.DateOffset(days=1), "30min"),
+    "month": (pd.DateOffset(months=1), "1D"),
+    "year": (pd.DateOffset(years=1), "1M"),
+}
+
 
 @bp.route("/set", methods=["GET"])
 def setCO2Saved():
     try:
-        co2 = co2_saved()
+        co2 = co2_saved_incremental()
+        # /co2/set is polled regularly, keep the energy rollups up to date;
+        # a failed refresh is retried at the next poll, not reported here
+        try:
+            refresh_energy_rollup(g.get_conn(), max_days=REFRESH_DAYS_PER_POLL)
+        except Exception as e:
+            current_app.logger.warn(f"Could not refresh the energy rollup: '{e}'")
+        co2_json = co2.to_json(orient="records")
+        return co2_json
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/range", methods=["GET"])
+def getCO2SavedRange():
+    """CO2 saved over `start`-`end` (or the last `window`) at `resolution`."""
+    try:
+        window = request.args.get("window", "day")
+        assert window in WINDOWS, f"unknown window: {window}"
+        length, resolution = WINDOWS[window]
+        end = pd.Timestamp(request.args.get("end") or datetime.utcnow())
+        start = pd.Timestamp(request.args.get("start") or end - length)
+        resolution = request.args.get("resolution", resolution)
+        co2 = co2_saved_range(start, end, resolution)
         co2_json = co2.to_json(orient="records")
         return co2_json
     except Exception as e:
         return {"message": str(e)}, 500
+
+
+@bp.cli.command("backfill")
+@click.argument("start")
+@click.argument("end")
+def backfillCO2Rollup(start, end):
+    """Fill the CO2 saved rollup tables from START to END (YYYY-MM-DD)."""
+    register_database_to_context()
+    count = backfill_co2_rollup(pd.Timestamp(start), pd.Timestamp(end))
+    click.echo(f"Rolled up {count} half hours")
+
+
+@bp.cli.command("refresh-energy")
+def refreshEnergyRollup():
+    """Roll up all energy_onsite rows added since the last refresh."""
+    register_database_to_context()
+    count = refresh_energy_rollup(g.get_conn())
+    click.echo(f"Rolled up {count} energy_onsite rows")
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import click
+import pandas as pd
+from flask import Blueprint, g, request
+from server.database import register_database_to_context
+from src.energy import compact_energy_onsite, query_energy, refresh_energy_rollup
+from src.onsite.demand_model import train_demand_model
+
+bp = Blueprint("energy", __name__, url_prefix="/energy")
+
+
+@bp.route("/range", methods=["GET"])
+def get_energy_range():
+    """energy_onsite data over `start`-`end`, from the rollups if possible."""
+    try:
+        end = pd.Timestamp(request.args.get("end") or datetime.utcnow())
+        start = pd.Timestamp(request.args.get("start") or end - timedelta(days=1))
+        resolution = request.args.get("resolution")
+        energy = query_energy(g.get_conn(), start, end, resolution)
+        return energy.to_json(orient="records")
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/rollup", methods=["POST"])
+def rollup_energy():
+    try:
+        rows = refresh_energy_rollup(g.get_conn())
+        return {"rows": rows}, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/train-demand", methods=["POST"])
+def train_demand():
+    """fit the demand model on the history between `start` and `end`
+
+    body: {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD", "activate": true}
+    """
+    try:
+        start = pd.Timestamp(request.json["start"])
+        end = pd.Timestamp(request.json["end"])
+        activate = bool(request.json.get("activate", True))
+        version, rows = train_demand_model(g.get_conn(), start, end, activate=activate)
+        return {"version": version, "rows": rows}, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.cli.command("rollup")
+def rollup_energy_command():
+    """Roll up the energy_onsite rows added since the last refresh."""
+    register_database_to_context()
+    rows = refresh_energy_rollup(g.get_conn())
+    click.echo(f"Rolled up {rows} rows")
+
+
+@bp.cli.command("compact")
+@click.option("--days", type=int, default=None, help="Days of raw rows to keep.")
+def compact_energy_command(days):
+    """Delete raw energy_onsite rows older than the retention period."""
+    register_database_to_context()
+    retention = timedelta(days=days) if days else None
+    rows = compact_energy_onsite(g.get_conn(), retention)
+    click.echo(f"Deleted {rows} raw rows")
+
+
+@bp.cli.command("train-demand")
+@click.argument("start")
+@click.argument("end")
+@click.option("--version", default=None, help="Name of the new model version.")
+@click.option("--no-activate", is_flag=True, help="Publish without activating.")
+def train_demand_command(start, end, version, no_activate):
+    """Fit the demand model on the energy_onsite history from START to END."""
+    register_database_to_context()
+    version, rows = train_demand_model(
+        g.get_conn(),
+        pd.Timestamp(start),
+        pd.Timestamp(end),
+        version=version,
+        activate=not no_activate,
+    )
+    click.echo(f"Published demand model {version}, fitted on {rows} half hours")
@@ -0,0 +1,36 @@
+from flask import Blueprint, request
+
+from src.common.model_registry import registry
+
+# importing the predictors registers their models
+import src.onsite
+import src.pricing
+import src.wind
+
+bp = Blueprint("models", __name__, url_prefix="/models")
+
+
+@bp.route("/list", methods=["GET"])
+def list_models():
+    try:
+        mssg = {
+            name: {
+                "active": registry.active_version(name),
+                "versions": registry.versions(name),
+            }
+            for name in registry.models()
+        }
+        return mssg, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/activate", methods=["POST"])
+def activate_model():
+    try:
+        name = request.json["model"]
+        version = request.json["version"]
+        registry.activate(name, version)
+        return {"model": name, "active": registry.active_version(name)}, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
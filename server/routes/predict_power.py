@@ -1,22 +1,44 @@
 from src.onsite.onsite import get_energy_demand
+from src.onsite.buildings import BuildingProfile, campus_demand
 from src.solar.solar import get_solar_prediction
 from src.wind.wind import get_wind_prediction
 
-from flask import Blueprint, request
+import click
+from flask import Blueprint, g, request
 from pydash.objects import get
+from server.database import persist_predictions_requested
+from server.scheduler import submit_to_scheduler
+from src.common.incremental import get_incremental_predictor
+from src.common.met_office_client import forecast_frame, get_met_office_client
+from src.common.timing import stage
+import src.config as config
+from src.common.prediction_store import (
+    merge_power_predictions,
+    save_power_predictions,
+)
 
+from datetime import datetime
 import json
+import numpy as np
 import pandas as pd
 
 bp = Blueprint("power", __name__, url_prefix="/power")
 
 
+def read_forecast() -> pd.DataFrame:
+    """the posted Met Office forecast as a frame"""
+    with stage("json"):
+        forecast_json = get(request.json, "features[0].properties.timeSeries")
+        return pd.read_json(json.dumps(forecast_json))
+
+
 @bp.route("/predict-solar", methods=["POST"])
 def predict_solar():
     try:
-        forecast_json = get(request.json, "features[0].properties.timeSeries")
-        forecast_df = pd.read_json(json.dumps(forecast_json))
+        forecast_df = read_forecast()
         solar_output_df = get_solar_prediction(forecast_df)
+        if persist_predictions_requested():
+            save_power_predictions(g.get_conn(), solar_output_df)
         solar_output_json = solar_output_df.to_json(orient="records")
         return solar_output_json
     except Exception as e:
@@ -26,9 +48,12 @@ def predict_solar():
 @bp.route("/predict-wind", methods=["POST"])
 def predict_wind():
     try:
-        forecast_json = get(request.json, "features[0].properties.timeSeries")
-        forecast_df = pd.read_json(json.dumps(forecast_json))
-        wind_report_df = get_wind_prediction(forecast_df)
+        forecast_df = read_forecast()
+        wind_report_df = get_wind_prediction(
+            forecast_df, version=request.args.get("version")
+        )
+        if persist_predictions_requested():
+            save_power_predictions(g.get_conn(), wind_report_df)
         wind_report_json = wind_report_df.to_json(orient="records")
         return wind_report_json
     except Exception as e:
@@ -38,19 +63,170 @@ def predict_wind():
 @bp.route("/predict-onsite", methods=["POST"])
 def predict_onsite():
     try:
-        forecast_json = get(request.json, "features[0].properties.timeSeries")
-        forecast_df = pd.read_json(json.dumps(forecast_json))
-        demand_df = get_energy_demand(forecast_df)
-        demand_df.rename(
-            columns={
-                "DateTime": "time",
-                "HQ Temperature": "HQTemperature",
-                "Total demand": "HQPowerDemand",
-            },
-            inplace=True,
-        )
-        demand_df = demand_df[["time", "HQPowerDemand", "HQTemperature"]]
+        forecast_df = read_forecast()
+        demand_df = onsite_prediction(forecast_df)
+        if persist_predictions_requested():
+            save_power_predictions(g.get_conn(), demand_df)
         demand_json = demand_df.to_json(orient="records")
         return demand_json
     except Exception as e:
         return {"message": str(e)}, 500
+
+
+@bp.route("/predict-campus", methods=["POST"])
+def predict_campus():
+    """onsite demand of several buildings from one forecast
+
+    body: the forecast, plus {"buildings": [{"name": ..., <BuildingProfile>}],
+    "start_time": "YYYY-MM-DDTHH:MM", "periods": 48}
+    """
+    try:
+        forecast_df = read_forecast()
+        profiles = [
+            BuildingProfile.from_dict(profile)
+            for profile in request.json.get("buildings") or [{"name": "HQ"}]
+        ]
+        start_time = request.json.get("start_time")
+        start_time = (
+            datetime.fromisoformat(start_time)
+            if start_time
+            else datetime.now().replace(hour=23, minute=0, second=0, microsecond=0)
+        )
+        demand = campus_demand(
+            profiles, forecast_df, start_time, int(request.json.get("periods", 48))
+        )
+        return {
+            "summary": json.loads(demand.summary().to_json(orient="records")),
+            "time": np.datetime_as_string(
+                demand.times, unit="s", timezone="UTC"
+            ).tolist(),
+            "demand": dict(zip(demand.names, demand.total.tolist())),
+        }, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/predict-all", methods=["POST"])
+def predict_all():
+    """wind, solar and onsite demand predictions of one forecast in one table"""
+    try:
+        forecast_df = read_forecast()
+        submit_to_scheduler(forecast=forecast_df)
+        power_df = power_prediction(
+            forecast_df, wind_version=request.args.get("version")
+        )
+        if persist_predictions_requested():
+            save_power_predictions(g.get_conn(), power_df)
+        power_json = power_df.to_json(orient="records")
+        return power_json
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/predict-incremental", methods=["POST"])
+def predict_incremental():
+    """same as /predict-all, only the half hours changed since the last
+    forecast of the site are predicted again
+
+    the site is the `site` query parameter or the forecast's coordinates
+    """
+    try:
+        forecast_df = read_forecast()
+        site = request.args.get("site") or str(
+            get(request.json, "features[0].geometry.coordinates", "default")
+        )
+        submit_to_scheduler(forecast=forecast_df)
+        predictions, work = get_incremental_predictor().predict(
+            forecast_df, site=site, wind_version=request.args.get("version")
+        )
+        power_df = merge_power_predictions(list(predictions.values()))
+        if persist_predictions_requested():
+            save_power_predictions(g.get_conn(), power_df)
+        return {
+            "predictions": json.loads(power_df.to_json(orient="records")),
+            "work": work,
+        }, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/incremental-metrics", methods=["GET"])
+def incremental_metrics():
+    """steps computed and reused by this worker, the totals of all workers
+    are the `aimlac_cache_requests_total{cache="incremental"}` of /metrics
+    """
+    try:
+        return get_incremental_predictor().metrics, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/predict-met-office", methods=["POST"])
+def predict_met_office():
+    """same as /predict-all on the forecast fetched from the Met Office
+
+    the site is the `lat` and `lon` query parameters, LOCATION_LAT and
+    LOCATION_LON by default; unchanged forecasts are served from the cache
+    """
+    try:
+        result = get_met_office_client().fetch(
+            float(request.args.get("lat", config.LATITUDE)),
+            float(request.args.get("lon", config.LONGITUDE)),
+        )
+        assert result.payload is not None, f"no forecast: {result.error}"
+        forecast_df = forecast_frame(result.payload)
+        submit_to_scheduler(forecast=forecast_df)
+        power_df = power_prediction(
+            forecast_df, wind_version=request.args.get("version")
+        )
+        if persist_predictions_requested():
+            save_power_predictions(g.get_conn(), power_df)
+        return {
+            "predictions": json.loads(power_df.to_json(orient="records")),
+            "fetch": result.to_dict(),
+        }, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/met-office-metrics", methods=["GET"])
+def met_office_metrics():
+    try:
+        return get_met_office_client().metrics, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.cli.command("fetch-forecast")
+@click.option("--lat", type=float, default=None, help="Latitude of the site.")
+@click.option("--lon", type=float, default=None, help="Longitude of the site.")
+def fetch_forecast(lat, lon):
+    """Fetch the Met Office forecast of the site into the cache."""
+    result = get_met_office_client().fetch(
+        lat if lat is not None else float(config.LATITUDE),
+        lon if lon is not None else float(config.LONGITUDE),
+    )
+    click.echo(json.dumps(result.to_dict()))
+
+
+def onsite_prediction(forecast_df: pd.DataFrame) -> pd.DataFrame:
+    demand_df = get_energy_demand(forecast_df)
+    demand_df.rename(
+        columns={
+            "DateTime": "time",
+            "HQ Temperature": "HQTemperature",
+            "Total demand": "HQPowerDemand",
+        },
+        inplace=True,
+    )
+    return demand_df[["time", "HQPowerDemand", "HQTemperature"]]
+
+
+def power_prediction(forecast_df: pd.DataFrame, wind_version=None) -> pd.DataFrame:
+    return merge_power_predictions(
+        [
+            get_wind_prediction(forecast_df.copy(), version=wind_version),
+            get_solar_prediction(forecast_df.copy()),
+            onsite_prediction(forecast_df.copy()),
+        ]
+    )
@@ -1,9 +1,14 @@
 import json
 
 import pandas as pd
-from flask import Blueprint, request
+from flask import Blueprint, g, request
+from server.database import persist_predictions_requested
+from server.scheduler import submit_to_scheduler
+from src.common.prediction_store import save_price_predictions
+from src.common.timing import stage
 
-from src.pricing import predict_price_tomorrow
+from src.pricing import predict_price_batch, predict_price_tomorrow
+from src.pricing.online import update_price_model
 
 bp = Blueprint("price", __name__, url_prefix="/price")
 
@@ -11,9 +16,41 @@ bp = Blueprint("price", __name__, url_prefix="/price")
 @bp.route("/predict-price", methods=["POST"])
 def predict_price():
     try:
-        price_df = pd.read_json(json.dumps(request.json))
-        price_tmr = predict_price_tomorrow(price_df)
+        with stage("json"):
+            price_df = pd.read_json(json.dumps(request.json))
+        submit_to_scheduler(prices=price_df)
+        price_tmr = predict_price_tomorrow(
+            price_df, version=request.args.get("version")
+        )
+        if persist_predictions_requested():
+            save_price_predictions(g.get_conn(), price_tmr)
         price_json = price_tmr.to_json(orient="records")
         return price_json
     except Exception as e:
         return {"message": str(e)}, 500
+
+
+@bp.route("/predict-price-batch", methods=["POST"])
+def predict_price_batch_route():
+    try:
+        with stage("json"):
+            price_df = pd.read_json(json.dumps(request.json.get("prices")))
+        group_by = request.json.get("group_by")
+        price_tmr = predict_price_batch(
+            price_df, group_by=group_by, version=request.args.get("version")
+        )
+        price_json = price_tmr.to_json(orient="records")
+        return price_json
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/update-model", methods=["POST"])
+def update_model():
+    try:
+        with stage("json"):
+            price_df = pd.read_json(json.dumps(request.json))
+        updates = update_price_model(price_df)
+        return {"updates": updates}, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
@@ -0,0 +1,85 @@
+import json
+import time
+
+import click
+import pandas as pd
+from flask import Blueprint, current_app, request
+from pydash.objects import get
+
+from server.scheduler import scheduler_elsewhere, start_scheduler, submit_to_scheduler
+import src.config as config
+from src.common.scheduler import SchedulerInbox, get_scheduler
+
+bp = Blueprint("scheduler", __name__, url_prefix="/scheduler")
+
+
+def running_scheduler():
+    """the scheduler of this process, None if another process runs it"""
+    scheduler = get_scheduler()
+    assert (
+        scheduler is not None or scheduler_elsewhere()
+    ), "the prediction scheduler is not running"
+    return scheduler
+
+
+@bp.route("/metrics", methods=["GET"])
+def scheduler_metrics():
+    try:
+        scheduler = running_scheduler()
+        if scheduler is not None:
+            return scheduler.metrics, 200
+        return SchedulerInbox().metrics() or {}, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/forecast", methods=["POST"])
+def submit_forecast():
+    """hand a forecast (same body as /power/predict-all) to the scheduler"""
+    try:
+        running_scheduler()
+        forecast_json = get(request.json, "features[0].properties.timeSeries")
+        submit_to_scheduler(forecast=pd.read_json(json.dumps(forecast_json)))
+        return {"status": "pending"}, 202
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/prices", methods=["POST"])
+def submit_prices():
+    """hand a price history (same body as /price/predict-price) to the scheduler"""
+    try:
+        running_scheduler()
+        submit_to_scheduler(prices=pd.read_json(json.dumps(request.json)))
+        return {"status": "pending"}, 202
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/run", methods=["POST"])
+def run_scheduler():
+    """predict now from the latest inputs, or at the next check of a
+    scheduler running in another process"""
+    try:
+        scheduler = running_scheduler()
+        if scheduler is None:
+            SchedulerInbox().request_run()
+            return {"status": "requested"}, 202
+        ran = scheduler.run()
+        return {"ran": ran, **scheduler.metrics}, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.cli.command("run")
+def run_scheduler_process():
+    """Run the prediction scheduler in this process, in the foreground."""
+    scheduler = start_scheduler(current_app._get_current_object())
+    if scheduler is None:
+        raise click.ClickException("another process runs the scheduler")
+    click.echo(f"Scheduler running, sharing {config.PREDICTION_SCHEDULER_DIR}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
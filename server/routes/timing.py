@@ -0,0 +1,55 @@
+import click
+from flask import Blueprint, request
+
+from server.timing import get_timing_switch
+from src.common.metrics import stage_histograms
+from src.common.timing import measure_overhead, timings
+
+bp = Blueprint("timing", __name__, url_prefix="/timing")
+
+
+@bp.route("", methods=["GET"])
+def get_timings():
+    """latency histograms per endpoint and stage of all workers, since the
+    last reset"""
+    try:
+        histograms = get_timing_switch().since_reset(stage_histograms())
+        endpoints = {
+            endpoint: {name: h.to_dict() for name, h in stages.items()}
+            for endpoint, stages in histograms.items()
+        }
+        return {"enabled": timings.enabled, "endpoints": endpoints}, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("", methods=["POST"])
+def switch_timing():
+    """body: {"enabled": true|false, "reset": false}, applies to all workers"""
+    try:
+        enabled = request.json.get("enabled")
+        assert isinstance(enabled, bool), "enabled must be true or false"
+        # counts are never dropped, a reset only moves the baseline
+        baseline = stage_histograms() if request.json.get("reset") else None
+        get_timing_switch().set(enabled, baseline)
+        return {"enabled": timings.enabled}, 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.route("/overhead", methods=["GET"])
+def timing_overhead():
+    """cost of a disabled stage in nanoseconds"""
+    try:
+        return measure_overhead(int(request.args.get("iterations", 100_000))), 200
+    except Exception as e:
+        return {"message": str(e)}, 500
+
+
+@bp.cli.command("overhead")
+@click.option("-n", "iterations", default=1_000_000, help="Calls measured.")
+def overhead(iterations):
+    """Measure the cost of the stage timers while timing is off."""
+    result = measure_overhead(iterations)
+    click.echo(f"with stage(...)   {result['stage_ns']:8.1f} ns/stage")
+    click.echo(f"@timed(...)       {result['timed_ns']:8.1f} ns/call")
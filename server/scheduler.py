@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from flask import current_app
+
+from server.database import storage_factory
+import src.config as config
+from src.common.met_office_client import get_met_office_client
+from src.common.scheduler import (
+    PredictionScheduler,
+    SchedulerInbox,
+    SchedulerLock,
+    get_scheduler,
+    set_scheduler,
+)
+
+_lock = None
+
+
+def _scheduler_lock():
+    global _lock
+    if _lock is None:
+        _lock = SchedulerLock()
+    return _lock
+
+
+def start_scheduler(app):
+    """starts the scheduler in this process if no other process runs one
+
+    returns the scheduler, None if another process holds the lock
+    """
+    if get_scheduler() is not None:
+        return get_scheduler()
+    if not _scheduler_lock().acquire():
+        return None
+
+    sources = {}
+    if config.MET_OFFICE_API_KEY and config.LATITUDE and config.LONGITUDE:
+        sources["forecast"] = get_met_office_client().poller(
+            config.LATITUDE, config.LONGITUDE
+        )
+
+    scheduler = PredictionScheduler(
+        connect=storage_factory(app), sources=sources, inbox=SchedulerInbox()
+    )
+    set_scheduler(scheduler)
+    scheduler.start()
+    app.logger.info("Started the prediction scheduler")
+    return scheduler
+
+
+def init_app_scheduler(app):
+    """runs the background prediction scheduler if PREDICTION_SCHEDULER is set
+
+    the first worker taking the lock of PREDICTION_SCHEDULER_DIR runs it, the
+    others hand their inputs over to it; with a MET_OFFICE_API_KEY it polls
+    the forecast of the site itself. Alternatively, leave it unset and run
+    `flask scheduler run` as a separate process
+    """
+    if app.config.get("PREDICTION_SCHEDULER"):
+        start_scheduler(app)
+
+
+def scheduler_elsewhere():
+    """whether another process runs the scheduler"""
+    return get_scheduler() is None and _scheduler_lock().held_elsewhere()
+
+
+def submit_to_scheduler(forecast=None, prices=None):
+    """hands the inputs of a prediction request to the scheduler, if running"""
+    try:
+        scheduler = get_scheduler()
+        if scheduler is not None:
+            if forecast is not None:
+                scheduler.submit_forecast(forecast)
+            if prices is not None:
+                scheduler.submit_prices(prices)
+        elif scheduler_elsewhere():
+            inbox, received = SchedulerInbox(), datetime.utcnow()
+            if forecast is not None:
+                inbox.put("forecast", forecast, received)
+            if prices is not None:
+                inbox.put("prices", prices, received)
+    except Exception as e:
+        current_app.logger.warn(f"Could not submit to the scheduler: '{e}'")
@@ -0,0 +1,52 @@
+import os
+
+from flask import g, request
+
+from src.common.metrics import metrics
+from src.common.timing import TimingSwitch, timings
+
+SWITCH_FILE = "timing.json"
+
+_switch = None
+
+
+def get_timing_switch():
+    """the switch shared by the workers through METRICS_DIR, if set"""
+    global _switch
+    if _switch is None:
+        directory = metrics.directory
+        path = os.path.join(directory, SWITCH_FILE) if directory else None
+        _switch = TimingSwitch(timings, path)
+    return _switch
+
+
+def init_app_timing(app):
+    """times the stages of every request while timing is enabled and sends
+    them back in a Server-Timing header
+
+    SERVER_TIMING sets the initial switch, POST /timing flips it at runtime;
+    with METRICS_DIR every worker follows within about a second
+    """
+    timings.enabled = bool(app.config.get("SERVER_TIMING"))
+    # a switch flipped at runtime outlives restarted workers
+    get_timing_switch().poll()
+
+    @app.before_request
+    def begin_timing():
+        get_timing_switch().poll()
+        if timings.enabled:
+            g.timing_token = timings.begin(request.endpoint or request.path)
+
+    @app.after_request
+    def add_server_timing(response):
+        token = g.pop("timing_token", None)
+        if token is not None:
+            response.headers["Server-Timing"] = timings.end(token).header()
+        return response
+
+    @app.teardown_request
+    def end_timing(exc):
+        # requests failing outside the routes skip after_request
+        token = g.pop("timing_token", None)
+        if token is not None:
+            timings.end(token)
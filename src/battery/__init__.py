@@ -0,0 +1 @@
+from src.battery.battery import Battery, Schedule, dispatch, get_battery
@@ -0,0 +1,153 @@
+"""Charge and discharge schedule of on-site storage.
+
+The battery shifts the net power (wind + solar - demand) of the site between
+hours. Its state of charge is discretized into a grid and the schedule with
+the highest value at the predicted prices is found by dynamic programming:
+going backwards over the horizon, the best value-to-go of every state is the
+best over all reachable next states, computed for all states and moves at
+once as a (states x moves) array. The schedule is then read forwards from the
+initial state.
+
+Energy is settled at the predicted price, except that energy bought from the
+grid pays `import_premium` on top. The battery ends the horizon at least as
+full as it started, so it never sells stored energy it did not buy or
+generate within the horizon.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+import src.config as config
+
+
+@dataclass
+class Battery:
+    """Class to represent a battery.
+
+    Attributes:
+        capacity (float): Usable energy in kWh.
+        power (float): Maximum charge and discharge power in kW.
+        efficiency (float): Round-trip efficiency, lost half when charging
+            and half when discharging.
+        initial_soc (float): State of charge at the start of the horizon, as
+            a fraction of the capacity.
+    """
+
+    capacity: float
+    power: float
+    efficiency: float = 0.9
+    initial_soc: float = 0.5
+
+    def __post_init__(self):
+        assert self.capacity > 0 and self.power > 0, "capacity and power must be > 0"
+        assert 0 < self.efficiency <= 1, "efficiency must be within (0, 1]"
+        assert 0 <= self.initial_soc <= 1, "initial_soc must be within [0, 1]"
+
+
+@dataclass
+class Schedule:
+    """Optimal use of the battery over a horizon.
+
+    Attributes:
+        charge (np.ndarray): Power drawn by the battery per step in kW,
+            negative when discharging.
+        soc (np.ndarray): Energy stored at the end of every step in kWh.
+        position (np.ndarray): Net power left for the grid, `net_power -
+            charge`, positive to sell.
+        value (float): Value of the horizon with the battery.
+    """
+
+    charge: np.ndarray
+    soc: np.ndarray
+    position: np.ndarray
+    value: float
+
+
+def get_battery() -> Battery:
+    """Returns the battery of the site, None without one."""
+    if config.BATTERY_CAPACITY <= 0:
+        return None
+    return Battery(
+        config.BATTERY_CAPACITY,
+        config.BATTERY_POWER,
+        config.BATTERY_EFFICIENCY,
+        config.BATTERY_INITIAL_SOC,
+    )
+
+
+def settlement(
+    position: np.ndarray, price: np.ndarray, import_premium: float = 0.0
+) -> np.ndarray:
+    """Value of selling `position` (buying when negative) at `price`."""
+    return position * price - import_premium * np.maximum(-position, 0.0)
+
+
+def dispatch(
+    net_power: np.ndarray,
+    prices: np.ndarray,
+    battery: Battery,
+    states: int = 1000,
+    step: float = 1.0,
+    import_premium: float = None,
+) -> Schedule:
+    """Finds the most valuable charge and discharge schedule.
+
+    Args:
+        net_power (np.ndarray): Predicted net power per step in kW.
+        prices (np.ndarray): Predicted price per step.
+        battery (Battery): The battery.
+        states (int): Number of points of the state of charge grid.
+        step (float): Length of a step in hours.
+        import_premium (float): Extra cost of energy bought from the grid,
+            `config.BATTERY_IMPORT_PREMIUM` by default.
+
+    Returns:
+        Schedule: The optimal schedule.
+    """
+    net_power = np.asarray(net_power, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    assert net_power.shape == prices.shape, "one price per step"
+    assert np.isfinite(net_power).all() and np.isfinite(prices).all(), "missing data"
+    assert states >= 2, "at least an empty and a full state"
+    if import_premium is None:
+        import_premium = config.BATTERY_IMPORT_PREMIUM
+
+    levels = np.linspace(0.0, battery.capacity, states)
+    unit = levels[1]
+    initial = int(round(battery.initial_soc * (states - 1)))
+
+    # moves of up to the power of the battery, in grid states
+    reach = min(int(battery.power * step / unit + 1e-9), states - 1)
+    moves = np.arange(-reach, reach + 1)
+    targets = np.arange(states)[:, None] + moves[None, :]
+    blocked = np.where((targets >= 0) & (targets < states), 0.0, -np.inf)
+    targets = np.clip(targets, 0, states - 1)
+
+    # power drawn from the site per move, losses on both ways
+    stored = moves * unit
+    loss = np.sqrt(battery.efficiency)
+    charge = np.where(stored > 0, stored / loss, stored * loss) / step
+
+    # end at least as full as at the start
+    value = np.where(np.arange(states) >= initial, 0.0, -np.inf)
+    policy = np.empty((len(net_power), states), dtype=np.intp)
+    rows = np.arange(states)
+    for t in reversed(range(len(net_power))):
+        reward = settlement(net_power[t] - charge, prices[t], import_premium) * step
+        total = reward[None, :] + value[targets] + blocked
+        policy[t] = total.argmax(axis=1)
+        value = total[rows, policy[t]]
+
+    state = initial
+    chosen = np.empty(len(net_power), dtype=np.intp)
+    soc = np.empty(len(net_power))
+    for t in range(len(net_power)):
+        chosen[t] = policy[t, state]
+        state = targets[state, chosen[t]]
+        soc[t] = levels[state]
+    return Schedule(
+        charge=charge[chosen],
+        soc=soc,
+        position=net_power - charge[chosen],
+        value=float(value[initial]),
+    )
@@ -26,7 +26,7 @@ def bogo_bidder(**kwargs):
     energy = kwargs["energy"]
 
     # get output template, the orders must be 2 days ahead to be accepted
-    df = get_output_template()
+    df = get_output_template(kwargs.get("applying_date"), kwargs.get("days", 1))
     for i in range(len(df)):
         df.loc[i, "volume"] = (
             random.random() * 100 + 50
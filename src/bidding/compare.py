@@ -0,0 +1,115 @@
+"""Dry-run evaluation of several bidders on one shared data snapshot.
+
+The queries of all selected bidders are bound to their arguments first and
+every distinct (query, parameters) pair is run once, so bidders declaring the
+same queries share the results. The bidders then run concurrently on copies
+of the snapshot and their books are returned without placing any order.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from src.bidding.util import BIDDERS, check_outputs, read_template
+from src.storage.storage import bind_template
+
+
+def select_bidders(names: List[str] = None) -> Dict[str, Callable]:
+    """Returns the registered bidders by name, all of them by default."""
+    if not names:
+        return {name: fn for name, fn in BIDDERS.items() if name != "default"}
+    for name in names:
+        assert name in BIDDERS, f"unknown bidder: {name}"
+    return {name: BIDDERS[name] for name in names}
+
+
+def resolve_args(bidder) -> dict:
+    return {k: v() if callable(v) else v for k, v in bidder.args.items()}
+
+
+def fetch_snapshot(bidders: Dict[str, Callable], storage=None) -> Tuple[dict, dict]:
+    """Runs the distinct queries of `bidders` once.
+
+    Returns:
+        Tuple[dict, dict]: The inputs of every bidder (name -> data key ->
+            pd.DataFrame) and the number of declared and executed queries.
+    """
+    results: Dict[Tuple[str, tuple], pd.DataFrame] = {}
+    inputs = {}
+    declared = 0
+    for name, bidder in bidders.items():
+        args = resolve_args(bidder)
+        inputs[name] = {}
+        for key, template in bidder.data.items():
+            bound = bind_template(template, **args)
+            if bound not in results:
+                results[bound] = read_template(template, storage, **args)
+            inputs[name][key] = results[bound]
+            declared += 1
+    return inputs, {"declared": declared, "executed": len(results)}
+
+
+def _run_bidder(bidder, data: dict, applying_date: date, days: int) -> pd.DataFrame:
+    # bidders may modify their inputs, the snapshot is shared
+    data = {key: frame.copy() for key, frame in data.items()}
+    outputs = bidder.fn(
+        **data, **resolve_args(bidder), applying_date=applying_date, days=days
+    )
+    check_outputs(outputs)
+    return outputs
+
+
+def evaluate_bidders(
+    names: List[str] = None,
+    applying_date: date = None,
+    days: int = 1,
+    max_workers: int = 4,
+) -> Tuple[Dict[str, dict], dict]:
+    """Runs bidders concurrently on a shared snapshot without placing orders.
+
+    Args:
+        names (List[str]): Bidders to run, all registered ones by default.
+        applying_date (date): First date of the books, defaults to the
+            bidders'.
+        days (int): Number of applying dates planned by every bidder.
+        max_workers (int): Number of bidders running at the same time.
+
+    Returns:
+        Tuple[Dict[str, dict], dict]: Per bidder either `{"orders": frame}`
+            or `{"error": message}`, and the query counts of the snapshot.
+    """
+    bidders = select_bidders(names)
+    inputs, queries = fetch_snapshot(bidders)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name: executor.submit(
+                _run_bidder, bidder, inputs[name], applying_date, days
+            )
+            for name, bidder in bidders.items()
+        }
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = {"orders": future.result()}
+        except Exception as e:
+            results[name] = {"error": str(e)}
+    return results, queries
+
+
+def side_by_side(books: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Joins order books on `applying_date` and `hour_ID`.
+
+    Returns:
+        pd.DataFrame: One row per hour, with `<bidder>.volume`,
+            `<bidder>.price` and `<bidder>.type` columns.
+    """
+    keys = ["applying_date", "hour_ID"]
+    table = None
+    for name, orders in books.items():
+        orders = orders.set_index(keys)[["volume", "price", "type"]]
+        orders.columns = [f"{name}.{col}" for col in orders.columns]
+        table = orders if table is None else table.join(orders, how="outer")
+    if table is None:
+        return pd.DataFrame(columns=keys)
+    return table.sort_index().reset_index()
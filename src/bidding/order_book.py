@@ -0,0 +1,227 @@
+"""Last submitted order book per applying date, to only resend changed hours."""
+import json
+import logging
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from src.common.metrics import RSE_BYTES_SENT, RSE_HOURS, RSE_SUBMISSIONS, metrics
+from src.storage.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# (applying_date, hour_ID) identifies an order of the book
+OrderKey = Tuple[str, int]
+
+TABLE = "orderBook"
+
+
+def _key(order: dict) -> OrderKey:
+    return order["applying_date"], int(order["hour_ID"])
+
+
+class OrderBook:
+    """Books submitted to the RSE, keyed by applying date.
+
+    Args:
+        keep_days (int): Number of applying dates remembered, the oldest are
+            forgotten first.
+        connect (Callable[[], Storage]): Opens a connection to the database
+            keeping the books, shared by the submitting processes. Without
+            it the books are only kept in memory, for a single process.
+
+    Attributes:
+        metrics (Dict[str, int]): Counters of submissions, skipped
+            submissions, hours sent and skipped and bytes sent by this
+            process, see `shared_metrics` for those of all processes.
+    """
+
+    def __init__(self, keep_days: int = 7, connect: Callable[[], Storage] = None):
+        self.keep_days = keep_days
+        self.connect = connect
+        self._books: Dict[str, Dict[int, dict]] = {}
+        self._lock = threading.Lock()
+        self._created = False
+        self.metrics = {
+            "submissions": 0,
+            "submissions_skipped": 0,
+            "hours_sent": 0,
+            "hours_skipped": 0,
+            "bytes_sent": 0,
+        }
+
+    @property
+    def shared(self) -> bool:
+        """Whether the books are kept in the database."""
+        return self.connect is not None
+
+    def create_table(self, conn) -> None:
+        """Creates the table of the books if it does not exist yet."""
+        conn.cursor().execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} (applying_date CHAR(10) "
+            "NOT NULL, hour_ID INTEGER NOT NULL, record TEXT NOT NULL, "
+            "PRIMARY KEY (applying_date, hour_ID))"
+        )
+        conn.commit()
+        self._created = True
+
+    def _storage(self) -> Storage:
+        storage = self.connect()
+        assert storage is not None, "no database connection"
+        if not self._created:
+            self.create_table(storage)
+        return storage
+
+    def _load(self, applying_dates: List[str]) -> Dict[str, Dict[int, dict]]:
+        if not self.shared:
+            with self._lock:
+                return {d: dict(self._books.get(d, {})) for d in applying_dates}
+        storage = self._storage()
+        try:
+            cursor = storage.cursor()
+            cursor.execute(
+                f"SELECT applying_date, hour_ID, record FROM {TABLE} "
+                f"WHERE applying_date IN ({', '.join('?' for _ in applying_dates)})",
+                tuple(applying_dates),
+            )
+            books = {d: {} for d in applying_dates}
+            for applying_date, hour, record in cursor.fetchall():
+                books[applying_date][int(hour)] = json.loads(record)
+            return books
+        finally:
+            storage.close()
+
+    def diff(self, orders: List[dict]) -> List[dict]:
+        """Returns the orders differing from the last submitted book.
+
+        All orders are returned if the shared books cannot be read.
+        """
+        if not orders:
+            return []
+        try:
+            books = self._load(sorted({order["applying_date"] for order in orders}))
+        except Exception as e:
+            logger.warning(f"could not read the order books, sending all: {e}")
+            return list(orders)
+        return [
+            order
+            for order in orders
+            if books[order["applying_date"]].get(int(order["hour_ID"])) != order
+        ]
+
+    def discard(self, orders: List[dict]) -> None:
+        """Forgets the hours of orders about to be sent.
+
+        Until the RSE accepted them, the hours of the RSE are unknown and
+        must be sent again, even if recording the accepted orders fails.
+        """
+        if not self.shared:
+            with self._lock:
+                for order in orders:
+                    applying_date, hour = _key(order)
+                    self._books.get(applying_date, {}).pop(hour, None)
+            return
+        try:
+            storage = self._storage()
+        except Exception as e:
+            logger.warning(f"could not update the order books: {e}")
+            return
+        try:
+            storage.cursor().executemany(
+                f"DELETE FROM {TABLE} WHERE applying_date = ? AND hour_ID = ?",
+                [_key(order) for order in orders],
+            )
+            storage.commit()
+        except Exception as e:
+            logger.warning(f"could not update the order books: {e}")
+        finally:
+            storage.close()
+
+    def record(self, orders: List[dict]) -> None:
+        """Stores orders accepted by the RSE as the current book."""
+        if not self.shared:
+            with self._lock:
+                for order in orders:
+                    applying_date, hour = _key(order)
+                    self._books.setdefault(applying_date, {})[hour] = order
+                for applying_date in sorted(self._books)[: -self.keep_days]:
+                    del self._books[applying_date]
+            return
+        try:
+            storage = self._storage()
+        except Exception as e:
+            logger.warning(f"could not record the order book: {e}")
+            return
+        try:
+            cursor = storage.cursor()
+            cursor.executemany(
+                f"REPLACE INTO {TABLE} (applying_date, hour_ID, record) "
+                "VALUES (?, ?, ?)",
+                [(*_key(order), json.dumps(order)) for order in orders],
+            )
+            cursor.execute(
+                f"SELECT DISTINCT applying_date FROM {TABLE} "
+                "ORDER BY applying_date DESC"
+            )
+            expired = [row[0] for row in cursor.fetchall()][self.keep_days :]
+            if expired:
+                cursor.execute(
+                    f"DELETE FROM {TABLE} WHERE applying_date <= ?", (expired[0],)
+                )
+            storage.commit()
+        except Exception as e:
+            logger.warning(f"could not record the order book: {e}")
+            storage.rollback()
+        finally:
+            storage.close()
+
+    def book(self, applying_date: str) -> List[dict]:
+        """Returns the last submitted orders of an applying date."""
+        book = self._load([applying_date])[applying_date]
+        return [book[hour] for hour in sorted(book)]
+
+    def count(self, total: int, sent: int, nbytes: int) -> None:
+        """Updates the metrics after `sent` of `total` orders were sent."""
+        with self._lock:
+            if sent:
+                self.metrics["submissions"] += 1
+            else:
+                self.metrics["submissions_skipped"] += 1
+            self.metrics["hours_sent"] += sent
+            self.metrics["hours_skipped"] += total - sent
+            self.metrics["bytes_sent"] += nbytes
+        RSE_HOURS.inc(sent, outcome="sent")
+        RSE_HOURS.inc(total - sent, outcome="skipped")
+        RSE_BYTES_SENT.inc(nbytes)
+
+    def forget(self) -> None:
+        """Drops all books, e.g. when the RSE state was reset."""
+        with self._lock:
+            self._books.clear()
+        if self.shared:
+            storage = self._storage()
+            try:
+                storage.cursor().execute(f"DELETE FROM {TABLE}")
+                storage.commit()
+            finally:
+                storage.close()
+
+
+def shared_metrics() -> Dict[str, int]:
+    """The `OrderBook.metrics` of all processes, see `src/common/metrics.py`."""
+    families = metrics.collect()
+
+    def values(name: str) -> Dict[str, float]:
+        family = families.get(name, {"values": []})
+        return {
+            labels[0] if labels else "": value for labels, value in family["values"]
+        }
+
+    submissions = values(RSE_SUBMISSIONS.name)
+    hours = values(RSE_HOURS.name)
+    return {
+        "submissions": int(submissions.get("ok", 0) + submissions.get("failed", 0)),
+        "submissions_skipped": int(submissions.get("skipped", 0)),
+        "hours_sent": int(hours.get("sent", 0)),
+        "hours_skipped": int(hours.get("skipped", 0)),
+        "bytes_sent": int(values(RSE_BYTES_SENT.name).get("", 0)),
+    }
@@ -0,0 +1,290 @@
+"""Client submitting the orders to the RSE auction API.
+
+A single keep-alive session is shared by all submissions, every request has
+a bounded (connect, read) timeout and failed attempts are retried with
+exponential backoff. Only attempts the RSE cannot have acted on are retried:
+connections that could not be opened and `429`/`503` answers. After a read
+timeout the orders may have been set, so the submission fails instead of
+sending them twice; every attempt also carries the submission id as
+`Idempotency-Key`. Submissions can run in a small thread pool so the calling
+worker does not wait for the RSE; their results are kept by id, in the
+database when a `SubmissionStore` is given so any worker can report them.
+
+Only the hours differing from the last book accepted for their applying date
+are sent, see `OrderBook`; the server keeps the books in its database so all
+workers compare against the same ones.
+"""
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from src.bidding.order_book import OrderBook
+from src.bidding.submissions import SubmissionStore
+from src.common.metrics import RSE_SUBMISSIONS, RSE_SUBMIT_SECONDS
+import src.config as config
+from src.storage.storage import Storage
+
+# status codes of requests the RSE did not act on, worth retrying
+RETRY_STATUS = {429, 503}
+
+
+def _not_sent(error: requests.RequestException) -> bool:
+    """Whether a request failed before reaching the RSE."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class SubmissionResult:
+    """Outcome of one order submission.
+
+    Attributes:
+        id (str): Id of the submission.
+        status (str): `pending`, `ok`, `failed` or `skipped` when the book
+            did not change.
+        orders (int): Number of orders sent.
+        attempts (int): Number of requests sent.
+        elapsed (float): Seconds from the first attempt to the result.
+        response (requests.Response): Last response received, if any.
+        error (str): Last error, if no response was received.
+    """
+
+    def __init__(self, id: str):
+        self.id = id
+        self.status = "pending"
+        self.orders = 0
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.response = None
+        self.error = None
+
+    def to_dict(self) -> dict:
+        result = {
+            "id": self.id,
+            "status": self.status,
+            "orders": self.orders,
+            "attempts": self.attempts,
+            "elapsed": round(self.elapsed, 4),
+        }
+        if self.response is not None:
+            result["status_code"] = self.response.status_code
+            try:
+                result["response"] = self.response.json()
+            except ValueError:
+                result["response"] = self.response.text
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+
+class RSEClient:
+    """Pooled, retrying client of the RSE bidding endpoint.
+
+    Args:
+        addr (str): `host:port` of the RSE API.
+        key (str): API key sent with the orders.
+        timeout (Tuple[float, float]): Connect and read timeouts in seconds.
+        retries (int): Retries after the first attempt.
+        backoff (float): Delay before the first retry, doubled for each
+            further retry.
+        max_workers (int): Threads running asynchronous submissions, also the
+            size of the connection pool.
+        keep_results (int): Number of finished submissions kept for lookups.
+        book (OrderBook): Last submitted books, a new one by default.
+        submissions (SubmissionStore): Where the results are shared with the
+            other processes, they are only kept in this one without.
+    """
+
+    def __init__(
+        self,
+        addr: str,
+        key: str,
+        timeout: Tuple[float, float] = (3.05, 10.0),
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_workers: int = 4,
+        keep_results: int = 100,
+        book: OrderBook = None,
+        submissions: SubmissionStore = None,
+    ):
+        assert retries >= 0, f"retries must not be negative, got: {retries}"
+        self.url = f"http://{addr}/auction/bidding/set"
+        self.key = key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.keep_results = keep_results
+        self.book = book or OrderBook()
+        self.submissions = submissions
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="rse-orders"
+        )
+        self._results: Dict[str, SubmissionResult] = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def _post(
+        self, orders: List[dict], total: int, result: SubmissionResult
+    ) -> SubmissionResult:
+        body = json.dumps(dict(key=self.key, orders=orders)).encode()
+        headers = {"Content-Type": "application/json", "Idempotency-Key": result.id}
+        result.orders = len(orders)
+        self.book.discard(orders)
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            result.attempts += 1
+            try:
+                resp = self.session.post(
+                    self.url, data=body, headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result.error = str(e)
+                if _not_sent(e):
+                    continue
+                break
+            result.response, result.error = resp, None
+            if resp.status_code not in RETRY_STATUS:
+                break
+        result.elapsed = time.perf_counter() - start
+        ok = result.response is not None and result.response.ok
+        result.status = "ok" if ok else "failed"
+        RSE_SUBMISSIONS.inc(status=result.status)
+        RSE_SUBMIT_SECONDS.observe(result.elapsed)
+        if ok:
+            self.book.record(orders)
+        self.book.count(total, len(orders), len(body) * result.attempts)
+        self._share(result)
+        return result
+
+    def _changed(self, orders: pd.DataFrame, full: bool) -> Tuple[List[dict], int]:
+        records = json.loads(orders.to_json(orient="records"))
+        changed = records if full else self.book.diff(records)
+        return changed, len(records)
+
+    def _skip(self, total: int) -> SubmissionResult:
+        result = self._new_result()
+        result.status = "skipped"
+        RSE_SUBMISSIONS.inc(status="skipped")
+        self.book.count(total, 0, 0)
+        self._share(result)
+        return result
+
+    def _new_result(self) -> SubmissionResult:
+        result = SubmissionResult(f"{next(self._ids)}-{uuid.uuid4().hex[:8]}")
+        with self._lock:
+            self._results[result.id] = result
+            while len(self._results) > self.keep_results:
+                self._results.popitem(last=False)
+        return result
+
+    def _share(self, result: SubmissionResult) -> None:
+        if self.submissions is not None:
+            self.submissions.save(result.to_dict())
+
+    def submit(self, orders: pd.DataFrame, full: bool = False) -> SubmissionResult:
+        """Submits the changed orders and waits for the result.
+
+        Args:
+            orders (pd.DataFrame): Orders as returned by a bidder.
+            full (bool): Whether to send every order, even unchanged ones.
+        """
+        changed, total = self._changed(orders, full)
+        if not changed:
+            return self._skip(total)
+        return self._post(changed, total, self._new_result())
+
+    def submit_async(
+        self,
+        orders: pd.DataFrame,
+        callback: Callable[[SubmissionResult], None] = None,
+        full: bool = False,
+    ) -> Tuple[str, Future]:
+        """Submits the changed orders in the background.
+
+        Args:
+            orders (pd.DataFrame): Orders as returned by a bidder.
+            callback (Callable[[SubmissionResult], None]): Called with the
+                result once the submission finished.
+            full (bool): Whether to send every order, even unchanged ones.
+
+        Returns:
+            Tuple[str, Future]: Id of the submission, see `result`, and a
+                future resolving to its `SubmissionResult`.
+        """
+        changed, total = self._changed(orders, full)
+        if changed:
+            result = self._new_result()
+            self._share(result)
+            future = self._executor.submit(self._post, changed, total, result)
+        else:
+            result = self._skip(total)
+            future = Future()
+            future.set_result(result)
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(f.result()))
+        return result.id, future
+
+    def result(self, id: str) -> Optional[SubmissionResult]:
+        """Returns a submission of this process by id, `None` once dropped."""
+        with self._lock:
+            return self._results.get(id)
+
+    def status(self, id: str) -> Optional[dict]:
+        """Returns a submission of any process by id, as `to_dict`."""
+        result = self.result(id)
+        if result is not None:
+            return result.to_dict()
+        if self.submissions is not None:
+            return self.submissions.get(id)
+        return None
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(connect: Callable[[], Storage] = None) -> RSEClient:
+    """Returns the client shared by the bidders of this process.
+
+    Args:
+        connect (Callable[[], Storage]): Opens the database keeping the order
+            books and the submission results, only used by the call creating
+            the client.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = RSEClient(
+                    config.AIMLAC_RSE_ADDR,
+                    config.AIMLAC_RSE_KEY,
+                    timeout=(config.RSE_CONNECT_TIMEOUT, config.RSE_READ_TIMEOUT),
+                    retries=config.RSE_RETRIES,
+                    backoff=config.RSE_BACKOFF,
+                    book=OrderBook(connect=connect),
+                    submissions=SubmissionStore(connect) if connect else None,
+                )
+    return _client
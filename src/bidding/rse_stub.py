@@ -0,0 +1,130 @@
+"""Local stand-in for the RSE bidding API, for tests and latency benchmarks.
+
+The stub accepts `POST /auction/bidding/set` like the real API, records the
+submitted orders and can add latency or fail the first requests to exercise
+the retries of `RSEClient`. A submission repeating the `Idempotency-Key` of
+an accepted one is answered without setting its orders again.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+
+class RSEStub:
+    """RSE stand-in running in a background thread.
+
+    Args:
+        host (str): Interface to listen on.
+        port (int): Port to listen on, 0 picks a free one.
+        latency (float): Seconds every request is delayed.
+        fail_first (int): Number of requests answered with a 503 first.
+        key (str): Expected API key, any key is accepted if `None`.
+
+    Attributes:
+        submissions (List[dict]): Bodies of the accepted submissions.
+        duplicates (int): Number of repeated submissions ignored.
+        requests (int): Number of requests received.
+        connections (int): Number of TCP connections accepted.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        fail_first: int = 0,
+        key: str = None,
+    ):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.key = key
+        self.submissions: List[dict] = []
+        self.duplicates = 0
+        self._keys = set()
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def addr(self) -> str:
+        """`host:port` of the stub, as in `AIMLAC_RSE_ADDR`."""
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, do not wait for acks
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                with stub._lock:
+                    stub.requests += 1
+                    fail = stub.requests <= stub.fail_first
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if self.path != "/auction/bidding/set":
+                    return self._reply(404, {"message": "not found"})
+                if fail:
+                    return self._reply(503, {"message": "unavailable"})
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    return self._reply(400, {"message": "invalid json"})
+                if stub.key is not None and payload.get("key") != stub.key:
+                    return self._reply(401, {"message": "invalid key"})
+                orders = payload.get("orders", [])
+                key = self.headers.get("Idempotency-Key")
+                with stub._lock:
+                    if key is not None and key in stub._keys:
+                        stub.duplicates += 1
+                    else:
+                        stub._keys.add(key)
+                        stub.submissions.append(payload)
+                self._reply(200, {"message": "orders set", "orders": len(orders)})
+
+        return Handler
+
+    def start(self) -> "RSEStub":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="rse-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "RSEStub":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
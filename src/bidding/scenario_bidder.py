@@ -0,0 +1,192 @@
+"""Bidder choosing the book with the best expected value over many scenarios.
+
+Joint net power and price scenarios are sampled around the point predictions:
+the errors are Gaussian, correlated between power and price and across
+consecutive hours (AR(1)). For every hour a grid of candidate positions
+(quantiles of the net power scenarios) and limit prices (quantiles of the
+price scenarios) is scored against all scenarios at once and the candidate
+with the highest mean value is bid.
+
+Value of a candidate in one scenario: the accepted orders are settled at the
+scenario price, the difference between the scenario net power and the
+accepted position is settled as imbalance, a surplus at
+`price * (1 - imbalance_penalty)` and a shortfall at
+`price * (1 + imbalance_penalty)`.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.bidding.util import MAX_DAYS, hourly_inputs, register_bidder
+
+# quantile levels of the candidate positions and limit prices
+POSITION_LEVELS = np.linspace(0.05, 0.95, 10)
+PRICE_LEVELS = np.array([0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0])
+# hours scored per vectorized step, bounds the memory to ~30 MB per step
+CHUNK_HOURS = 24
+
+
+def sample_scenarios(
+    net_power: np.ndarray,
+    price: np.ndarray,
+    n: int,
+    power_sd: float,
+    price_sd: float,
+    rho: float = 0.0,
+    ar: float = 0.0,
+    seed: int = None,
+):
+    """Samples joint net power and price scenarios around point predictions.
+
+    Args:
+        net_power (np.ndarray): Predicted net power per hour.
+        price (np.ndarray): Predicted price per hour.
+        n (int): Number of scenarios.
+        power_sd (float): Standard deviation of the net power error, relative
+            to the absolute prediction.
+        price_sd (float): Standard deviation of the price error.
+        rho (float): Correlation between the power and price errors.
+        ar (float): Correlation of the errors of consecutive hours.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Net power and price scenarios, both
+            (n x hours).
+    """
+    assert -1 < rho < 1 and -1 < ar < 1, "correlations must be within (-1, 1)"
+    hours = len(net_power)
+    rng = np.random.default_rng(seed)
+    z = rng.standard_normal((2, n, hours))
+
+    # AR(1) across hours through the Cholesky factor of its covariance
+    lags = np.abs(np.subtract.outer(np.arange(hours), np.arange(hours)))
+    chol = np.linalg.cholesky(ar**lags)
+    z = z @ chol.T
+    power_error = z[0]
+    price_error = rho * z[0] + np.sqrt(1 - rho**2) * z[1]
+
+    power = net_power + power_sd * np.abs(net_power) * power_error
+    prices = price + price_sd * price_error
+    return power, prices
+
+
+def expected_values(
+    positions: np.ndarray,
+    limits: np.ndarray,
+    power: np.ndarray,
+    prices: np.ndarray,
+    imbalance_penalty: float,
+) -> np.ndarray:
+    """Mean value of candidate orders over the scenarios.
+
+    Args:
+        positions (np.ndarray): Candidate positions (hours x P), positive to
+            sell and negative to buy.
+        limits (np.ndarray): Candidate limit prices (hours x L).
+        power (np.ndarray): Net power scenarios (n x hours).
+        prices (np.ndarray): Price scenarios (n x hours).
+        imbalance_penalty (float): Relative penalty of the imbalance price.
+
+    Returns:
+        np.ndarray: Expected value of every candidate (hours x P x L).
+    """
+    # scenario axis last: (hours, P, L, n)
+    position = positions[:, :, None, None]
+    limit = limits[:, None, :, None]
+    price = prices.T[:, None, None, :]
+    actual = power.T[:, None, None, :]
+
+    sell = position > 0
+    accepted = np.where(sell, price >= limit, price <= limit)
+    contracted = position * accepted
+    imbalance = actual - contracted
+    settlement = np.where(
+        imbalance > 0,
+        imbalance * price * (1 - imbalance_penalty),
+        imbalance * price * (1 + imbalance_penalty),
+    )
+    return (contracted * price + settlement).mean(axis=-1)
+
+
+def best_orders(
+    power: np.ndarray, prices: np.ndarray, imbalance_penalty: float
+) -> tuple:
+    """Picks the expected-value maximizing position and limit of every hour.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Position, limit price and
+            expected value per hour.
+    """
+    hours = power.shape[1]
+    positions = np.quantile(power, POSITION_LEVELS, axis=0).T
+    positions = np.concatenate([np.zeros((hours, 1)), positions], axis=1)
+    limits = np.quantile(prices, PRICE_LEVELS, axis=0).T
+
+    best_position = np.empty(hours)
+    best_limit = np.empty(hours)
+    best_value = np.empty(hours)
+    for start in range(0, hours, CHUNK_HOURS):
+        part = slice(start, start + CHUNK_HOURS)
+        values = expected_values(
+            positions[part],
+            limits[part],
+            power[:, part],
+            prices[:, part],
+            imbalance_penalty,
+        )
+        flat = values.reshape(len(values), -1).argmax(axis=1)
+        p, l = np.unravel_index(flat, values.shape[1:])
+        rows = np.arange(len(values))
+        best_position[part] = positions[part][rows, p]
+        best_limit[part] = limits[part][rows, l]
+        best_value[part] = values[rows, p, l]
+    return best_position, best_limit, best_value
+
+
+@register_bidder(
+    "scenario-bidder",
+    args={
+        "start_date": lambda: date.today() - timedelta(days=1),
+        "end_date": lambda: date.today() + timedelta(days=MAX_DAYS + 1),
+        "n_scenarios": 2000,
+        "power_sd": 0.25,
+        "price_sd": 8.0,
+        "rho": -0.3,
+        "ar": 0.7,
+        "imbalance_penalty": 0.2,
+        "seed": None,
+    },
+    data={
+        "power": 'SELECT time, (WindPower + SolarPower - HQPowerDemand) * 1000 AS NetPower FROM powerPrediction WHERE time > "{start_date}" AND time < "{end_date}"',
+        "price": 'SELECT * FROM pricePrediction WHERE time > "{start_date}" AND time < "{end_date}"',
+    },
+)
+def scenario_bidder(**kwargs):
+    power = kwargs["power"]
+    price = kwargs["price"]
+    df, volume, predicted_price, known = hourly_inputs(
+        power, price, kwargs.get("applying_date"), kwargs.get("days", 1)
+    )
+    df = df[known]
+    if df.empty:
+        return df
+
+    power_scenarios, price_scenarios = sample_scenarios(
+        volume[known],
+        predicted_price[known],
+        n=kwargs["n_scenarios"],
+        power_sd=kwargs["power_sd"],
+        price_sd=kwargs["price_sd"],
+        rho=kwargs["rho"],
+        ar=kwargs["ar"],
+        seed=kwargs["seed"],
+    )
+    position, limit, _ = best_orders(
+        power_scenarios, price_scenarios, kwargs["imbalance_penalty"]
+    )
+    df = df.assign(
+        volume=np.abs(position),
+        price=np.round(limit, 2),
+        type=np.where(position < 0, "BUY", "SELL"),
+    )
+    return df
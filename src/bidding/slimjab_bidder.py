@@ -1,17 +1,20 @@
-import random
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 
 import numpy as np
-import pandas as pd
 
-from src.bidding.util import get_output_template, register_bidder
+from src.battery import dispatch, get_battery
+from src.bidding.util import MAX_DAYS, hourly_inputs, register_bidder
+
+# NetPower is queried in W, the battery works in kW
+NET_POWER_PER_KW = 1000
 
 
 @register_bidder(
     "slimjab-bidder",
     args={
         "start_date": lambda: date.today() - timedelta(days=1),
-        "end_date": lambda: date.today() + timedelta(days=2),
+        # covers the longest multi-day horizon, hours without data are skipped
+        "end_date": lambda: date.today() + timedelta(days=MAX_DAYS + 1),
     },
     data={
         "power": 'SELECT time, (WindPower + SolarPower - HQPowerDemand) * 1000 AS NetPower FROM powerPrediction WHERE time > "{start_date}" AND time < "{end_date}"',
@@ -20,27 +23,22 @@ from src.bidding.util import get_output_template, register_bidder
     default=True,
 )
 def slimjab_bidder(**kwargs):
-    power = kwargs["power"].set_index("time")
-    price = kwargs["price"].set_index("time")
-    df = get_output_template()
-    for i in range(len(df)):
-        time = np.datetime64(
-            f'{df.loc[i, "applying_date"]} {str(df.loc[i, "hour_ID"] - 1).zfill(2)}'
-        )
-        if (
-            not f"{time}:00:00" in power.index
-            or not f"{time}:30:00" in power.index
-            or not f"{time}:00:00" in price.index
-        ):
-            df = df.drop(i)
-            continue
+    power = kwargs["power"]
+    price = kwargs["price"]
+    # the target date is passed explicitly so concurrent callers don't share state
+    # hours without both half hours of power or without a price are not bid
+    df, volume, estimated_price, known = hourly_inputs(
+        power, price, kwargs.get("applying_date"), kwargs.get("days", 1)
+    )
 
-        volume = (
-            power.loc[f"{time}:00:00", "NetPower"]
-            + power.loc[f"{time}:30:00", "NetPower"]
-        ) / 2
-        estimatedPrice = price.loc[f"{time}:00:00", "price"]
-        df.loc[i, "volume"] = abs(volume)
-        df.loc[i, "price"] = estimatedPrice
-        df.loc[i, "type"] = "BUY" if volume < 0 else "SELL"
-    return df
+    # with storage, bid the net position left after the optimal dispatch
+    battery = kwargs.get("battery") or get_battery()
+    if battery is not None and known.any():
+        schedule = dispatch(
+            volume[known] / NET_POWER_PER_KW, estimated_price[known], battery
+        )
+        volume[known] = schedule.position * NET_POWER_PER_KW
+    df["volume"] = np.abs(volume)
+    df["price"] = estimated_price
+    df["type"] = np.where(volume < 0, "BUY", "SELL")
+    return df[known]
@@ -0,0 +1,84 @@
+"""Status of the order submissions by id, kept in the database so any
+worker can answer `GET /bid/status/<id>`."""
+import json
+import logging
+from datetime import datetime
+from typing import Callable, Optional
+
+from src.storage.storage import TIME_FORMAT, Storage
+
+logger = logging.getLogger(__name__)
+
+TABLE = "orderSubmissions"
+
+
+class SubmissionStore:
+    """Results of the latest submissions, as `SubmissionResult.to_dict`.
+
+    Args:
+        connect (Callable[[], Storage]): Opens a connection to the database
+            keeping the results.
+        keep (int): Number of submissions kept, the oldest are dropped first.
+    """
+
+    def __init__(self, connect: Callable[[], Storage], keep: int = 100):
+        self.connect = connect
+        self.keep = keep
+        self._created = False
+
+    def create_table(self, conn) -> None:
+        """Creates the table of the results if it does not exist yet."""
+        conn.cursor().execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} (id VARCHAR(64) PRIMARY KEY, "
+            "updated DATETIME NOT NULL, result TEXT NOT NULL)"
+        )
+        conn.commit()
+        self._created = True
+
+    def _storage(self) -> Storage:
+        storage = self.connect()
+        assert storage is not None, "no database connection"
+        if not self._created:
+            self.create_table(storage)
+        return storage
+
+    def save(self, result: dict) -> None:
+        """Stores the result of a submission, errors are only logged."""
+        try:
+            storage = self._storage()
+        except Exception as e:
+            logger.warning(f"could not store submission {result['id']}: {e}")
+            return
+        try:
+            cursor = storage.cursor()
+            cursor.execute(
+                f"REPLACE INTO {TABLE} (id, updated, result) VALUES (?, ?, ?)",
+                (
+                    result["id"],
+                    datetime.utcnow().strftime(TIME_FORMAT),
+                    json.dumps(result),
+                ),
+            )
+            cursor.execute(f"SELECT id FROM {TABLE} ORDER BY updated DESC, id DESC")
+            expired = [row[0] for row in cursor.fetchall()][self.keep :]
+            if expired:
+                cursor.executemany(
+                    f"DELETE FROM {TABLE} WHERE id = ?", [(id,) for id in expired]
+                )
+            storage.commit()
+        except Exception as e:
+            logger.warning(f"could not store submission {result['id']}: {e}")
+            storage.rollback()
+        finally:
+            storage.close()
+
+    def get(self, id: str) -> Optional[dict]:
+        """Returns the result of a submission, `None` if unknown."""
+        storage = self._storage()
+        try:
+            cursor = storage.cursor()
+            cursor.execute(f"SELECT result FROM {TABLE} WHERE id = ?", (id,))
+            row = cursor.fetchone()
+        finally:
+            storage.close()
+        return None if row is None else json.loads(row[0])
@@ -1,51 +1,99 @@
-import json
 from datetime import date, datetime, timedelta
 
+import numpy as np
 import pandas as pd
-import requests
 from flask import g
 
-import src.config as config
+from src.bidding.rse_client import get_client
+from src.common.metrics import CACHE_REQUESTS
+from src.common.scheduler import get_scheduler
+from src.common.timing import timed
 
 BIDDERS = {}
+HOURS = 24
+# longest horizon a bidder can be asked to plan, in auction days
+MAX_DAYS = 7
 
 
 def check_outputs(frame):
     """check frame contains these columns:
     hour_ID, applying_date, volume, price, type
+
+    books may span several applying dates, all rows are checked at once
     """
     assert isinstance(frame, pd.DataFrame), f"expect pd.Dataframe, got: {type(frame)}"
     for col in ["hour_ID", "applying_date", "volume", "price", "type"]:
         assert col in frame.columns, f"missing column: {col}"
+    if frame.empty:
+        return
+    hours = pd.to_numeric(frame.hour_ID, errors="coerce")
+    assert hours.between(1, HOURS).all(), f"hour_ID must be within 1-{HOURS}"
+    dates = pd.to_datetime(frame.applying_date, format="%Y-%m-%d", errors="coerce")
+    assert dates.notna().all(), "applying_date must be YYYY-MM-DD"
+    assert frame.type.isin(["BUY", "SELL"]).all(), "type must be BUY or SELL"
+    duplicated = frame.duplicated(subset=["applying_date", "hour_ID"])
+    assert not duplicated.any(), "duplicated hour_ID for an applying_date"
 
 
 def parse_data(data, kwargs):
     """query the database for data to feed into the bidder function"""
     assert isinstance(data, dict), f"expect a `dict`, got: {type(data)}"
     parsed_data = {}
-    conn = g.get_conn()
     resolved_kwargs = {k: v() if callable(v) else v for k, v in kwargs.items()}
     for key, query in data.items():
-        parsed_data[key] = pd.read_sql(query.format(**resolved_kwargs), conn)
+        parsed_data[key] = read_template(query, **resolved_kwargs)
     return parsed_data
 
 
+def read_template(template, storage=None, **kwargs):
+    """run a bidder query, from the warm in-memory predictions if possible
+
+    in the process running the scheduler, its materialized predictions are
+    used when they are fresh, the query only reads prediction tables and
+    they are as recent as the database, the database otherwise
+    """
+    storage = storage or g.get_conn()
+    scheduler = get_scheduler()
+    if scheduler is None:
+        # no materialized predictions in this process, nothing to count
+        return storage.read_template(template, **kwargs)
+    if (
+        scheduler.warm()
+        and scheduler.materialized.covers(template)
+        and scheduler.materialized.current(storage, template)
+    ):
+        CACHE_REQUESTS.inc(cache="predictions", result="hit")
+        return scheduler.materialized.read_template(template, **kwargs)
+    CACHE_REQUESTS.inc(cache="predictions", result="miss")
+    return storage.read_template(template, **kwargs)
+
+
 def register_bidder(name, *, args={}, data=None, default=False):
     """function wrapper to register and pre-process the bidder functions"""
 
     def wrapper(fn):
-        def bidder_function(**kwargs):
+        def bidder_function(asynchronous=False, full=False, **kwargs):
             """bidding procedure:
             1. query database for data
             2. run defined function
-            3. place bids via RSE API
+            3. place bids via RSE API, in the background if `asynchronous`,
+               only the hours changed since the last submission unless `full`
+
+            pass `applying_date` and `days` to plan several auction days in
+            one book
             """
             parsed_data = parse_data(data, args)
             outputs = fn(**parsed_data, **args, **kwargs)
             check_outputs(outputs)
-            resp = place_orders(outputs)
+            resp = place_orders(outputs, asynchronous=asynchronous, full=full)
             return resp
 
+        # declared queries, arguments and the bare strategy, e.g. to benchmark
+        # the queries or to compare bidders without placing orders
+        bidder_function.data = data or {}
+        bidder_function.args = args
+        bidder_function.fn = fn
+
         # register bidder function
         BIDDERS[name] = bidder_function
         if default:
@@ -57,7 +105,7 @@ def register_bidder(name, *, args={}, data=None, default=False):
 
 
 # make predictions 2 days ahead so that the bids are accepted
-def get_output_template(dt: date = None):
+def get_output_template(dt: date = None, days: int = 1):
     """Create an empty output DataFrame with following columns:
 
     hour_ID: int (1-24)
@@ -66,24 +114,63 @@ def get_output_template(dt: date = None):
     price: float
     type: str (BUY or SELL)
 
-    the time range is 24-H from 9AM of given date to the next morning at 8AM
+    the time range is 24-H from 9AM of given date to the next morning at 8AM,
+    repeated for `days` consecutive applying dates starting at `dt`
     """
+    assert 1 <= days <= MAX_DAYS, f"days must be within 1-{MAX_DAYS}, got: {days}"
     if dt is None:
         dt = date.today() + timedelta(days=1)
-    cols = ["hour_ID", "applying_date", "volume", "price", "type"]
-    # create template
-    data = [(hour, dt, 0.0, 0.0, "BUY") for hour in range(1, 25)]
-    df = pd.DataFrame(data=data, columns=cols)
-    df["applying_date"] = df["applying_date"].map(lambda d: d.isoformat())
-    return df
-
-
-def place_orders(orders: pd.DataFrame) -> bool:
-    """set bids via RSE API"""
-
-    url = f"http://{config.AIMLAC_RSE_ADDR}/auction/bidding/set"
-    key = config.AIMLAC_RSE_KEY
-    orders = json.loads(orders.to_json(orient="records"))
-
-    resp = requests.post(url, json=dict(key=key, orders=orders))
-    return resp
+    dates = pd.date_range(dt, periods=days, freq="D").strftime("%Y-%m-%d")
+    rows = days * HOURS
+    return pd.DataFrame(
+        {
+            "hour_ID": np.tile(np.arange(1, HOURS + 1), days),
+            "applying_date": np.repeat(dates.to_numpy(dtype=object), HOURS),
+            "volume": np.zeros(rows),
+            "price": np.zeros(rows),
+            "type": np.full(rows, "BUY", dtype=object),
+        }
+    )
+
+
+def hourly_inputs(
+    power: pd.DataFrame, price: pd.DataFrame, dt: date = None, days: int = 1
+):
+    """Align the half-hourly net power and the hourly prices with the hours of
+    `get_output_template(dt, days)`
+
+    returns the template, the mean `NetPower` of the two half hours of every
+    hour, the `price` of every hour and the mask of the hours with both half
+    hours of power and a price, the others should not be bid
+    """
+    net_power = (
+        pd.Series(power.NetPower.to_numpy(), index=pd.to_datetime(power.time))
+        .groupby(level=0)
+        .last()
+    )
+    hour_price = (
+        pd.Series(price.price.to_numpy(), index=pd.to_datetime(price.time))
+        .groupby(level=0)
+        .last()
+    )
+
+    df = get_output_template(dt, days)
+    times = pd.to_datetime(df.applying_date) + pd.to_timedelta(df.hour_ID - 1, "h")
+    first = net_power.reindex(times).to_numpy()
+    second = net_power.reindex(times + pd.Timedelta("30min")).to_numpy()
+    hourly_price = hour_price.reindex(times).to_numpy()
+    known = ~(np.isnan(first) | np.isnan(second) | np.isnan(hourly_price))
+    return df, (first + second) / 2, hourly_price, known
+
+
+@timed("place_orders")
+def place_orders(orders: pd.DataFrame, asynchronous: bool = False, full: bool = False):
+    """set bids via RSE API
+
+    returns the `SubmissionResult`, or only its id if `asynchronous`
+    """
+    client = get_client()
+    if asynchronous:
+        submission_id, _ = client.submit_async(orders, full=full)
+        return submission_id
+    return client.submit(orders, full=full)
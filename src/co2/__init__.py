@@ -1 +1 @@
-from src.co2.co2_saved import co2_saved
+from src.co2.co2_saved import co2_saved, co2_saved_incremental, co2_saved_range
@@ -2,6 +2,22 @@ from datetime import datetime, timedelta
 from flask import g
 import pandas as pd
 
+from src.common.rollup import RESOLUTIONS, Rollup, resample
+
+# generation columns of energy_onsite counted towards the CO2 saved
+GENERATION_COLUMNS = ["wind1", "wind2", "wind3", "wind4", "windA", "windB", "solar"]
+
+QUERIES = {
+    "co2": 'SELECT time, intensity FROM carbon_dioxide WHERE time > "{start_date}" AND time < "{end_date}"',
+    "power": 'SELECT time, wind1, wind2, wind3, wind4, windA, windB, solar, hq_power, computing_center FROM energy_onsite WHERE time > "{start_date}" AND time < "{end_date}"',
+}
+
+# half-hourly, hourly and daily totals of the CO2 saved
+co2_rollup = Rollup("co2_saved", ["co2saved"], how="sum")
+
+# longer ranges are served from the rollup tables instead of the raw rows
+RAW_RANGE_LIMIT = timedelta(days=2)
+
 
 def hour_rounder(t: pd.Timestamp) -> pd.Timestamp:
     # Rounds to nearest 0.5 hour
@@ -14,50 +30,177 @@ def hour_rounder(t: pd.Timestamp) -> pd.Timestamp:
     return tNew
 
 
-def parse_data() -> dict:
+def round_to_half_hour(times: pd.Series) -> pd.Series:
+    """Vectorized `hour_rounder`, rounds every timestamp to the nearest 0.5 hour."""
+    quadrant = times.dt.minute // 15
+    return times.dt.floor("H") + pd.to_timedelta((quadrant + 1) // 2 * 30, unit="m")
+
+
+def parse_data(
+    start_date: datetime = None, end_date: datetime = None, conn=None
+) -> dict:
     """query the database for data to feed into the co2 saved function"""
     kwargs = {
-        "start_date": datetime.utcnow() - timedelta(minutes=60),
-        "end_date": datetime.utcnow(),
-    }
-    data = {
-        "co2": 'SELECT time, intensity FROM carbon_dioxide WHERE time > "{start_date}" AND time < "{end_date}"',
-        "power": 'SELECT time, wind1, wind2, wind3, wind4, windA, windB, solar, hq_power, computing_center FROM energy_onsite WHERE time > "{start_date}" AND time < "{end_date}"',
+        "start_date": start_date or datetime.utcnow() - timedelta(minutes=60),
+        "end_date": end_date or datetime.utcnow(),
     }
     parsed_data = {}
-    conn = g.get_conn()
+    storage = conn or g.get_conn()
 
-    for key, query in data.items():
-        parsed_data[key] = pd.read_sql(query.format(**kwargs), conn)
+    for key, query in QUERIES.items():
+        parsed_data[key] = storage.read_template(query, **kwargs)
     return parsed_data
 
 
-def co2_saved() -> pd.DataFrame:
-    data = parse_data()
+def compute_co2_saved(co2: pd.DataFrame, power: pd.DataFrame) -> pd.DataFrame:
+    """Computes the CO2 saved for every half hour with both power and intensity.
+
+    Args:
+        co2 (pd.DataFrame): `carbon_dioxide` rows (time, intensity).
+        power (pd.DataFrame): `energy_onsite` rows.
+
+    Returns:
+        pd.DataFrame: time and co2saved (kg) for each aligned half hour.
+    """
     # convert power data to nearest 30mins to align with CO2 data
-    for i in range(len(data["power"])):
-        t = hour_rounder(data["power"].time[i])
-        data["power"].time[i] = t
-
-    data = pd.merge(data["co2"], data["power"], on="time", how="inner")
-    if len(data):
-        data = data.iloc[-1, :]
-
-    netPower = (
-        data.wind1
-        + data.wind2
-        + data.wind3
-        + data.wind4
-        + data.windA
-        + data.windB
-        + data.solar
-    )
+    power = power.assign(time=round_to_half_hour(pd.to_datetime(power.time)))
+    co2 = co2.assign(time=pd.to_datetime(co2.time))
+    data = pd.merge(co2, power, on="time", how="inner")
 
-    co2 = pd.DataFrame(
+    netPower = data[GENERATION_COLUMNS].sum(axis=1)
+    return pd.DataFrame(
         {
-            "time": [data["time"]],
+            "time": data["time"],
             # 0.5 for 30min sampling to kWh, 1000 to kW from W, 1000 to kg
-            "co2saved": [netPower * 0.5 / 1000 * data["intensity"] / 1000],
+            "co2saved": netPower * 0.5 / 1000 * data["intensity"] / 1000,
         }
     )
-    return co2
+
+
+def co2_saved() -> pd.DataFrame:
+    data = parse_data()
+    co2 = compute_co2_saved(data["co2"], data["power"])
+    return co2.iloc[-1:].reset_index(drop=True)
+
+
+class CO2SavedAccumulator:
+    """Running total of the CO2 saved, updated from new rows only.
+
+    Every update only needs the rows after the last counted half hour, so the
+    cost is proportional to the number of new rows. Each half hour is counted
+    once, using the latest power sample that rounds to it.
+
+    Attributes:
+        last_time (pd.Timestamp): Last half hour counted in the total.
+        total (float): CO2 saved (kg) of the counted half hours.
+        latest (pd.DataFrame): The most recent half hour (time, co2saved).
+    """
+
+    def __init__(self):
+        self.last_time = None
+        self.total = 0.0
+        self.latest = pd.DataFrame({"time": [], "co2saved": []})
+
+    @classmethod
+    def from_rollup(cls, conn, rollup: Rollup = None) -> "CO2SavedAccumulator":
+        """The total so far, read from the rollup tables shared by the workers.
+
+        The total counts every half hour in the rollup, including backfilled
+        ones, and continues after its latest half hour.
+        """
+        rollup = rollup or co2_rollup
+        accumulator = cls()
+        latest = rollup.last(conn, next(iter(RESOLUTIONS)))
+        if len(latest):
+            accumulator.last_time = latest.time[0]
+            accumulator.latest = latest[["time", "co2saved"]]
+            accumulator.total = rollup.totals(conn)["co2saved"]
+        return accumulator
+
+    def query_start(self) -> datetime:
+        """Returns the start of the window holding all rows not counted yet."""
+        if self.last_time is None:
+            return datetime.utcnow() - timedelta(minutes=60)
+        # later power samples can only round to later half hours
+        return self.last_time.to_pydatetime()
+
+    def update(self, co2: pd.DataFrame, power: pd.DataFrame) -> pd.DataFrame:
+        """Adds the half hours after `last_time`, returns the new rows."""
+        new = compute_co2_saved(co2, power)
+        new = new.drop_duplicates(subset="time", keep="last").sort_values("time")
+        if self.last_time is not None:
+            new = new[new.time > self.last_time]
+        if len(new):
+            self.total += float(new.co2saved.sum())
+            self.last_time = new.time.iloc[-1]
+            self.latest = new.iloc[-1:].reset_index(drop=True)
+        return new
+
+
+def co2_saved_incremental(conn=None) -> pd.DataFrame:
+    """Returns the latest CO2 saved together with the running total.
+
+    The total is kept in the CO2 saved rollup: only the rows after its latest
+    half hour are queried and rolled up, so every worker reports the same
+    total. Rolling up the same rows twice gives the same tables.
+
+    Returns:
+        pd.DataFrame: time, co2saved and co2savedTotal of the latest half hour.
+    """
+    conn = conn or g.get_conn()
+    accumulator = CO2SavedAccumulator.from_rollup(conn)
+    data = parse_data(start_date=accumulator.query_start(), conn=conn)
+    new = accumulator.update(data["co2"], data["power"])
+    co2_rollup.update(conn, new)
+    return accumulator.latest.assign(co2savedTotal=accumulator.total)
+
+
+def backfill_co2_rollup(start: datetime, end: datetime, conn=None) -> int:
+    """Fills the CO2 saved rollup tables from the raw rows, one day at a time.
+
+    Returns:
+        int: Number of half hours rolled up.
+    """
+    conn = conn or g.get_conn()
+    count = 0
+    day = pd.Timestamp(start).floor("D")
+    while day < end:
+        co2 = _co2_saved_between(day, day + timedelta(days=1), conn)
+        co2_rollup.update(conn, co2)
+        count += len(co2)
+        day += timedelta(days=1)
+    return count
+
+
+def _co2_saved_between(start: datetime, end: datetime, conn) -> pd.DataFrame:
+    """CO2 saved of the half hours in `[start, end)` from the raw rows."""
+    # power samples up to 15 minutes before `start` round up to `start`
+    data = parse_data(start - timedelta(minutes=30), end, conn=conn)
+    co2 = compute_co2_saved(data["co2"], data["power"])
+    co2 = co2.drop_duplicates(subset="time", keep="last")
+    return co2[(co2.time >= start) & (co2.time < end)]
+
+
+def co2_saved_range(
+    start: datetime, end: datetime, resolution: str = "30min", conn=None
+) -> pd.DataFrame:
+    """Returns the CO2 saved over `[start, end)` downsampled to `resolution`.
+
+    Short ranges are computed from the raw `energy_onsite` and
+    `carbon_dioxide` rows, longer ranges from the coarsest rollup table that
+    can serve the resolution.
+
+    Args:
+        start (datetime): Start of the range.
+        end (datetime): End of the range.
+        resolution (str): Pandas frequency of the returned series, e.g.
+            `30min`, `1H`, `1D` or `1M`.
+
+    Returns:
+        pd.DataFrame: time and co2saved (kg) per `resolution` bucket.
+    """
+    conn = conn or g.get_conn()
+    if end - start > RAW_RANGE_LIMIT:
+        return co2_rollup.query(conn, start, end, resolution)
+    co2 = _co2_saved_between(start, end, conn).assign(samples=1)
+    return resample(co2, resolution, ["co2saved"], "sum")
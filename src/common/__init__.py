@@ -1 +1,4 @@
 from src.common.met_office_utils import cut_frame, interp_30min
+from src.common.date_cache import DateIndexedFrame, load_date_indexed_csv
+from src.common.model_registry import ModelRegistry, registry
+from src.common.met_office_client import MetOfficeClient, forecast_frame
@@ -0,0 +1,235 @@
+"""Date-partitioned binary cache for large CSV files.
+
+The CSV is parsed once and every column is stored as a ``.npy`` file, sorted
+by date, alongside a date -> row-range index. Later loads memory-map the
+arrays instead of parsing the CSV, and the rows of a given date are a single
+contiguous slice. Missing values of text columns are kept as a mask next
+to their array.
+
+`<cache_dir>` is a symbolic link to the current version of the cache, a
+sibling directory. A rebuild writes a new version and swaps the link with
+`os.replace`, so readers see either the old or the new cache, never a mix.
+"""
+import json
+import os
+import shutil
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 2
+META_FILE = "meta.json"
+DATES_FILE = "dates.npy"
+OFFSETS_FILE = "offsets.npy"
+
+
+class DateIndexedFrame:
+    """Column arrays sorted by date with O(1) per-date row lookups.
+
+    Attributes:
+        columns (Dict[str, np.ndarray]): Column name to (memory-mapped) array.
+        dates (np.ndarray): Sorted unique dates as `YYYY-MM-DD` strings.
+        offsets (np.ndarray): Row offsets, rows of `dates[i]` are
+            `offsets[i]:offsets[i + 1]`.
+        missing (Dict[str, np.ndarray]): Column name to the mask of its
+            missing values, for the text columns having some.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        dates: np.ndarray,
+        offsets: np.ndarray,
+        missing: Dict[str, np.ndarray] = None,
+    ):
+        assert len(offsets) == len(dates) + 1, "offsets do not match dates"
+        self.columns = columns
+        self.dates = dates
+        self.offsets = offsets
+        self.missing = missing or {}
+        self._index = {str(d): i for i, d in enumerate(dates)}
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def _column(self, name: str, start: int, stop: int) -> np.ndarray:
+        values = np.asarray(self.columns[name][start:stop])
+        if name not in self.missing:
+            return values
+        values = values.astype(object)
+        values[self.missing[name][start:stop]] = np.nan
+        return values
+
+    def _rows(self, start: int, stop: int) -> pd.DataFrame:
+        return pd.DataFrame(
+            {name: self._column(name, start, stop) for name in self.columns}
+        )
+
+    def on(self, day: Union[date, str]) -> pd.DataFrame:
+        """Returns the rows of a single date (empty if the date is unknown)."""
+        return self.between(day, day)
+
+    def between(
+        self, first_day: Union[date, str], last_day: Union[date, str]
+    ) -> pd.DataFrame:
+        """Returns the rows from `first_day` to `last_day` inclusive.
+
+        Only dates present in the index bound the slice, dates missing from the
+        data are skipped.
+        """
+        first_day, last_day = _date_key(first_day), _date_key(last_day)
+        if first_day in self._index:
+            start = self._index[first_day]
+        else:
+            start = int(np.searchsorted(self.dates, first_day, side="left"))
+        if last_day in self._index:
+            stop = self._index[last_day] + 1
+        else:
+            stop = int(np.searchsorted(self.dates, last_day, side="right"))
+        if stop <= start:
+            return self._rows(0, 0)
+        return self._rows(int(self.offsets[start]), int(self.offsets[stop]))
+
+
+def _date_key(day: Union[date, str]) -> str:
+    if isinstance(day, date):
+        return day.isoformat()
+    return str(day)[:10]
+
+
+def _source_stamp(source: Path) -> dict:
+    stat = source.stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def build_date_cache(source: Path, date_column: str, cache_dir: Path) -> None:
+    """Parses `source` and writes its date-partitioned cache into `cache_dir`.
+
+    The cache is written into a new version directory and the `cache_dir`
+    link swapped to it, so readers never observe a partially written cache.
+    """
+    frame = pd.read_csv(source)
+    assert date_column in frame.columns, f"missing column: {date_column}"
+    keys = frame[date_column].astype(str).str[:10].to_numpy(dtype="U10")
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    dates, starts = np.unique(keys, return_index=True)
+    offsets = np.append(starts, len(keys)).astype(np.int64)
+
+    cache_dir.parent.mkdir(parents=True, exist_ok=True)
+    version_dir = Path(
+        tempfile.mkdtemp(prefix=f".{cache_dir.name}.v", dir=cache_dir.parent)
+    )
+    try:
+        names, missing = [], []
+        for i, name in enumerate(frame.columns):
+            values = frame[name].to_numpy()[order]
+            if values.dtype == object:
+                mask = pd.isna(values)
+                if mask.any():
+                    np.save(version_dir / f"{i}.missing.npy", mask)
+                    missing.append(name)
+                values = np.where(mask, "", values).astype(str)
+            np.save(version_dir / f"{i}.npy", values)
+            names.append(name)
+        np.save(version_dir / DATES_FILE, dates)
+        np.save(version_dir / OFFSETS_FILE, offsets)
+        meta = {
+            "version": CACHE_VERSION,
+            "date_column": date_column,
+            "columns": names,
+            "missing": missing,
+            "source": _source_stamp(source),
+        }
+        with open(version_dir / META_FILE, "w") as f:
+            json.dump(meta, f)
+        os.chmod(version_dir, 0o755)
+        _swap(cache_dir, version_dir)
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+
+def _swap(cache_dir: Path, version_dir: Path) -> None:
+    """Points the `cache_dir` link to `version_dir`, drops the old version."""
+    previous = None
+    if cache_dir.is_symlink():
+        previous = cache_dir.parent / os.readlink(cache_dir)
+    elif cache_dir.exists():
+        # a cache written before the versions, replaced once
+        shutil.rmtree(cache_dir)
+    link = cache_dir.parent / f".{cache_dir.name}.link.{version_dir.name}"
+    os.symlink(version_dir.name, link)
+    try:
+        os.replace(link, cache_dir)
+    except BaseException:
+        os.unlink(link)
+        raise
+    if previous is not None and previous != version_dir:
+        # readers holding memory maps of it keep their data
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def _cache_is_fresh(source: Path, date_column: str, cache_dir: Path) -> bool:
+    try:
+        with open(cache_dir / META_FILE) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get("version") != CACHE_VERSION or meta.get("date_column") != date_column:
+        return False
+    # without the source file the cache is the only copy of the data
+    return not source.exists() or meta.get("source") == _source_stamp(source)
+
+
+def load_date_indexed_csv(
+    source: Union[str, Path], date_column: str, cache_dir: Union[str, Path] = None
+) -> DateIndexedFrame:
+    """Loads a CSV file through its date-partitioned cache.
+
+    The cache is (re)built when missing or older than the CSV file, otherwise
+    the column arrays are memory-mapped without parsing the CSV.
+
+    Args:
+        source (str, Path): Path of the CSV file.
+        date_column (str): Column whose first 10 characters (`YYYY-MM-DD`) are
+            used to partition the rows.
+        cache_dir (str, Path): Cache directory, defaults to `<source>.cache`
+            next to the CSV file.
+
+    Returns:
+        DateIndexedFrame: The memory-mapped, date-indexed data.
+    """
+    source = Path(source)
+    cache_dir = Path(cache_dir) if cache_dir else source.with_suffix(".cache")
+    if not _cache_is_fresh(source, date_column, cache_dir):
+        build_date_cache(source, date_column, cache_dir)
+
+    try:
+        return _load(cache_dir)
+    except FileNotFoundError:
+        # the version read was replaced by a concurrent rebuild meanwhile
+        return _load(cache_dir)
+
+
+def _load(cache_dir: Path) -> DateIndexedFrame:
+    # the files of one version, even if the link is swapped meanwhile
+    version_dir = cache_dir.resolve()
+    with open(version_dir / META_FILE) as f:
+        meta = json.load(f)
+    columns = {
+        name: np.load(version_dir / f"{i}.npy", mmap_mode="r")
+        for i, name in enumerate(meta["columns"])
+    }
+    missing = {
+        name: np.load(version_dir / f"{i}.missing.npy", mmap_mode="r")
+        for i, name in enumerate(meta["columns"])
+        if name in meta["missing"]
+    }
+    dates = np.load(version_dir / DATES_FILE)
+    offsets = np.load(version_dir / OFFSETS_FILE)
+    return DateIndexedFrame(columns, dates, offsets, missing)
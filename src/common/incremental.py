@@ -0,0 +1,362 @@
+"""Incremental wind, solar and onsite predictions of updated forecasts.
+
+The Met Office forecast of a site is refreshed hourly and usually only a few
+hours change. The last interpolated forecast and the predictions of every
+site are kept; a new forecast is aligned with them on time and only the half
+hours whose inputs changed (or that are new) are predicted again:
+
+- wind: the half hours whose wind speed changed,
+- solar: the clear-sky power of new half hours, the output power of the
+  half hours whose temperature or weather changed, and the integration
+  intervals on both sides of them,
+- onsite: the half hours whose temperature changed.
+
+The results are the same as those of `get_wind_prediction`,
+`get_solar_prediction` and `get_energy_demand`. Every site is predicted from
+scratch again when the active wind or demand model changes.
+
+The processes of the server share the states of the sites through a
+directory, one pickle per site replaced atomically, so a forecast is compared
+with the last one of the site whichever process predicted it. An `flock` on
+a lock file per site serializes the updates of a site. Without a directory
+the states are only kept in memory, which is only correct for a single
+process.
+"""
+import fcntl
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pvlib as pv
+
+from src.common.met_office_utils import interp_30min
+from src.common.metrics import CACHE_REQUESTS
+from src.common.model_registry import registry
+import src.config as config
+from src.onsite.onsite import demand_components, forecast_start
+from src.onsite.utils import adjust_datetime, get_temperatures, half_hour_range
+from src.solar.solar import (
+    cap_output_power,
+    get_incident_power,
+    get_total_efficiency,
+    integrate_power,
+)
+from src.wind.wind import get_wind_power
+
+SLOTS = 48
+WIND_INPUTS = ["windSpeed10m"]
+SOLAR_INPUTS = ["screenTemperature", "significantWeatherCode"]
+ONSITE_INPUTS = ["HQTemperature"]
+
+
+def changed_rows(
+    previous: pd.DataFrame, current: pd.DataFrame, columns: List[str]
+) -> np.ndarray:
+    """Rows of `current` that are new or whose `columns` differ from `previous`.
+
+    Both frames are indexed by time, missing values compare equal.
+    """
+    if previous is None:
+        return np.ones(len(current), dtype=bool)
+    known = current.index.isin(previous.index)
+    old = previous.reindex(current.index)[columns].to_numpy(dtype=float)
+    new = current[columns].to_numpy(dtype=float)
+    same = (old == new) | (np.isnan(old) & np.isnan(new))
+    return ~(known & same.all(axis=1))
+
+
+class SiteState:
+    """Inputs and predictions of the last forecast of a site, by time."""
+
+    def __init__(self, versions: tuple):
+        self.versions = versions
+        self.wind: pd.DataFrame = None
+        self.solar_points: pd.DataFrame = None
+        self.solar_intervals: pd.Series = None
+        self.onsite: pd.DataFrame = None
+
+
+class IncrementalPredictor:
+    """Keeps the last predictions of every site and updates them in place.
+
+    Args:
+        max_sites (int): Sites kept, the least recently used one is dropped.
+        directory (str): Directory of the states shared by the processes,
+            they are kept in memory without.
+
+    Attributes:
+        metrics (Dict[str, int]): Requests served by this process and, per
+            stage, the steps computed and the steps a full prediction would
+            have computed.
+    """
+
+    STATE = ".pkl"
+    LOCK = ".lock"
+
+    def __init__(self, max_sites: int = 16, directory: str = None):
+        self.max_sites = max_sites
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._sites: "OrderedDict[str, SiteState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"requests": 0, "computed": 0, "total": 0}
+
+    def _path(self, site: str, suffix: str) -> str:
+        # site keys are free text, e.g. coordinates
+        name = hashlib.sha1(site.encode()).hexdigest()
+        return os.path.join(self.directory, name + suffix)
+
+    @contextmanager
+    def _site_lock(self, site: str):
+        if self.directory is None:
+            yield
+            return
+        fd = os.open(self._path(site, self.LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # also drops the lock
+
+    def _load(self, site: str) -> Optional[SiteState]:
+        if self.directory is None:
+            return self._sites.pop(site, None)
+        try:
+            with open(self._path(site, self.STATE), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _store(self, site: str, state: SiteState) -> None:
+        if self.directory is None:
+            self._sites[site] = state
+            while len(self._sites) > self.max_sites:
+                self._sites.popitem(last=False)
+            return
+        path = self._path(site, self.STATE)
+        fd, tmp = tempfile.mkstemp(prefix=".tmp.", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        # the least recently predicted sites, by the time their state was written
+        states = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(self.STATE)
+        ]
+        if len(states) > self.max_sites:
+            states.sort(key=self._mtime)
+            for expired in states[: -self.max_sites]:
+                self._unlink(expired)
+
+    @staticmethod
+    def _mtime(path: str) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def predict(
+        self, forecast: pd.DataFrame, site: str = "default", wind_version: str = None
+    ) -> Tuple[Dict[str, pd.DataFrame], dict]:
+        """Predicts the wind, solar and onsite power of a forecast.
+
+        Args:
+            forecast (pd.DataFrame): Hourly Met Office forecast.
+            site (str): Key of the site the forecast is for.
+            wind_version (str): Wind model version, defaults to the active one.
+
+        Returns:
+            Tuple[Dict[str, pd.DataFrame], dict]: The `wind`, `solar` and
+                `onsite` predictions, as returned by the full predictions,
+                and the steps computed and in total per stage.
+        """
+        frame = interp_30min(forecast.copy()).set_index("time", drop=False)
+        versions = (
+            wind_version or registry.active_version("wind"),
+            registry.active_version("demand"),
+        )
+        with self._lock, self._site_lock(site):
+            state = self._load(site)
+            if state is None or state.versions != versions:
+                state = SiteState(versions)
+            work = {}
+            predictions = {
+                "wind": self._wind(state, frame, wind_version, work),
+                "solar": self._solar(state, frame, work),
+                "onsite": self._onsite(state, frame, work),
+            }
+            self._store(site, state)
+
+            computed = sum(stage["computed"] for stage in work.values())
+            total = sum(stage["total"] for stage in work.values())
+            self.metrics["requests"] += 1
+            self.metrics["computed"] += computed
+            self.metrics["total"] += total
+            # steps reused from the last forecast of the site
+            CACHE_REQUESTS.inc(total - computed, cache="incremental", result="hit")
+            CACHE_REQUESTS.inc(computed, cache="incremental", result="miss")
+            for name, stage in work.items():
+                for key, value in stage.items():
+                    self.metrics[f"{name}_{key}"] = (
+                        self.metrics.get(f"{name}_{key}", 0) + value
+                    )
+        work["saved"] = 1 - computed / total
+        return predictions, work
+
+    def forget(self, site: str = None) -> None:
+        """Drops the state of `site`, of all sites by default."""
+        with self._lock:
+            if site is None:
+                self._sites.clear()
+            else:
+                self._sites.pop(site, None)
+            if self.directory is None:
+                return
+            if site is None:
+                for name in os.listdir(self.directory):
+                    if name.endswith(self.STATE):
+                        self._unlink(os.path.join(self.directory, name))
+            else:
+                with self._site_lock(site):
+                    self._unlink(self._path(site, self.STATE))
+
+    def _wind(self, state: SiteState, frame: pd.DataFrame, version, work):
+        current = frame[WIND_INPUTS].astype(float)
+        changed = changed_rows(state.wind, current, WIND_INPUTS)
+        if state.wind is None:
+            wind = current.assign(WindSpeed=np.nan, WindPower=np.nan)
+        else:
+            wind = current.join(state.wind[["WindSpeed", "WindPower"]])
+        if changed.any():
+            # get_wind_power corrects the speeds in place, the corrected ones
+            # are reported
+            speeds = current.windSpeed10m.to_numpy()[changed].copy()
+            power = get_wind_power(speeds, config.ALTITUDE, version)
+            wind.loc[changed, "WindSpeed"] = speeds
+            wind.loc[changed, "WindPower"] = power
+        state.wind = wind
+        work["wind"] = {"computed": int(changed.sum()), "total": len(changed)}
+        return pd.DataFrame(
+            {
+                "time": frame.time.to_numpy()[:SLOTS],
+                "WindSpeed": wind.WindSpeed.to_numpy()[:SLOTS],
+                "WindPower": wind.WindPower.to_numpy()[:SLOTS],
+            }
+        )
+
+    def _solar(self, state: SiteState, frame: pd.DataFrame, work):
+        current = frame[SOLAR_INPUTS].astype(float)
+        changed = changed_rows(state.solar_points, current, SOLAR_INPUTS)
+        if state.solar_points is None:
+            previous = pd.DataFrame(columns=["Incident", "OutputPower"], dtype=float)
+        else:
+            previous = state.solar_points
+        incident = previous.Incident.reindex(current.index).to_numpy()
+        output_power = previous.OutputPower.reindex(current.index).to_numpy()
+
+        # the clear-sky power only depends on the time, new times only
+        new = ~current.index.isin(previous.index)
+        if new.any():
+            location = pv.location.Location(
+                float(config.LATITUDE),
+                float(config.LONGITUDE),
+                tz=config.TIMEZONE,
+                altitude=config.ALTITUDE,
+            )
+            incident[new] = get_incident_power(
+                frame[new], location, config.PANEL_TILT, config.ARRAY_AREA
+            ).to_numpy()
+        if changed.any():
+            efficiency = get_total_efficiency(
+                frame[changed], config.BASE_EFFICIENCY, config.PMPP
+            )
+            output_power[changed] = cap_output_power(
+                incident[changed] * efficiency, config.PMAX_ARRAY
+            ).to_numpy()
+        state.solar_points = current.assign(Incident=incident, OutputPower=output_power)
+
+        # interval i lies between the steps i and i + 1
+        starts = current.index[:SLOTS]
+        if state.solar_intervals is not None:
+            energy = state.solar_intervals.reindex(starts).to_numpy()
+            stale = ~starts.isin(state.solar_intervals.index)
+        else:
+            energy = np.full(SLOTS, np.nan)
+            stale = np.ones(SLOTS, dtype=bool)
+        stale |= changed[:SLOTS] | changed[1 : SLOTS + 1]
+        intervals = np.flatnonzero(stale)
+        if len(intervals):
+            energy[intervals] = integrate_power(output_power, intervals)
+        state.solar_intervals = pd.Series(energy, index=starts)
+
+        work["solar_clearsky"] = {"computed": int(new.sum()), "total": len(new)}
+        work["solar_points"] = {"computed": int(changed.sum()), "total": len(changed)}
+        work["solar_intervals"] = {"computed": len(intervals), "total": SLOTS}
+        return pd.DataFrame(
+            {
+                "time": pd.DatetimeIndex(frame.time.to_numpy()[:SLOTS]),
+                "SolarPower": energy / 1000.0,  # kW
+            }
+        )
+
+    def _onsite(self, state: SiteState, frame: pd.DataFrame, work):
+        # as `get_energy_demand`, from the first half hour of the forecast
+        times = half_hour_range(adjust_datetime(forecast_start(frame)), SLOTS)
+        current = pd.DataFrame(
+            {"HQTemperature": get_temperatures(frame, SLOTS)},
+            index=np.datetime_as_string(times, unit="s", timezone="UTC"),
+        )
+        changed = changed_rows(state.onsite, current, ONSITE_INPUTS)
+        demand = (
+            state.onsite.HQPowerDemand.reindex(current.index)
+            if state.onsite is not None
+            else pd.Series(np.nan, index=current.index)
+        ).to_numpy()
+        if changed.any():
+            demand[changed] = demand_components(
+                times[changed], current.HQTemperature.to_numpy()[changed]
+            )["Total demand"]
+        state.onsite = current.assign(HQPowerDemand=demand)
+        work["onsite"] = {"computed": int(changed.sum()), "total": SLOTS}
+        return pd.DataFrame(
+            {
+                "time": current.index.to_numpy(),
+                "HQPowerDemand": demand,
+                "HQTemperature": current.HQTemperature.to_numpy(),
+            }
+        )
+
+
+_predictor = None
+
+
+def get_incremental_predictor() -> IncrementalPredictor:
+    """Returns the incremental predictor of this process.
+
+    Its site states are shared with the other processes through
+    `INCREMENTAL_STATE_DIR`.
+    """
+    global _predictor
+    if _predictor is None:
+        _predictor = IncrementalPredictor(directory=config.INCREMENTAL_STATE_DIR)
+    return _predictor
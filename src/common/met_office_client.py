@@ -0,0 +1,333 @@
+"""Client fetching the site-specific hourly forecasts of the Met Office.
+
+Forecasts are fetched with a keep-alive session and conditional requests:
+the `ETag` and `Last-Modified` of the last payload of a site are sent back as
+`If-None-Match` and `If-Modified-Since`, so an unchanged forecast costs a
+`304` without a body. Payloads are kept gzipped on disk together with their
+validators, which survive restarts, and are served from there when the
+forecast did not change or the Met Office cannot be reached.
+
+`forecast_frame` turns a payload into the frame the predictions take, the
+same as the routes build from the forecasts posted by Node-RED, and
+`MetOfficeClient.half_hourly` interpolates it with `interp_30min`.
+"""
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.common.met_office_utils import interp_30min
+from src.common.metrics import CACHE_REQUESTS
+from src.common.timing import stage
+import src.config as config
+
+# status codes worth retrying
+RETRY_STATUS = {429, 500, 502, 503, 504}
+PAYLOAD_FILE = "payload.json.gz"
+META_FILE = "meta.json"
+
+
+def forecast_frame(payload: dict) -> pd.DataFrame:
+    """The hourly time series of a GeoJSON forecast payload, for `interp_30min`."""
+    with stage("json"):
+        time_series = payload["features"][0]["properties"]["timeSeries"]
+        return pd.read_json(json.dumps(time_series))
+
+
+def site_key(latitude: float, longitude: float) -> str:
+    """Cache key of a site, the coordinates rounded to about 10 m."""
+    return f"{float(latitude):.4f}_{float(longitude):.4f}"
+
+
+class ForecastCache:
+    """Gzipped payloads and their validators, one directory per site.
+
+    Args:
+        root (str): Cache directory, payloads are only kept in memory without.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root
+        # key -> (stat of the metadata file, payload, metadata)
+        self._memory: Dict[str, Tuple[Optional[tuple], dict, dict]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[Optional[dict], dict]:
+        """The cached payload of a site (None if unknown) and its metadata.
+
+        With a directory, the payload kept in memory is only served while the
+        metadata file is unchanged, another process may have stored a newer one.
+        """
+        if self.root is None:
+            with self._lock:
+                _, payload, meta = self._memory.get(key, (None, None, {}))
+            return payload, meta
+        site_dir = os.path.join(self.root, key)
+        try:
+            stat = self._stat(site_dir)
+        except OSError:
+            return None, {}
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is not None and cached[0] == stat:
+            return cached[1], cached[2]
+        try:
+            with open(os.path.join(site_dir, META_FILE)) as f:
+                meta = json.load(f)
+            with gzip.open(os.path.join(site_dir, PAYLOAD_FILE), "rb") as f:
+                payload = json.loads(f.read())
+        except (OSError, ValueError):
+            return None, {}
+        with self._lock:
+            self._memory[key] = (stat, payload, meta)
+        return payload, meta
+
+    def put(self, key: str, body: bytes, meta: dict) -> dict:
+        """Stores the raw payload `body` of a site, returns it parsed."""
+        payload = json.loads(body)
+        stat = None
+        if self.root is not None:
+            site_dir = os.path.join(self.root, key)
+            os.makedirs(site_dir, exist_ok=True)
+            # payload first, the metadata names the validators of what is stored
+            self._write(site_dir, PAYLOAD_FILE, gzip.compress(body))
+            self._write(site_dir, META_FILE, json.dumps(meta).encode())
+            stat = self._stat(site_dir)
+        with self._lock:
+            self._memory[key] = (stat, payload, meta)
+        return payload
+
+    def size(self, key: str) -> int:
+        """Bytes used on disk by a site."""
+        if self.root is None:
+            return 0
+        site_dir = os.path.join(self.root, key)
+        return sum(
+            os.path.getsize(os.path.join(site_dir, name))
+            for name in (PAYLOAD_FILE, META_FILE)
+            if os.path.exists(os.path.join(site_dir, name))
+        )
+
+    @staticmethod
+    def _stat(site_dir: str) -> tuple:
+        # replaced on every put, so a new inode even within the mtime resolution
+        stat = os.stat(os.path.join(site_dir, META_FILE))
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _write(directory: str, name: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(prefix=f".{name}.", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(directory, name))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class FetchResult:
+    """Outcome of one forecast fetch.
+
+    Attributes:
+        status (str): `fetched` for a new payload, `not_modified` when the
+            cached one is current, `stale` when the cached one is served
+            after an error.
+        payload (dict): The forecast, None if nothing could be served.
+        attempts (int): Number of requests sent.
+        elapsed (float): Seconds spent fetching.
+        received (int): Bytes of payload received.
+        error (str): Last error, if any.
+    """
+
+    def __init__(self):
+        self.status = None
+        self.payload = None
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.received = 0
+        self.error = None
+
+    @property
+    def changed(self) -> bool:
+        return self.status == "fetched"
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "attempts": self.attempts,
+            "elapsed": round(self.elapsed, 4),
+            "received": self.received,
+            "error": self.error,
+        }
+
+
+class MetOfficeClient:
+    """Pooled client of the site-specific forecast API with a disk cache.
+
+    Args:
+        url (str): URL of the hourly point forecasts.
+        key (str): API key, sent in the `apikey` header.
+        cache_dir (str): Directory of the payload cache.
+        timeout (Tuple[float, float]): Connect and read timeouts in seconds.
+        retries (int): Retries after the first attempt.
+        backoff (float): Delay before the first retry, doubled for each
+            further retry.
+
+    Attributes:
+        metrics (Dict[str, int]): Requests sent, payloads fetched, `304`s,
+            stale payloads served, errors and bytes received.
+    """
+
+    def __init__(
+        self,
+        url: str = config.MET_OFFICE_URL,
+        key: str = config.MET_OFFICE_API_KEY,
+        cache_dir: str = config.FORECAST_CACHE_DIR,
+        timeout: Tuple[float, float] = (3.05, 10.0),
+        retries: int = 2,
+        backoff: float = 0.5,
+    ):
+        assert retries >= 0, f"retries must not be negative, got: {retries}"
+        self.url = url
+        self.key = key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = ForecastCache(cache_dir)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.metrics = {
+            "requests": 0,
+            "fetched": 0,
+            "not_modified": 0,
+            "stale": 0,
+            "errors": 0,
+            "bytes_received": 0,
+        }
+
+    def _count(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self.metrics[name] += value
+
+    def fetch(self, latitude: float, longitude: float) -> FetchResult:
+        """Fetches the forecast of a site unless the cached one is current.
+
+        Returns:
+            FetchResult: The outcome, with the current payload.
+        """
+        key = site_key(latitude, longitude)
+        cached, meta = self.cache.get(key)
+        headers = {"Accept": "application/json"}
+        if self.key:
+            headers["apikey"] = self.key
+        if cached is not None and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if cached is not None and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        params = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "excludeParameterMetadata": "true",
+            "includeLocationName": "true",
+        }
+
+        result = FetchResult()
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            result.attempts += 1
+            self._count(requests=1)
+            try:
+                resp = self.session.get(
+                    self.url, params=params, headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result.error = str(e)
+                continue
+            if resp.status_code in RETRY_STATUS:
+                result.error = f"HTTP {resp.status_code}"
+                continue
+            result.error = None
+            if resp.status_code == 304 and cached is not None:
+                result.status, result.payload = "not_modified", cached
+                self._count(not_modified=1)
+            elif resp.status_code == 200:
+                body = resp.content
+                result.received = len(body)
+                result.payload = self.cache.put(
+                    key,
+                    body,
+                    {
+                        "etag": resp.headers.get("ETag"),
+                        "last_modified": resp.headers.get("Last-Modified"),
+                        "fetched_at": time.time(),
+                    },
+                )
+                result.status = "fetched"
+                self._count(fetched=1, bytes_received=len(body))
+            else:
+                result.error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+            break
+        result.elapsed = time.perf_counter() - start
+
+        if result.status is None:
+            self._count(errors=1)
+            if cached is not None:
+                result.status, result.payload = "stale", cached
+                self._count(stale=1)
+        if result.payload is not None:
+            CACHE_REQUESTS.inc(
+                cache="met_office", result="miss" if result.changed else "hit"
+            )
+        return result
+
+    def forecast(self, latitude: float, longitude: float) -> pd.DataFrame:
+        """The current forecast frame of a site, fetched only if it changed."""
+        result = self.fetch(latitude, longitude)
+        assert result.payload is not None, f"no forecast: {result.error}"
+        return forecast_frame(result.payload)
+
+    def half_hourly(self, latitude: float, longitude: float) -> pd.DataFrame:
+        """The current forecast of a site interpolated to half hours."""
+        return interp_30min(self.forecast(latitude, longitude))
+
+    def poller(self, latitude: float, longitude: float):
+        """Returns a function giving the forecast frame when it changed, else None.
+
+        Meant as the `forecast` source of `PredictionScheduler`.
+        """
+
+        def poll() -> Optional[pd.DataFrame]:
+            result = self.fetch(latitude, longitude)
+            return forecast_frame(result.payload) if result.changed else None
+
+        return poll
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client = None
+
+
+def get_met_office_client() -> MetOfficeClient:
+    """Returns the Met Office client of this process."""
+    global _client
+    if _client is None:
+        _client = MetOfficeClient()
+    return _client
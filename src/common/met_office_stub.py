@@ -0,0 +1,172 @@
+"""Local stand-in for the Met Office site-specific forecast API, for tests.
+
+The stub answers `GET` requests with a GeoJSON forecast wrapping the given
+hourly time series (e.g. `test/samples/sample_data.py`) at the requested
+coordinates. It sends an `ETag` and a `Last-Modified` header, answers the
+conditional requests of `MetOfficeClient` with `304` while the time series
+is unchanged and can add latency or fail the first requests.
+"""
+import hashlib
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import parse_qs, urlparse
+
+
+class MetOfficeStub:
+    """Met Office stand-in running in a background thread.
+
+    Args:
+        time_series (List[dict]): Hourly forecast served.
+        host (str): Interface to listen on.
+        port (int): Port to listen on, 0 picks a free one.
+        latency (float): Seconds every request is delayed.
+        fail_first (int): Number of requests answered with a 503 first.
+        key (str): Expected `apikey` header, any key is accepted if `None`.
+
+    Attributes:
+        requests (int): Number of requests received.
+        not_modified (int): Number of `304` answers.
+        connections (int): Number of TCP connections accepted.
+    """
+
+    def __init__(
+        self,
+        time_series: List[dict],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        fail_first: int = 0,
+        key: str = None,
+    ):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.key = key
+        self.requests = 0
+        self.not_modified = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.update(time_series)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """URL of the point forecasts, as in `MET_OFFICE_URL`."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/sitespecific/v0/point/hourly"
+
+    def update(self, time_series: List[dict]) -> None:
+        """Replaces the forecast served, as a new model run would."""
+        data = json.dumps(time_series).encode()
+        with self._lock:
+            self._time_series = list(time_series)
+            self._etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            self._last_modified = formatdate(time.time(), usegmt=True)
+
+    def payload(self, latitude: float, longitude: float) -> dict:
+        """The GeoJSON forecast served for a site."""
+        with self._lock:
+            time_series = self._time_series
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": [longitude, latitude, 0],
+                    },
+                    "properties": {
+                        "location": {"name": "Stub"},
+                        "requestPointDistance": 0.0,
+                        "modelRunDate": time_series[0]["time"] if time_series else None,
+                        "timeSeries": time_series,
+                    },
+                }
+            ],
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, do not wait for acks
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: dict = None, headers: dict = None):
+                data = b"" if body is None else json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if body is not None:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    fail = stub.requests <= stub.fail_first
+                    etag, last_modified = stub._etag, stub._last_modified
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlparse(self.path)
+                if url.path != urlparse(stub.url).path:
+                    return self._reply(404, {"message": "not found"})
+                if fail:
+                    return self._reply(503, {"message": "unavailable"})
+                if stub.key is not None and self.headers.get("apikey") != stub.key:
+                    return self._reply(401, {"message": "invalid key"})
+                query = parse_qs(url.query)
+                try:
+                    latitude = float(query["latitude"][0])
+                    longitude = float(query["longitude"][0])
+                except (KeyError, ValueError):
+                    return self._reply(400, {"message": "latitude and longitude"})
+
+                validators = {"ETag": etag, "Last-Modified": last_modified}
+                match = self.headers.get("If-None-Match")
+                since = self.headers.get("If-Modified-Since")
+                if (match is not None and match == etag) or (
+                    match is None and since is not None and since == last_modified
+                ):
+                    with stub._lock:
+                        stub.not_modified += 1
+                    return self._reply(304, headers=validators)
+                self._reply(200, stub.payload(latitude, longitude), validators)
+
+        return Handler
+
+    def start(self) -> "MetOfficeStub":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="met-office-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MetOfficeStub":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -3,9 +3,11 @@ from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
 
+from src.common.timing import timed
 import src.config as config
 
 
+@timed("interp_30min")
 def interp_30min(frame: pd.DataFrame) -> pd.DataFrame:
     """Interpolates hourly weather report into 30-min intervals.
 
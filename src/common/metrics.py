@@ -0,0 +1,399 @@
+"""Prometheus metrics of the server, aggregated over the gunicorn workers.
+
+Counters, gauges and histograms are kept in memory by every process. With a
+metrics directory (`METRICS_DIR`), every process also writes its values to
+`<dir>/metrics_<pid>.json` every `METRICS_FLUSH_SECONDS` and at exit, and
+`render` adds up the files of all processes with the live values of its own,
+so a scrape served by any worker reports the whole server:
+
+- counters and histograms are summed over all processes, including workers
+  that exited, so totals never go backwards when gunicorn replaces a worker,
+- gauges are summed (or their maximum taken) over the live processes only.
+
+The metrics of the server are declared at the bottom of this module; values
+kept elsewhere, e.g. the stage timings, are added by collectors at render
+time (see `Metrics.collector`).
+"""
+import atexit
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from src.common.timing import BUCKETS, timings
+import src.config as config
+
+FILE_PATTERN = re.compile(r"metrics_(\d+)\.json$")
+
+
+class Family:
+    """A metric and its values per label combination."""
+
+    kind = None
+
+    def __init__(self, registry: "Metrics", name: str, help: str, labels=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        assert len(labels) == len(self.labels) and set(labels) == set(
+            self.labels
+        ), f"{self.name} takes the labels {self.labels}, got: {sorted(labels)}"
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def snapshot(self) -> dict:
+        with self.registry._lock:
+            values = [[list(key), _copy(value)] for key, value in self.values.items()]
+        return {
+            "kind": self.kind,
+            "help": self.help,
+            "labels": list(self.labels),
+            "values": values,
+        }
+
+
+class Counter(Family):
+    kind = "counter"
+
+    def inc(self, value: float = 1.0, **labels) -> None:
+        assert value >= 0, f"counters only go up, got: {value}"
+        key = self._key(labels)
+        with self.registry._lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+
+class Gauge(Family):
+    """A value that goes up and down.
+
+    Args:
+        aggregate (str): `sum` or `max`, how the values of the processes are
+            combined.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, registry, name, help, labels=(), aggregate="sum"):
+        assert aggregate in ("sum", "max"), f"unknown aggregate: {aggregate}"
+        super().__init__(registry, name, help, labels)
+        self.aggregate = aggregate
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self.registry._lock:
+            self.values[key] = float(value)
+
+    def inc(self, value: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self.registry._lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def dec(self, value: float = 1.0, **labels) -> None:
+        self.inc(-value, **labels)
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "aggregate": self.aggregate}
+
+
+class Histogram(Family):
+    """Durations counted per bucket, the values are `[counts, sum]`.
+
+    Args:
+        buckets (Sequence[float]): Upper bounds of the buckets, +Inf is added.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labels=(), buckets=BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self.registry._lock:
+            counts, total = self.values.get(key) or ([0] * (len(self.buckets) + 1), 0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key] = [counts, total + value]
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "buckets": list(self.buckets)}
+
+
+def _copy(value):
+    return [list(value[0]), value[1]] if isinstance(value, list) else value
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Metrics:
+    """The metrics of a process, shared with the others through `directory`.
+
+    Args:
+        directory (str): Directory of the per-process files, the metrics are
+            those of this process only without.
+    """
+
+    def __init__(self, directory: str = None):
+        self.families: Dict[str, Family] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, dict]]]] = []
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        self.directory = None
+        if directory:
+            self.configure(directory)
+
+    def _add(self, family: Family) -> Family:
+        assert family.name not in self.families, f"duplicated metric: {family.name}"
+        self.families[family.name] = family
+        return family
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, help, labels))
+
+    def gauge(
+        self, name: str, help: str, labels: Sequence[str] = (), aggregate="sum"
+    ) -> Gauge:
+        return self._add(Gauge(self, name, help, labels, aggregate))
+
+    def histogram(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets=BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(self, name, help, labels, buckets))
+
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, dict]]]) -> None:
+        """Adds a function returning `(name, family snapshot)` of extra metrics."""
+        self._collectors.append(collect)
+
+    def configure(self, directory: str) -> None:
+        """Shares the metrics of this process through `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # a file left by a dead process with the same pid is kept under
+        # another name, its counts still add to the totals
+        path = self._path()
+        if os.path.exists(path):
+            os.replace(path, f"{path[:-len('.json')]}_{time.time_ns()}.json")
+
+    def _path(self, pid: int = None) -> str:
+        return os.path.join(self.directory, f"metrics_{pid or os.getpid()}.json")
+
+    def snapshot(self) -> Dict[str, dict]:
+        """The values of this process, by metric name."""
+        families = {name: family.snapshot() for name, family in self.families.items()}
+        for collect in self._collectors:
+            families.update(collect())
+        return families
+
+    def flush(self) -> None:
+        """Writes the values of this process to its file."""
+        if self.directory is None:
+            return
+        data = json.dumps(self.snapshot()).encode()
+        fd, tmp = tempfile.mkstemp(prefix=".metrics.", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path())
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def start_flushing(self, interval: float = config.METRICS_FLUSH_SECONDS) -> None:
+        """Flushes in a background thread every `interval` seconds and at exit."""
+        if self.directory is None or self._flusher is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.flush()
+
+        self._flusher = threading.Thread(target=loop, name="metrics", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def stop_flushing(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self._stop.clear()
+
+    def collect(self) -> Dict[str, dict]:
+        """The values of all processes, combined per metric."""
+        own = self.snapshot()
+        if self.directory is None:
+            return own
+        snapshots = [(own, True)]
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            match = FILE_PATTERN.search(os.path.basename(path))
+            pid = int(match.group(1)) if match else None
+            if pid == os.getpid():
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append((json.load(f), pid is not None and _alive(pid)))
+            except (OSError, ValueError):
+                continue  # replaced while reading, counted at the next scrape
+        return merge(snapshots)
+
+    def render(self) -> str:
+        """The metrics of all processes in the Prometheus text format."""
+        return render(self.collect())
+
+
+def merge(snapshots: List[Tuple[Dict[str, dict], bool]]) -> Dict[str, dict]:
+    """Combines `(snapshot, alive)` of several processes."""
+    merged: Dict[str, dict] = {}
+    for snapshot, alive in snapshots:
+        for name, family in snapshot.items():
+            if family["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**family, "values": {}})
+            if family.get("buckets") != target.get("buckets"):
+                continue  # redefined between versions, skipped until restart
+            values = target["values"]
+            for labels, value in family["values"]:
+                key = tuple(labels)
+                if key not in values:
+                    values[key] = _copy(value)
+                elif family["kind"] == "histogram":
+                    counts, total = values[key]
+                    values[key] = [
+                        [a + b for a, b in zip(counts, value[0])],
+                        total + value[1],
+                    ]
+                elif family.get("aggregate") == "max":
+                    values[key] = max(values[key], value)
+                else:
+                    values[key] += value
+    for family in merged.values():
+        family["values"] = [[list(k), v] for k, v in sorted(family["values"].items())]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(families: Dict[str, dict]) -> str:
+    """Formats metric snapshots in the Prometheus text format."""
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        help = family["help"].replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        names = family["labels"]
+        for values, value in family["values"]:
+            if family["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, values)} {_number(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(family["buckets"] + [float("inf")], counts):
+                cumulative += count
+                labels = _labels(list(names) + ["le"], list(values) + [_number(bound)])
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(config.METRICS_DIR)
+
+REQUESTS = metrics.counter(
+    "aimlac_requests_total", "Requests served.", ["route", "method", "status"]
+)
+REQUEST_SECONDS = metrics.histogram(
+    "aimlac_request_duration_seconds", "Request latency.", ["route", "method"]
+)
+IN_FLIGHT = metrics.gauge("aimlac_requests_in_flight", "Requests being served.")
+MODEL_LOADS = metrics.histogram(
+    "aimlac_model_load_seconds", "Time spent loading model files.", ["model"]
+)
+DB_CONNECTS = metrics.counter(
+    "aimlac_db_connects_total", "Database connections opened.", ["backend", "outcome"]
+)
+DB_CONNECT_SECONDS = metrics.histogram(
+    "aimlac_db_connect_seconds", "Time spent opening connections.", ["backend"]
+)
+DB_OPEN = metrics.gauge(
+    "aimlac_db_connections_open", "Database connections open.", ["backend"]
+)
+CACHE_REQUESTS = metrics.counter(
+    "aimlac_cache_requests_total",
+    "Cache lookups; the hit ratio is hit / (hit + miss).",
+    ["cache", "result"],
+)
+RSE_SUBMISSIONS = metrics.counter(
+    "aimlac_rse_submissions_total", "Order submissions to the RSE.", ["status"]
+)
+RSE_SUBMIT_SECONDS = metrics.histogram(
+    "aimlac_rse_submit_seconds", "Order submission latency, retries included."
+)
+RSE_HOURS = metrics.counter(
+    "aimlac_rse_hours_total",
+    "Hourly orders sent, or skipped as unchanged since the last book.",
+    ["outcome"],
+)
+RSE_BYTES_SENT = metrics.counter(
+    "aimlac_rse_bytes_sent_total", "Bytes of orders sent, retries included."
+)
+
+
+STAGE_TIMINGS = "aimlac_stage_duration_seconds"
+
+
+def stage_histograms() -> Dict[str, Dict[str, list]]:
+    """The stage timings of all processes as `{endpoint: {stage: [counts, sum]}}`."""
+    family = metrics.collect().get(STAGE_TIMINGS, {"values": []})
+    histograms = {}
+    for (endpoint, name), value in family["values"]:
+        histograms.setdefault(endpoint, {})[name] = value
+    return histograms
+
+
+def _stage_timings():
+    values = [
+        [[endpoint, name], [list(histogram.counts), histogram.sum]]
+        for endpoint, name, histogram in timings.histograms()
+    ]
+    yield STAGE_TIMINGS, {
+        "kind": "histogram",
+        "help": "Request stages timed while SERVER_TIMING is enabled.",
+        "labels": ["endpoint", "stage"],
+        "values": values,
+        "buckets": list(BUCKETS),
+    }
+
+
+metrics.collector(_stage_timings)
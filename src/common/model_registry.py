@@ -0,0 +1,175 @@
+"""Versioned registry for the model files used by the predictors.
+
+Layout of the registry directory (`config.MODEL_REGISTRY_DIR`):
+
+    <root>/<model>/<version>/<filename>
+    <root>/<model>/ACTIVE          name of the active version
+
+Versions are immutable once published, switching versions atomically replaces
+the `ACTIVE` file. Without a registry directory, or before any version is
+activated, the `builtin` version shipped inside the package is used.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from src.common.metrics import CACHE_REQUESTS, MODEL_LOADS
+import src.config as config
+
+BUILTIN = "builtin"
+ACTIVE_FILE = "ACTIVE"
+
+
+class ModelRegistry:
+    """Loads, caches and switches versions of the registered models.
+
+    Loaded models are cached per file and only reloaded when the file's
+    inode, size or mtime changes, so `get` costs a couple of `os.stat` calls
+    per request. The inode catches a file replaced (e.g. by `os.replace`)
+    within the resolution of the mtime.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root
+        self._models: Dict[str, Tuple[str, Callable[[str], Any], str]] = {}
+        # path -> ((st_ino, st_size, st_mtime_ns), value), for both models
+        # and ACTIVE pointers
+        self._cache: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self, name: str, filename: str, loader: Callable[[str], Any], builtin: str
+    ) -> None:
+        """Registers a model with its file name, loader and builtin file."""
+        self._models[name] = (filename, loader, builtin)
+
+    def models(self) -> List[str]:
+        return sorted(self._models)
+
+    def _model_dir(self, name: str) -> str:
+        assert self.root, "no model registry directory configured"
+        assert name in self._models, f"unknown model: {name}"
+        return os.path.join(self.root, name)
+
+    def _cached(self, path: str, load: Callable[[str], Any], name: str = None) -> Any:
+        """Loads `path` unless cached, model loads (with `name`) are measured."""
+        stat = os.stat(path)
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == key:
+            if name is not None:
+                CACHE_REQUESTS.inc(cache="model", result="hit")
+            return cached[1]
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is None or cached[0] != key:
+                start = time.perf_counter()
+                cached = (key, load(path))
+                self._cache[path] = cached
+                if name is not None:
+                    MODEL_LOADS.observe(time.perf_counter() - start, model=name)
+        if name is not None:
+            CACHE_REQUESTS.inc(cache="model", result="miss")
+        return cached[1]
+
+    def active_version(self, name: str) -> str:
+        """Returns the active version of a model."""
+        assert name in self._models, f"unknown model: {name}"
+        if not self.root:
+            return BUILTIN
+        path = os.path.join(self.root, name, ACTIVE_FILE)
+        try:
+            return self._cached(path, _read_text)
+        except FileNotFoundError:
+            return BUILTIN
+
+    def versions(self, name: str) -> List[str]:
+        """Returns all available versions of a model."""
+        assert name in self._models, f"unknown model: {name}"
+        filename = self._models[name][0]
+        versions = [BUILTIN]
+        if self.root and os.path.isdir(os.path.join(self.root, name)):
+            model_dir = self._model_dir(name)
+            versions += sorted(
+                v
+                for v in os.listdir(model_dir)
+                if os.path.isfile(os.path.join(model_dir, v, filename))
+            )
+        return versions
+
+    def path(self, name: str, version: str = None) -> str:
+        """Returns the file of a model version, defaults to the active version."""
+        assert name in self._models, f"unknown model: {name}"
+        filename, _, builtin = self._models[name]
+        version = version or self.active_version(name)
+        if version == BUILTIN:
+            return builtin
+        _check_version(version)
+        return os.path.join(self._model_dir(name), version, filename)
+
+    def get(self, name: str, version: str = None) -> Any:
+        """Returns the loaded model, pinned to `version` if given."""
+        _, loader, _ = self._models[name]
+        path = self.path(name, version)
+        assert os.path.exists(path), f"unknown version of {name}: {version}"
+        return self._cached(path, loader, name)
+
+    def publish(
+        self, name: str, version: str, write: Callable[[str], None], activate=False
+    ) -> str:
+        """Adds a new version of a model.
+
+        Args:
+            name (str): Name of the model.
+            version (str): Name of the new version, must not exist yet.
+            write (Callable[[str], None]): Function writing the model file to
+                the given path.
+            activate (bool): Whether to make the new version the active one.
+
+        Returns:
+            str: Path of the published model file.
+        """
+        _check_version(version)
+        assert version != BUILTIN, f"`{BUILTIN}` is reserved"
+        filename = self._models[name][0]
+        model_dir = self._model_dir(name)
+        version_dir = os.path.join(model_dir, version)
+        assert not os.path.exists(version_dir), f"version exists: {version}"
+
+        os.makedirs(model_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{version}.", dir=model_dir)
+        try:
+            write(os.path.join(tmp_dir, filename))
+            os.rename(tmp_dir, version_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        if activate:
+            self.activate(name, version)
+        return os.path.join(version_dir, filename)
+
+    def activate(self, name: str, version: str) -> None:
+        """Atomically switches the active version of a model."""
+        assert os.path.exists(self.path(name, version)), f"unknown version: {version}"
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=model_dir)
+        with os.fdopen(fd, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(model_dir, ACTIVE_FILE))
+
+
+def _read_text(path: str) -> str:
+    with open(path) as f:
+        return f.read().strip()
+
+
+def _check_version(version: str) -> None:
+    assert version and os.path.basename(version) == version, f"bad version: {version}"
+    assert not version.startswith("."), f"bad version: {version}"
+
+
+registry = ModelRegistry(config.MODEL_REGISTRY_DIR)
@@ -0,0 +1,170 @@
+"""Bulk persistence of predictions into the tables read by the bidders.
+
+The power and price predictions were written to `powerPrediction` and
+`pricePrediction` by Node-RED. Saving them from the server avoids the extra
+hop: every call upserts all rows keyed on `time` with a single `executemany`
+inside one transaction. Only the given columns are updated, so the wind, solar
+and onsite predictions can be saved separately into the same rows.
+
+`MaterializedPredictions` keeps the recent predictions of the scheduler in
+memory as well, so the bidders can read them without transferring the rows.
+"""
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+import pandas as pd
+
+from src.storage.sqlite_storage import SQLiteStorage
+from src.storage.storage import TIME_FORMAT, Storage
+
+POWER_TABLE = "powerPrediction"
+PRICE_TABLE = "pricePrediction"
+
+POWER_COLUMNS = [
+    "WindSpeed",
+    "WindPower",
+    "SolarPower",
+    "HQPowerDemand",
+    "HQTemperature",
+]
+PRICE_COLUMNS = ["price"]
+
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.IGNORECASE)
+
+
+def upsert_frame(
+    storage: Storage, table: str, frame: pd.DataFrame, columns: List[str]
+) -> int:
+    """Upserts the `columns` of `frame`, keyed on `time`, in one transaction.
+
+    Args:
+        storage (Storage): Database to write to.
+        table (str): Table to write to, must have a unique key on `time`.
+        frame (pd.DataFrame): Rows with a `time` column.
+        columns (List[str]): Columns to write, others present in `frame` are
+            ignored.
+
+    Returns:
+        int: Number of rows written.
+    """
+    columns = [col for col in columns if col in frame.columns]
+    assert "time" in frame.columns, "no timestamp"
+    assert columns, f"no columns to write to {table}"
+
+    # timestamps are stored as naive UTC
+    times = pd.to_datetime(frame.time, utc=True).dt.tz_convert(None)
+    values = [times.dt.strftime(TIME_FORMAT).tolist()]
+    for col in columns:
+        values.append([None if pd.isna(v) else float(v) for v in frame[col].tolist()])
+    return storage.upsert(table, columns, list(zip(*values)))
+
+
+def save_power_predictions(storage: Storage, frame: pd.DataFrame) -> int:
+    """Saves wind, solar and/or onsite demand predictions to `powerPrediction`."""
+    return upsert_frame(storage, POWER_TABLE, frame, POWER_COLUMNS)
+
+
+def save_price_predictions(storage: Storage, frame: pd.DataFrame) -> int:
+    """Saves price predictions to `pricePrediction`."""
+    return upsert_frame(storage, PRICE_TABLE, frame, PRICE_COLUMNS)
+
+
+def merge_power_predictions(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Joins wind, solar and onsite predictions on their (UTC) time."""
+    power_df = None
+    for frame in frames:
+        frame = frame.assign(time=pd.to_datetime(frame.time, utc=True))
+        if power_df is not None:
+            frame = power_df.merge(frame, on="time", how="outer")
+        power_df = frame
+    return power_df.sort_values("time").reset_index(drop=True)
+
+
+def latest_time(storage: Storage, table: str) -> Optional[pd.Timestamp]:
+    """Latest `time` of a prediction table, None if it is empty."""
+    latest = storage.read_sql(f"SELECT MAX(time) AS time FROM {table}").time[0]
+    return None if pd.isna(latest) else pd.Timestamp(latest)
+
+
+class MaterializedPredictions:
+    """In-memory copy of the prediction tables the bidders read.
+
+    The tables live in a private in-memory SQLite database, so the bidders'
+    query templates run on it unchanged. Only queries reading nothing but
+    the prediction tables can be served from it.
+
+    Attributes:
+        updated_at (datetime): Time of the last update, None before any.
+    """
+
+    TABLES = (POWER_TABLE, PRICE_TABLE)
+
+    def __init__(self):
+        self.storage = SQLiteStorage(
+            sqlite3.connect(":memory:", check_same_thread=False)
+        )
+        self.storage.create_schema()
+        self.updated_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def covers(cls, template: str) -> bool:
+        """Whether all tables read by `template` are materialized."""
+        tables = TABLE_REFERENCE.findall(template)
+        return bool(tables) and all(table in cls.TABLES for table in tables)
+
+    def current(self, storage: Storage, template: str) -> bool:
+        """Whether the tables read by `template` end where the database ends.
+
+        Other processes may have written newer predictions to the database,
+        the copy is only used while it is as recent.
+        """
+        for table in set(TABLE_REFERENCE.findall(template)):
+            with self._lock:
+                latest = latest_time(self.storage, table)
+            if latest is None or latest != latest_time(storage, table):
+                return False
+        return True
+
+    def update(
+        self, power: pd.DataFrame = None, price: pd.DataFrame = None, keep_from=None
+    ) -> None:
+        """Upserts predictions and drops the rows before `keep_from`."""
+        with self._lock:
+            if power is not None:
+                upsert_frame(self.storage, POWER_TABLE, power, POWER_COLUMNS)
+            if price is not None:
+                upsert_frame(self.storage, PRICE_TABLE, price, PRICE_COLUMNS)
+            if keep_from is not None:
+                for table in self.TABLES:
+                    self.storage.execute(
+                        f"DELETE FROM {table} WHERE time < ?",
+                        (pd.Timestamp(keep_from).strftime(TIME_FORMAT),),
+                    )
+                self.storage.commit()
+            self.updated_at = datetime.utcnow()
+
+    def load(self, storage: Storage, start, end) -> int:
+        """Copies the predictions between `start` and `end` from `storage`."""
+        rows = 0
+        for table, columns in (
+            (POWER_TABLE, POWER_COLUMNS),
+            (PRICE_TABLE, PRICE_COLUMNS),
+        ):
+            frame = storage.read_sql(
+                f"SELECT time, {', '.join(columns)} FROM {table} "
+                "WHERE time >= ? AND time < ?",
+                (start, end),
+            )
+            if not frame.empty:
+                with self._lock:
+                    rows += upsert_frame(self.storage, table, frame, columns)
+        return rows
+
+    def read_template(self, template: str, **kwargs) -> pd.DataFrame:
+        assert self.covers(template), "query reads tables that are not materialized"
+        with self._lock:
+            return self.storage.read_template(template, **kwargs)
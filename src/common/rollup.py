@@ -0,0 +1,178 @@
+"""Pre-aggregated tables of a time series, one per resolution."""
+from datetime import datetime
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.storage.storage import TIME_FORMAT, Storage
+
+# table suffix -> bucket size, finest first
+RESOLUTIONS = {"30min": "30min", "hourly": "1H", "daily": "1D"}
+
+
+class Rollup:
+    """Rollup tables for a set of columns of a time series.
+
+    Attributes:
+        name (str): Prefix of the rollup tables.
+        columns (List[str]): Aggregated columns.
+        how (str): `sum` to add up the values in a bucket (e.g. energy), or
+            `mean` to average them (e.g. power samples).
+    """
+
+    def __init__(self, name: str, columns: Sequence[str], how: str = "mean"):
+        assert how in ("sum", "mean"), f"unknown aggregation: {how}"
+        self.name = name
+        self.columns = list(columns)
+        self.how = how
+        # the server talks to a single database, so the tables only need to
+        # be created once per process
+        self._created = False
+
+    def table(self, resolution: str) -> str:
+        assert resolution in RESOLUTIONS, f"unknown resolution: {resolution}"
+        return f"{self.name}_{resolution}"
+
+    def create_tables(self, conn: Storage) -> None:
+        """Creates the rollup tables if they do not exist yet."""
+        cols = ", ".join(f"{col} DOUBLE" for col in self.columns)
+        for resolution in RESOLUTIONS:
+            conn.run_statement(
+                f"CREATE TABLE IF NOT EXISTS {self.table(resolution)} "
+                f"(time DATETIME PRIMARY KEY, {cols}, samples INTEGER)"
+            )
+        self._created = True
+
+    def ensure_tables(self, conn: Storage) -> None:
+        if not self._created:
+            self.create_tables(conn)
+
+    def read(
+        self, conn: Storage, resolution: str, start: datetime, end: datetime
+    ) -> pd.DataFrame:
+        """Reads the buckets of a rollup table in `[start, end)`."""
+        self.ensure_tables(conn)
+        return conn.read_sql(
+            f"SELECT * FROM {self.table(resolution)} "
+            "WHERE time >= ? AND time < ? ORDER BY time",
+            (start, end),
+        )
+
+    def last(self, conn: Storage, resolution: str) -> pd.DataFrame:
+        """Reads the latest bucket of a rollup table, empty if there is none."""
+        self.ensure_tables(conn)
+        return conn.read_sql(
+            f"SELECT * FROM {self.table(resolution)} ORDER BY time DESC LIMIT 1"
+        )
+
+    def totals(self, conn: Storage) -> dict:
+        """Sums of the columns over the whole series, from the coarsest table."""
+        assert self.how == "sum", f"{self.name} is not summed"
+        self.ensure_tables(conn)
+        sums = ", ".join(f"SUM({col}) AS {col}" for col in self.columns)
+        frame = conn.read_sql(f"SELECT {sums} FROM {self.table(list(RESOLUTIONS)[-1])}")
+        return {col: float(frame[col].fillna(0.0)[0]) for col in self.columns}
+
+    def _write(self, conn: Storage, resolution: str, buckets: pd.DataFrame) -> None:
+        values = [buckets.time.dt.strftime(TIME_FORMAT).tolist()]
+        for col in self.columns:
+            column = buckets[col].astype(float)
+            values.append([None if np.isnan(v) else v for v in column.tolist()])
+        values.append(buckets.samples.astype(int).tolist())
+        conn.upsert(
+            self.table(resolution), self.columns + ["samples"], list(zip(*values))
+        )
+
+    def _combine(self, frame: pd.DataFrame, freq: str) -> pd.DataFrame:
+        """Merges buckets (or raw rows with samples=1) into buckets of `freq`."""
+        frame = frame.assign(time=frame.time.dt.floor(freq))
+        if self.how == "mean":
+            weighted = frame[self.columns].mul(frame.samples, axis=0)
+            frame = frame.assign(**{col: weighted[col] for col in self.columns})
+        grouped = frame.groupby("time", sort=True)[self.columns + ["samples"]].sum(
+            min_count=1
+        )
+        if self.how == "mean":
+            grouped[self.columns] = grouped[self.columns].div(grouped.samples, axis=0)
+        return grouped.reset_index()
+
+    def update(self, conn: Storage, rows: pd.DataFrame) -> None:
+        """Recomputes the buckets touched by `rows` in all rollup tables.
+
+        `rows` must hold every raw row of the finest buckets it touches, which
+        makes updates idempotent: feeding the same rows twice (e.g. from two
+        workers) gives the same tables.
+
+        Args:
+            conn (Storage): Database connection.
+            rows (pd.DataFrame): Raw rows with `time` and the rollup columns.
+        """
+        if rows.empty:
+            return
+        self.ensure_tables(conn)
+        rows = rows[["time"] + self.columns].assign(
+            time=pd.to_datetime(rows.time), samples=1
+        )
+        resolutions = list(RESOLUTIONS.items())
+
+        finest, freq = resolutions[0]
+        buckets = self._combine(rows, freq)
+        self._write(conn, finest, buckets)
+
+        # coarser tables: recompute the touched buckets from the finer table
+        for (finer, _), (resolution, freq) in zip(resolutions, resolutions[1:]):
+            start = buckets.time.min().floor(freq)
+            end = buckets.time.max().floor(freq) + pd.Timedelta(freq)
+            buckets = self._combine(self.read(conn, finer, start, end), freq)
+            self._write(conn, resolution, buckets)
+
+    def route(self, resolution: str) -> str:
+        """Returns the coarsest rollup table able to serve `resolution`.
+
+        Args:
+            resolution (str): Pandas frequency, e.g. `30min`, `2H`, `1D`, `1M`.
+
+        Returns:
+            str: Suffix of the rollup table (a key of `RESOLUTIONS`).
+        """
+        offset = pd.tseries.frequencies.to_offset(resolution)
+        best = next(iter(RESOLUTIONS))
+        for suffix, freq in RESOLUTIONS.items():
+            step = pd.Timedelta(freq)
+            if isinstance(offset, pd.tseries.offsets.Tick):
+                if pd.Timedelta(offset) % step == pd.Timedelta(0):
+                    best = suffix
+            elif step <= pd.Timedelta("1D"):
+                # calendar frequencies (weeks, months, years) are whole days
+                best = suffix
+        return best
+
+    def query(
+        self, conn: Storage, start: datetime, end: datetime, resolution: str
+    ) -> pd.DataFrame:
+        """Returns the series in `[start, end)` downsampled to `resolution`.
+
+        The data is read from the coarsest rollup table that can serve the
+        resolution and resampled with a single vectorized `resample`.
+        """
+        frame = self.read(conn, self.route(resolution), start, end)
+        return resample(frame, resolution, self.columns, self.how)
+
+
+def resample(
+    frame: pd.DataFrame, resolution: str, columns: List[str], how: str
+) -> pd.DataFrame:
+    """Downsamples buckets (with a `samples` column) to `resolution`."""
+    if frame.empty:
+        return pd.DataFrame(columns=["time"] + columns)
+    frame = frame.set_index("time")
+    if how == "mean":
+        weighted = frame[columns].mul(frame.samples, axis=0).assign(
+            samples=frame.samples
+        )
+        sampled = weighted.resample(resolution).sum(min_count=1)
+        sampled = sampled[columns].div(sampled.samples, axis=0)
+    else:
+        sampled = frame[columns].resample(resolution).sum(min_count=1)
+    return sampled.dropna(how="all").reset_index()
@@ -0,0 +1,487 @@
+"""Background computation of the predictions ahead of the bid deadline.
+
+Forecasts and price histories are handed to the scheduler as they arrive
+(or polled from `sources`). A background thread predicts the wind, solar and
+onsite power (incrementally, see `incremental.py`) and the prices from the
+latest inputs, writes them to the database and materializes them in memory,
+where the bidders read them (see `MaterializedPredictions`).
+
+The freshness of the predictions is the age of the inputs they were
+computed from, counted from when the oldest of them was received: a run
+without new inputs would only repeat the same predictions, so none is made.
+`lead` before every daily bid deadline a warning is logged if the
+predictions will be older than `max_age` at the deadline. At the deadline
+it is recorded as missed if they are, or if inputs received before it had
+not been predicted yet.
+
+A single process of the server runs the scheduler: the one holding the
+`SchedulerLock` of the shared scheduler directory, either a gunicorn worker
+elected with `PREDICTION_SCHEDULER=1` or a separate `flask scheduler run`.
+The other processes hand their inputs over through the `SchedulerInbox` of
+the same directory and read the metrics the scheduler publishes there.
+"""
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from src.common.incremental import IncrementalPredictor
+from src.common.prediction_store import (
+    MaterializedPredictions,
+    merge_power_predictions,
+    save_power_predictions,
+    save_price_predictions,
+)
+import src.config as config
+from src.pricing import predict_price_tomorrow
+from src.storage.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# days of past predictions kept in memory, the bidders read from yesterday
+KEEP_DAYS = 2
+# days of future predictions loaded at start, the longest bid horizon is 7
+AHEAD_DAYS = 9
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(prefix=".tmp.", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class SchedulerLock:
+    """Exclusive lock electing the one process that runs the scheduler.
+
+    The lock is an `flock` on a file of the scheduler directory, released
+    by the operating system when its holder exits.
+
+    Args:
+        directory (str): Scheduler directory shared by the processes.
+    """
+
+    FILE = "scheduler.lock"
+
+    def __init__(self, directory: str = config.PREDICTION_SCHEDULER_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.FILE)
+        self._fd = None
+
+    def acquire(self) -> bool:
+        """Takes the lock unless another process holds it."""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def held_elsewhere(self) -> bool:
+        """Whether another process runs the scheduler."""
+        if self._fd is not None:
+            return False
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        finally:
+            os.close(fd)  # also drops the shared lock
+        return False
+
+
+class SchedulerInbox:
+    """Inputs and metrics exchanged with the scheduler through files.
+
+    The latest forecast and price history are kept as `forecast.json` and
+    `prices.json` with the time they were received, the metrics of the
+    scheduler as `metrics.json`. Files are replaced atomically.
+
+    Args:
+        directory (str): Scheduler directory shared by the processes.
+    """
+
+    KINDS = ("forecast", "prices")
+    METRICS = "metrics.json"
+    RUN = "run"
+
+    def __init__(self, directory: str = config.PREDICTION_SCHEDULER_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._seen: Dict[str, int] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def put(self, kind: str, frame: pd.DataFrame, received: datetime) -> None:
+        """Hands an input to the scheduler."""
+        assert kind in self.KINDS, f"unknown input: {kind}"
+        data = {
+            "received": received.isoformat(),
+            "records": json.loads(frame.to_json(orient="records", date_format="iso")),
+        }
+        _write_atomic(self._path(f"{kind}.json"), json.dumps(data).encode())
+
+    def take(self, kind: str) -> Optional[Tuple[pd.DataFrame, datetime]]:
+        """The input and its receive time if it changed since the last call."""
+        path = self._path(f"{kind}.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if self._seen.get(kind) == mtime:
+                return None
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._seen[kind] = mtime
+        frame = pd.read_json(json.dumps(data["records"]))
+        return frame, datetime.fromisoformat(data["received"])
+
+    def request_run(self) -> None:
+        _write_atomic(self._path(self.RUN), b"")
+
+    def run_requested(self) -> bool:
+        """Whether a run was requested, clears the request."""
+        try:
+            os.unlink(self._path(self.RUN))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def publish_metrics(self, metrics: dict) -> None:
+        _write_atomic(self._path(self.METRICS), json.dumps(metrics).encode())
+
+    def metrics(self) -> Optional[dict]:
+        """The metrics last published by the scheduler, None if never."""
+        try:
+            with open(self._path(self.METRICS)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def next_deadline(now: datetime, deadline: str) -> datetime:
+    """First `HH:MM` (UTC) deadline after `now`."""
+    hour, minute = (int(part) for part in deadline.split(":"))
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return candidate if candidate > now else candidate + timedelta(days=1)
+
+
+class PredictionScheduler:
+    """Keeps the materialized predictions fresh ahead of the bid deadlines.
+
+    Args:
+        connect (Callable[[], Storage]): Opens a database connection to
+            persist the predictions, nothing is persisted without it.
+        deadline (str): Daily bid deadline, `HH:MM` UTC.
+        lead (timedelta): How long before the deadline predictions too old
+            for it are warned about.
+        max_age (timedelta): Age of the inputs of the oldest predictions
+            still counted as fresh.
+        interval (float): Seconds between checks of the background thread.
+        sources (Dict[str, Callable]): Polled at every check, `forecast`
+            returns a forecast frame and `prices` a price history, or None
+            when there is nothing new.
+        clock (Callable[[], datetime]): Current UTC time.
+        inbox (SchedulerInbox): Inputs handed over by the other processes,
+            polled at every check, and where the metrics are published.
+
+    Attributes:
+        materialized (MaterializedPredictions): Predictions served to the
+            bidders.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Storage] = None,
+        deadline: str = config.BID_DEADLINE,
+        lead: timedelta = timedelta(minutes=config.PREDICTION_LEAD_MINUTES),
+        max_age: timedelta = timedelta(hours=config.PREDICTION_MAX_AGE_HOURS),
+        interval: float = config.PREDICTION_POLL_SECONDS,
+        sources: Dict[str, Callable[[], Optional[pd.DataFrame]]] = None,
+        clock: Callable[[], datetime] = datetime.utcnow,
+        inbox: SchedulerInbox = None,
+    ):
+        self.connect = connect
+        self.inbox = inbox
+        self.deadline = deadline
+        self.lead = lead
+        self.max_age = max_age
+        self.interval = interval
+        self.sources = sources or {}
+        self.clock = clock
+        self.predictor = IncrementalPredictor()
+        self.materialized = MaterializedPredictions()
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._forecast = None
+        self._prices = None
+        # receive time of the latest input of each kind
+        self._received: Dict[str, datetime] = {}
+        # receive time of the oldest input not predicted yet
+        self._pending_since = None
+        # receive time of the oldest input of the materialized predictions
+        self._inputs_received = None
+        self._warned_for = None
+        self._next_deadline = next_deadline(self.clock(), deadline)
+        self._metrics = {
+            "runs": 0,
+            "failures": 0,
+            "persist_failures": 0,
+            "deadlines_met": 0,
+            "deadline_misses": 0,
+            "deadline_warnings": 0,
+            "last_run_seconds": None,
+            "last_error": None,
+        }
+
+    def submit_forecast(self, forecast: pd.DataFrame, received: datetime = None):
+        """Hands a new weather forecast, received at `received` (now), over."""
+        received = received or self.clock()
+        with self._lock:
+            self._forecast = forecast.copy()
+            self._received["forecast"] = received
+            self._pending_since = self._pending_since or received
+        self._wake.set()
+
+    def submit_prices(self, prices: pd.DataFrame, received: datetime = None):
+        """Hands a new price history (`date`, `period`, `price`) over."""
+        received = received or self.clock()
+        with self._lock:
+            self._prices = prices.copy()
+            self._received["prices"] = received
+            self._pending_since = self._pending_since or received
+        self._wake.set()
+
+    def warm(self) -> bool:
+        """Whether the materialized predictions are fresh enough to bid on."""
+        return self._fresh_at(self.clock())
+
+    def _fresh_at(self, when: datetime) -> bool:
+        received = self._inputs_received
+        return received is not None and when - received <= self.max_age
+
+    def tick(self) -> bool:
+        """Polls the sources, runs on new inputs and checks the deadline.
+
+        Returns:
+            bool: Whether predictions were computed.
+        """
+        for name, source in self.sources.items():
+            try:
+                data = source()
+            except Exception as e:
+                logger.warning(f"polling {name} failed: {e}")
+                continue
+            if data is not None:
+                (self.submit_forecast if name == "forecast" else self.submit_prices)(
+                    data
+                )
+        forced = False
+        if self.inbox is not None:
+            for kind in SchedulerInbox.KINDS:
+                taken = self.inbox.take(kind)
+                if taken is not None:
+                    submit = {
+                        "forecast": self.submit_forecast,
+                        "prices": self.submit_prices,
+                    }[kind]
+                    submit(*taken)
+            forced = self.inbox.run_requested()
+
+        ran = False
+        if self._pending_since is not None or forced:
+            ran = self.run()
+        self._check_deadline(self.clock())
+        if self.inbox is not None:
+            self.inbox.publish_metrics(self.metrics)
+        return ran
+
+    def run(self) -> bool:
+        """Predicts from the latest inputs, persists and materializes them.
+
+        Returns:
+            bool: Whether the predictions were computed.
+        """
+        with self._lock:
+            forecast, prices = self._forecast, self._prices
+            pending_since, self._pending_since = self._pending_since, None
+            received = min(self._received.values(), default=None)
+        if forecast is None and prices is None:
+            return False
+
+        start = time.perf_counter()
+        try:
+            power = price = None
+            if forecast is not None:
+                predictions, _ = self.predictor.predict(forecast)
+                power = merge_power_predictions(list(predictions.values()))
+            if prices is not None:
+                price = predict_price_tomorrow(prices.copy())
+            self.materialized.update(
+                power, price, keep_from=self.clock() - timedelta(days=KEEP_DAYS)
+            )
+            self._persist(power, price)
+        except Exception as e:
+            logger.exception("prediction run failed")
+            with self._lock:
+                self._metrics["failures"] += 1
+                self._metrics["last_error"] = str(e)
+                # retried at the next check
+                self._pending_since = self._pending_since or pending_since
+            return False
+
+        with self._lock:
+            self._inputs_received = received
+            self._metrics["runs"] += 1
+            self._metrics["last_run_seconds"] = time.perf_counter() - start
+        return True
+
+    def _persist(self, power: pd.DataFrame, price: pd.DataFrame) -> None:
+        if self.connect is None:
+            return
+        storage = None
+        try:
+            storage = self.connect()
+            assert storage is not None, "no database connection"
+            if power is not None:
+                save_power_predictions(storage, power)
+            if price is not None:
+                save_price_predictions(storage, price)
+        except Exception as e:
+            logger.warning(f"could not persist the predictions: {e}")
+            with self._lock:
+                self._metrics["persist_failures"] += 1
+                self._metrics["last_error"] = str(e)
+        finally:
+            if storage is not None:
+                storage.close()
+
+    def _check_deadline(self, now: datetime) -> None:
+        deadline = self._next_deadline
+        if now < deadline:
+            if now >= deadline - self.lead and self._warned_for != deadline:
+                self._warned_for = deadline
+                if not self._fresh_at(deadline):
+                    with self._lock:
+                        self._metrics["deadline_warnings"] += 1
+                    logger.warning(
+                        f"predictions will be too old for the {deadline} deadline"
+                    )
+            return
+        with self._lock:
+            fresh = self._fresh_at(deadline)
+            behind = self._pending_since is not None and self._pending_since < deadline
+            if fresh and not behind:
+                self._metrics["deadlines_met"] += 1
+            else:
+                self._metrics["deadline_misses"] += 1
+                logger.warning(f"predictions not ready for the {deadline} deadline")
+            self._next_deadline = next_deadline(now, self.deadline)
+
+    def load(self) -> int:
+        """Warms the memory with the predictions already in the database."""
+        if self.connect is None:
+            return 0
+        storage = self.connect()
+        try:
+            now = self.clock()
+            return self.materialized.load(
+                storage,
+                now - timedelta(days=KEEP_DAYS),
+                now + timedelta(days=AHEAD_DAYS),
+            )
+        finally:
+            storage.close()
+
+    @property
+    def metrics(self) -> dict:
+        """Run counts, deadline misses and the staleness of the predictions.
+
+        The staleness is the age of the oldest input of the predictions.
+        """
+        now = self.clock()
+        with self._lock:
+            metrics = dict(self._metrics)
+            received, pending = self._inputs_received, self._pending_since
+        metrics["staleness_seconds"] = (
+            None if received is None else (now - received).total_seconds()
+        )
+        metrics["pending_seconds"] = (
+            None if pending is None else (now - pending).total_seconds()
+        )
+        metrics["warm"] = self.warm()
+        metrics["next_deadline"] = self._next_deadline.isoformat()
+        return metrics
+
+    def start(self) -> None:
+        """Starts the background thread."""
+        if self._thread is not None:
+            return
+        try:
+            self.load()
+        except Exception as e:
+            logger.warning(f"could not load the stored predictions: {e}")
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, name="prediction-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("prediction scheduler check failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+_scheduler = None
+
+
+def get_scheduler() -> Optional[PredictionScheduler]:
+    """Returns the scheduler of this process, None if it is not running."""
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[PredictionScheduler]) -> None:
+    global _scheduler
+    _scheduler = scheduler
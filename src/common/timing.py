@@ -0,0 +1,382 @@
+"""Per-stage timings of the requests, for `Server-Timing` headers.
+
+The expensive stages of a request (JSON decoding, `interp_30min`, the solar
+position and clear-sky model of pvlib, the `quad` integration, SQL reads,
+order submission) are wrapped with `stage` or `timed`. While a request is
+timed (see `Timings.begin`) the stages add up their durations for its
+`Server-Timing` header; every duration is also counted in a latency
+histogram per endpoint and stage. Stages outside a request, e.g. in the
+prediction scheduler, are counted under the `background` endpoint.
+
+Timing is switched with `Timings.enabled` at runtime. When it is off a
+stage costs one attribute check, `measure_overhead` reports how much. A
+`TimingSwitch` shares the switch between the processes of the server through
+a flag file, which every process checks about once a second.
+"""
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+# upper bounds of the histogram buckets in seconds, the last one is +Inf
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+BACKGROUND = "background"
+TOTAL = "total"
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+class Histogram:
+    """Counts of durations per bucket of `BUCKETS`, plus their sum."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    @classmethod
+    def from_values(cls, counts: List[int], total: float) -> "Histogram":
+        """A histogram of bucket counts and a sum, as kept by the metrics."""
+        histogram = cls()
+        histogram.counts = list(counts)
+        histogram.sum, histogram.count = total, sum(counts)
+        return histogram
+
+    def minus(self, other: "Histogram") -> "Histogram":
+        """The durations counted since `other`, an earlier copy."""
+        return Histogram.from_values(
+            [a - b for a, b in zip(self.counts, other.counts)], self.sum - other.sum
+        )
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram()
+        histogram.counts = list(self.counts)
+        histogram.sum, histogram.count = self.sum, self.count
+        return histogram
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            # [upper bound, count] in order, JSON objects lose it
+            "buckets": [list(b) for b in zip(list(BUCKETS) + ["+Inf"], self.counts)],
+        }
+
+
+class RequestTiming:
+    """Stage durations of one request, summed per stage in call order."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.total = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def header(self) -> str:
+        """The `Server-Timing` header value, durations in milliseconds."""
+        metrics = [
+            f"{name};dur={seconds * 1000:.3f}"
+            + (f';desc="{self.calls[name]} calls"' if self.calls[name] > 1 else "")
+            for name, seconds in self.stages.items()
+        ]
+        if self.total is not None:
+            metrics.append(f"{TOTAL};dur={self.total * 1000:.3f}")
+        return ", ".join(metrics)
+
+
+class _Stage:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings: "Timings", name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class Timings:
+    """Latency histograms per endpoint and stage.
+
+    Args:
+        enabled (bool): Whether stages are timed.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str):
+        """Context manager timing the stage `name`."""
+        if not self.enabled:
+            return _NO_STAGE
+        return _Stage(self, name)
+
+    def timed(self, name: str):
+        """Decorator timing every call of a function as the stage `name`."""
+
+        def wrapper(fn):
+            @wraps(fn)
+            def timed_fn(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Stage(self, name):
+                    return fn(*args, **kwargs)
+
+            return timed_fn
+
+        return wrapper
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Counts a duration of the stage `name` in the current request."""
+        request = _current.get()
+        if request is not None:
+            request.add(name, seconds)
+        self._observe(request.endpoint if request else BACKGROUND, name, seconds)
+
+    def _observe(self, endpoint: str, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get((endpoint, name))
+            if histogram is None:
+                histogram = self._histograms[endpoint, name] = Histogram()
+            histogram.observe(seconds)
+
+    def begin(self, endpoint: str) -> contextvars.Token:
+        """Starts timing a request of `endpoint` in the current context."""
+        return _current.set(RequestTiming(endpoint))
+
+    def end(self, token: contextvars.Token) -> RequestTiming:
+        """Stops timing the request started with `token`, counts its total."""
+        request = _current.get()
+        _current.reset(token)
+        request.total = time.perf_counter() - request.start
+        self._observe(request.endpoint, TOTAL, request.total)
+        return request
+
+    def histograms(self) -> List[Tuple[str, str, Histogram]]:
+        """Copies of the `(endpoint, stage, histogram)` of every stage timed so far."""
+        with self._lock:
+            return [
+                (endpoint, name, histogram.copy())
+                for (endpoint, name), histogram in sorted(self._histograms.items())
+            ]
+
+    def snapshot(self) -> dict:
+        """The histograms as `{endpoint: {stage: histogram}}`."""
+        result = {}
+        for endpoint, name, histogram in self.histograms():
+            result.setdefault(endpoint, {})[name] = histogram.to_dict()
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+timings = Timings()
+
+
+class TimingSwitch:
+    """Switch of `Timings` shared by processes through a flag file.
+
+    The file holds the switch and the baseline histograms of the last reset
+    (see `set`). `poll` applies the switch of the file to the process when
+    the file changed, checking its modification time at most once every
+    `interval` seconds.
+
+    Args:
+        timings (Timings): Timings of this process.
+        path (str): Flag file, the switch only applies to this process without.
+        interval (float): Seconds between checks of the file.
+    """
+
+    def __init__(self, timings: Timings, path: str = None, interval: float = 1.0):
+        self.timings = timings
+        self.path = path
+        self.interval = interval
+        self._checked = float("-inf")
+        self._mtime = None
+        self._baseline = {}
+
+    def poll(self) -> None:
+        """Applies the switch of the file if it changed since the last check."""
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._mtime = mtime
+        self.timings.enabled = bool(state["enabled"])
+        self._baseline = state.get("baseline", {})
+
+    def set(self, enabled: bool, baseline: Optional[dict] = None) -> None:
+        """Switches timing in every process, resetting to `baseline` if given.
+
+        Args:
+            enabled (bool): Whether stages are timed.
+            baseline (dict): `{endpoint: {stage: [counts, sum]}}` counted so
+                far, left out of `since_reset` from now on.
+        """
+        if baseline is None:
+            baseline = self.baseline()
+        self.timings.enabled = enabled
+        self._baseline = baseline
+        if self.path is None:
+            return
+        data = json.dumps({"enabled": enabled, "baseline": baseline}).encode()
+        fd, tmp = tempfile.mkstemp(prefix=".timing.", dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def baseline(self) -> dict:
+        self._checked = float("-inf")
+        self.poll()
+        return self._baseline
+
+    def since_reset(self, histograms: dict) -> dict:
+        """`{endpoint: {stage: histogram}}` of `histograms` (as in
+        `baseline`) minus the baseline of the last reset, stages not timed
+        since are left out."""
+        baseline = self.baseline()
+        result = {}
+        for endpoint, stages in histograms.items():
+            for name, values in stages.items():
+                histogram = Histogram.from_values(*values)
+                if name in baseline.get(endpoint, {}):
+                    histogram = histogram.minus(
+                        Histogram.from_values(*baseline[endpoint][name])
+                    )
+                if histogram.count:
+                    result.setdefault(endpoint, {})[name] = histogram
+        return result
+
+
+def stage(name: str):
+    """Context manager timing the stage `name` with the process' timings."""
+    return timings.stage(name)
+
+
+def timed(name: str):
+    """Decorator timing every call of a function with the process' timings."""
+    return timings.timed(name)
+
+
+def measure_overhead(iterations: int = 100_000) -> Dict[str, float]:
+    """Nanoseconds a disabled stage adds, as a `with stage` and as a `timed` call.
+
+    Measured on a separate, disabled `Timings` so the switch of the process
+    is not touched.
+    """
+    probe = Timings(enabled=False)
+
+    def bare():
+        return None
+
+    wrapped = probe.timed("probe")(bare)
+
+    def best(fn) -> float:
+        # the fastest of a few rounds, the others are disturbed by the system
+        runs = []
+        for _ in range(5):
+            start = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - start)
+        return min(runs) / iterations * 1e9
+
+    def loop_bare():
+        for _ in range(iterations):
+            bare()
+
+    def loop_stage():
+        for _ in range(iterations):
+            with probe.stage("probe"):
+                bare()
+
+    def loop_timed():
+        for _ in range(iterations):
+            wrapped()
+
+    baseline = best(loop_bare)
+    return {
+        "stage_ns": max(best(loop_stage) - baseline, 0.0),
+        "timed_ns": max(best(loop_timed) - baseline, 0.0),
+        "iterations": iterations,
+    }
@@ -1,7 +1,13 @@
-from os import environ
+from os import environ, path
+from tempfile import gettempdir
 
 AIMLAC_RSE_ADDR = environ.get("AIMLAC_RSE_ADDR")
 AIMLAC_RSE_KEY = environ.get("AIMLAC_RSE_KEY")
+# order submission, see src/bidding/rse_client.py
+RSE_CONNECT_TIMEOUT = float(environ.get("RSE_CONNECT_TIMEOUT", 3.05))
+RSE_READ_TIMEOUT = float(environ.get("RSE_READ_TIMEOUT", 10))
+RSE_RETRIES = int(environ.get("RSE_RETRIES", 3))
+RSE_BACKOFF = float(environ.get("RSE_BACKOFF", 0.5))
 
 DATETIME_FORMAT = "%Y-%m-%dT%H:%MZ"
 LATITUDE = environ.get("LOCATION_LAT")
@@ -14,3 +20,56 @@ ARRAY_AREA = 50.0 * 50.0  # area covered by array in m^2
 BASE_EFFICIENCY = 0.196  # base efficiency of panels
 PMPP = -0.0037  # %/C
 PMAX_ARRAY = 469_000  # W
+
+# directory of the versioned model registry, see src/common/model_registry.py
+MODEL_REGISTRY_DIR = environ.get("MODEL_REGISTRY_DIR")
+
+# linear price model, defaults to the weights shipped in src/pricing
+PRICE_MODEL_WEIGHTS = environ.get("PRICE_MODEL_WEIGHTS")
+PRICE_MODEL_STATE = environ.get("PRICE_MODEL_STATE")
+
+# days of raw energy_onsite rows kept, older data is served from the rollups
+ENERGY_RAW_RETENTION_DAYS = int(environ.get("ENERGY_RAW_RETENTION_DAYS", 90))
+
+# office occupancy calendar, see src/onsite/occupancy.py
+OCCUPANCY_FIRST_YEAR = int(environ.get("OCCUPANCY_FIRST_YEAR", 2015))
+OCCUPANCY_LAST_YEAR = int(environ.get("OCCUPANCY_LAST_YEAR", 2035))
+# closures besides bank holidays, e.g. "2022-12-28/2022-12-30,2023-04-14"
+OFFICE_CLOSURES = environ.get("OFFICE_CLOSURES", "")
+
+# on-site storage, see src/battery/battery.py; no battery while capacity is 0
+BATTERY_CAPACITY = float(environ.get("BATTERY_CAPACITY", 0))  # kWh
+BATTERY_POWER = float(environ.get("BATTERY_POWER", 0))  # kW
+BATTERY_EFFICIENCY = float(environ.get("BATTERY_EFFICIENCY", 0.9))  # round trip
+BATTERY_INITIAL_SOC = float(environ.get("BATTERY_INITIAL_SOC", 0.5))
+# extra cost of energy bought from the grid, in price units per kWh
+BATTERY_IMPORT_PREMIUM = float(environ.get("BATTERY_IMPORT_PREMIUM", 0))
+
+# background predictions, see src/common/scheduler.py
+BID_DEADLINE = environ.get("BID_DEADLINE", "11:00")  # UTC
+PREDICTION_LEAD_MINUTES = float(environ.get("PREDICTION_LEAD_MINUTES", 60))
+PREDICTION_MAX_AGE_HOURS = float(environ.get("PREDICTION_MAX_AGE_HOURS", 6))
+PREDICTION_POLL_SECONDS = float(environ.get("PREDICTION_POLL_SECONDS", 60))
+# lock, inputs and metrics shared by the processes of the server
+PREDICTION_SCHEDULER_DIR = environ.get(
+    "PREDICTION_SCHEDULER_DIR", path.join(gettempdir(), "aimlac-scheduler")
+)
+# last forecast and predictions per site of the incremental predictions,
+# shared by the processes of the server, see src/common/incremental.py
+INCREMENTAL_STATE_DIR = environ.get(
+    "INCREMENTAL_STATE_DIR", path.join(gettempdir(), "aimlac-incremental")
+)
+
+# Met Office site-specific forecasts, see src/common/met_office_client.py
+MET_OFFICE_URL = environ.get(
+    "MET_OFFICE_URL",
+    "https://data.hub.api.metoffice.gov.uk/sitespecific/v0/point/hourly",
+)
+MET_OFFICE_API_KEY = environ.get("MET_OFFICE_API_KEY")
+# raw payloads are only cached in memory without a directory
+FORECAST_CACHE_DIR = environ.get("FORECAST_CACHE_DIR")
+
+# Prometheus metrics, see src/common/metrics.py; without a directory every
+# gunicorn worker only reports its own requests
+METRICS_DIR = environ.get("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(environ.get("METRICS_FLUSH_SECONDS", 5))
@@ -0,0 +1,5 @@
+from src.energy.energy_onsite import (
+    compact_energy_onsite,
+    query_energy,
+    refresh_energy_rollup,
+)
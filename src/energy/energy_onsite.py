@@ -0,0 +1,157 @@
+"""Rollups and retention of the measured `energy_onsite` data."""
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from src.common.rollup import RESOLUTIONS, Rollup
+from src.storage.storage import Storage
+import src.config as config
+
+ENERGY_COLUMNS = [
+    "wind1",
+    "wind2",
+    "wind3",
+    "wind4",
+    "windA",
+    "windB",
+    "solar",
+    "hq_power",
+    "computing_center",
+]
+
+energy_rollup = Rollup("energy_onsite", ENERGY_COLUMNS, how="mean")
+
+# raw rows are rolled up in chunks to bound the memory of the first refresh
+REFRESH_CHUNK = timedelta(days=1)
+
+
+def _time(conn: Storage, query: str, params=()):
+    time = conn.read_sql(query, params).time[0]
+    return None if pd.isna(time) else time
+
+
+def _read_raw(conn: Storage, start: datetime, end: datetime) -> pd.DataFrame:
+    return conn.read_sql(
+        f"SELECT time, {', '.join(ENERGY_COLUMNS)} FROM energy_onsite "
+        "WHERE time >= ? AND time < ? ORDER BY time",
+        (start, end),
+    )
+
+
+def refresh_energy_rollup(conn: Storage, max_days: int = None) -> int:
+    """Rolls up the `energy_onsite` rows added since the last refresh.
+
+    The last rolled up bucket is recomputed as it may have been incomplete,
+    everything before it is left untouched. Refreshes are idempotent, so
+    concurrent workers can run them safely.
+
+    Args:
+        conn (Storage): Database connection.
+        max_days (int): Days of raw rows rolled up at most, the next refresh
+            continues from there. All of them by default.
+
+    Returns:
+        int: Number of raw rows read.
+    """
+    energy_rollup.ensure_tables(conn)
+    finest = next(iter(RESOLUTIONS))
+    start = _time(conn, f"SELECT MAX(time) AS time FROM {energy_rollup.table(finest)}")
+    if start is None:
+        start = _time(conn, "SELECT MIN(time) AS time FROM energy_onsite")
+    end = _time(conn, "SELECT MAX(time) AS time FROM energy_onsite")
+    if start is None or end is None:
+        return 0
+
+    count = days = 0
+    start = start.floor(RESOLUTIONS[finest])
+    while start <= end and (max_days is None or days < max_days):
+        # chunks end on bucket boundaries so every bucket is read in full
+        stop = start + REFRESH_CHUNK
+        rows = _read_raw(conn, start, stop)
+        if rows.empty:
+            # gaps in the data are skipped, they would stall a limited refresh
+            start = _time(
+                conn,
+                "SELECT MIN(time) AS time FROM energy_onsite WHERE time >= ?",
+                (stop,),
+            )
+            if start is None:
+                break
+            start = start.floor(RESOLUTIONS[finest])
+            continue
+        energy_rollup.update(conn, rows)
+        count += len(rows)
+        # only the days past the last rolled up bucket count as progress
+        if rows.time.max() >= start + pd.Timedelta(RESOLUTIONS[finest]):
+            days += 1
+        start = stop
+    return count
+
+
+def compact_energy_onsite(conn: Storage, retention: timedelta = None) -> int:
+    """Deletes raw `energy_onsite` rows older than the retention period.
+
+    The rollups are refreshed first, so compacted data stays available at 30
+    minute resolution. Only whole, rolled up buckets are deleted.
+
+    Args:
+        conn (Storage): Database connection.
+        retention (timedelta): How long to keep raw rows, defaults to
+            `config.ENERGY_RAW_RETENTION_DAYS`.
+
+    Returns:
+        int: Number of raw rows deleted.
+    """
+    retention = retention or timedelta(days=config.ENERGY_RAW_RETENTION_DAYS)
+    refresh_energy_rollup(conn)
+    finest = next(iter(RESOLUTIONS))
+    cutoff = pd.Timestamp(datetime.utcnow() - retention).floor(RESOLUTIONS[finest])
+    rolled_up = _time(
+        conn, f"SELECT MAX(time) AS time FROM {energy_rollup.table(finest)}"
+    )
+    if rolled_up is None:
+        return 0
+    cutoff = min(cutoff, rolled_up)
+
+    return conn.run_statement("DELETE FROM energy_onsite WHERE time < ?", (cutoff,))
+
+
+def query_energy(
+    conn: Storage, start: datetime, end: datetime, resolution: str = None
+) -> pd.DataFrame:
+    """Returns `energy_onsite` data in `[start, end)`.
+
+    Requests at 30 minute or coarser resolution are served from the coarsest
+    rollup table that satisfies them, finer ones (or `resolution=None`) from
+    the raw rows.
+
+    Args:
+        conn (Storage): Database connection.
+        start (datetime): Start of the range.
+        end (datetime): End of the range.
+        resolution (str): Pandas frequency, e.g. `30min`, `1H`, `1D`, `1M`.
+
+    Returns:
+        pd.DataFrame: time and the mean of every energy column per bucket.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if resolution is not None and _is_rollup_resolution(resolution):
+        return energy_rollup.query(conn, start, end, resolution)
+    rows = _read_raw(conn, start, end)
+    if resolution is None:
+        return rows
+    return (
+        rows.set_index("time")
+        .resample(resolution)
+        .mean()
+        .dropna(how="all")
+        .reset_index()
+    )
+
+
+def _is_rollup_resolution(resolution: str) -> bool:
+    offset = pd.tseries.frequencies.to_offset(resolution)
+    if not isinstance(offset, pd.tseries.offsets.Tick):
+        return True
+    finest = pd.Timedelta(next(iter(RESOLUTIONS.values())))
+    return pd.Timedelta(offset) % finest == pd.Timedelta(0)
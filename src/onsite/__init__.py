@@ -1 +1,2 @@
 from src.onsite.onsite import get_energy_demand
+from src.onsite.buildings import BuildingProfile, CampusDemand, campus_demand
@@ -0,0 +1,190 @@
+"""Demand of several buildings sharing one weather forecast.
+
+Every building is described by a `BuildingProfile` (its loads and heating
+curve) relative to the HQ, whose demand is predicted by the active demand
+model (see `demand_model.py`). The forecast is interpolated once for the
+horizon, then the model predicts all buildings at once over a (buildings x
+half hours) grid, each with its own heating curve, and the loads are scaled
+by the profiles.
+"""
+import datetime
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src.onsite.demand_model import HEATING_BASE, HEATING_CAP, get_demand_model
+from src.onsite.occupancy import SLOTS_PER_DAY
+from src.onsite.onsite import (
+    DATA_CENTRE_DEMAND,
+    EQUIPMENT_SHARE,
+    LIGHTING_AND_OTHER_DEMAND,
+    OFFICE_EQUIPMENT_DEMAND,
+    forecast_temperatures,
+)
+from src.onsite.utils import adjust_datetime, half_hour_range
+
+COMPONENTS = ["Heating", "Data Centre", "Office Equipment", "LightingOther"]
+
+# heating curve of the HQ, that of the rule-based demand model
+HEATING_PER_DEGREE = 6.0
+HEATING_MAX = HEATING_PER_DEGREE * (HEATING_BASE - HEATING_CAP)
+
+
+@dataclass
+class BuildingProfile:
+    """Class to represent the loads of a building, in kW.
+
+    The default values are those of the HQ. The loads of a building are those
+    the demand model predicts for the HQ, scaled by the ratio of its loads to
+    the HQ's, so the values of a fitted model are kept in proportion.
+
+    Attributes:
+        name (str): Name of the building.
+        office_equipment (float): Equipment load while the office is occupied.
+        lighting_and_other (float): Lighting and other loads while occupied.
+        data_centre (float): Constant load of the data centre, if any.
+        heating_per_degree (float): Heating load per degree below
+            `heating_base` while occupied.
+        heating_base (float): Outside temperature above which there is no
+            heating.
+        heating_max (float): Capacity of the heating system.
+    """
+
+    name: str
+    office_equipment: float = OFFICE_EQUIPMENT_DEMAND
+    lighting_and_other: float = LIGHTING_AND_OTHER_DEMAND
+    data_centre: float = DATA_CENTRE_DEMAND
+    heating_per_degree: float = HEATING_PER_DEGREE
+    heating_base: float = HEATING_BASE
+    heating_max: float = HEATING_MAX
+
+    def __post_init__(self):
+        for key, value in asdict(self).items():
+            if key not in ("name", "heating_base"):
+                assert value >= 0, f"{self.name}: {key} must not be negative"
+
+    @classmethod
+    def from_dict(cls, profile: dict) -> "BuildingProfile":
+        """Profile from e.g. a JSON object, missing loads default to the HQ's."""
+        unknown = set(profile) - set(cls.__dataclass_fields__)
+        assert not unknown, f"unknown profile keys: {sorted(unknown)}"
+        return cls(**profile)
+
+
+@dataclass
+class CampusDemand:
+    """Demand of several buildings over one horizon.
+
+    Attributes:
+        names (List[str]): Building names, one row of every component each.
+        times (np.ndarray): `datetime64` half hours, one column each.
+        temperatures (np.ndarray): Outside temperature of every half hour.
+        components (Dict[str, np.ndarray]): (buildings x half hours) demand
+            in kW of every entry of `COMPONENTS`.
+    """
+
+    names: List[str]
+    times: np.ndarray
+    temperatures: np.ndarray
+    components: Dict[str, np.ndarray]
+
+    @property
+    def total(self) -> np.ndarray:
+        return sum(self.components[name] for name in COMPONENTS)
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """Demand of one building, with the columns of `get_energy_demand`."""
+        row = self.names.index(name)
+        frame = pd.DataFrame(
+            {
+                "DateTime": np.datetime_as_string(self.times, unit="s", timezone="UTC"),
+                "HQ Temperature": self.temperatures,
+            }
+        )
+        for component in COMPONENTS:
+            frame[component] = self.components[component][row]
+        frame["Total demand"] = self.total[row]
+        return frame
+
+    def summary(self) -> pd.DataFrame:
+        """Energy (kWh), mean and peak demand (kW) of every building."""
+        total = self.total
+        peaks = total.argmax(axis=1)
+        return pd.DataFrame(
+            {
+                "building": self.names,
+                "energy": total.sum(axis=1) / 2,
+                "heating_energy": self.components["Heating"].sum(axis=1) / 2,
+                "mean_demand": total.mean(axis=1),
+                "peak_demand": total.max(axis=1),
+                "peak_time": np.datetime_as_string(
+                    self.times[peaks], unit="s", timezone="UTC"
+                ),
+            }
+        )
+
+
+def campus_demand(
+    profiles: List[BuildingProfile],
+    forecast: pd.DataFrame,
+    start_time: datetime.datetime,
+    periods: int = SLOTS_PER_DAY,
+    version: str = None,
+) -> CampusDemand:
+    """Demand of every building for `periods` half hours from `start_time`.
+
+    Args:
+        profiles (List[BuildingProfile]): The buildings, with unique names.
+        forecast (pd.DataFrame): Hourly forecast shared by all buildings.
+        start_time (datetime.datetime): The first half hour.
+        periods (int): Number of 30 minute intervals.
+        version (str): Version of the demand model, defaults to the active one.
+
+    Returns:
+        CampusDemand: The demand components of every building.
+    """
+    names = [profile.name for profile in profiles]
+    assert profiles, "no buildings"
+    assert len(set(names)) == len(names), "building names must be unique"
+
+    start_time = adjust_datetime(start_time)
+    times = half_hour_range(start_time, periods)
+    temperatures = forecast_temperatures(forecast, times)
+
+    def column(key: str) -> np.ndarray:
+        return np.array([getattr(profile, key) for profile in profiles])[:, None]
+
+    per_degree = column("heating_per_degree")
+    heating_base = column("heating_base")
+    # degrees below the base at which the heating reaches its capacity
+    span = np.divide(
+        column("heating_max"),
+        per_degree,
+        out=np.full(per_degree.shape, np.inf),
+        where=per_degree > 0,
+    )
+    shape = (len(profiles), periods)
+    demand = get_demand_model(version).predict(
+        np.broadcast_to(times, shape).ravel(),
+        np.broadcast_to(temperatures, shape).ravel(),
+        np.broadcast_to(heating_base, shape).ravel(),
+        np.broadcast_to(heating_base - span, shape).ravel(),
+    )
+    demand = {key: values.reshape(shape) for key, values in demand.items()}
+
+    def ratio(key: str, hq: float) -> np.ndarray:
+        return column(key) / hq
+
+    equipment = demand["hq_other"] * EQUIPMENT_SHARE
+    lighting = demand["hq_other"] * (1 - EQUIPMENT_SHARE)
+    components = {
+        "Heating": demand["heating"] * ratio("heating_per_degree", HEATING_PER_DEGREE),
+        "Data Centre": demand["data_centre"] * ratio("data_centre", DATA_CENTRE_DEMAND),
+        "Office Equipment": equipment
+        * ratio("office_equipment", OFFICE_EQUIPMENT_DEMAND),
+        "LightingOther": lighting
+        * ratio("lighting_and_other", LIGHTING_AND_OTHER_DEMAND),
+    }
+    return CampusDemand(names, times, temperatures, components)
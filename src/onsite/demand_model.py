@@ -0,0 +1,240 @@
+"""Linear demand model of the site, fitted from the `energy_onsite` history.
+
+The HQ load (`hq_power`) and the data centre load (`computing_center`) are
+both linear in the same features of a half hour: occupancy, heating degrees
+(below 15 and -5 degrees), background heating and the time of day. The
+hand-written model of `onsite.py` is a special case (30 kW when occupied,
+6 kW per degree below 15 capped at -5, a constant 200 kW data centre) and is
+shipped as the builtin version.
+
+Fitting accumulates the normal equations chunk by chunk, so memory only
+depends on the number of features, and inference is one matrix product.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.common.model_registry import registry
+from src.onsite.occupancy import get_calendar
+
+root = os.path.dirname(__file__)
+
+FEATURES = [
+    "intercept",
+    "occupied",
+    "occupied_heating",  # occupied * max(0, 15 - T)
+    "occupied_heating_cap",  # occupied * max(0, -5 - T)
+    "heating",  # max(0, 15 - T)
+    "hour_sin",
+    "hour_cos",
+]
+# features whose contribution is reported as heating
+HEATING_FEATURES = ["occupied_heating", "occupied_heating_cap", "heating"]
+TARGETS = ["hq_power", "computing_center"]
+
+HEATING_BASE = 15.0
+HEATING_CAP = -5.0
+
+# energy_onsite stores W, the demand model works in kW
+ENERGY_ONSITE_SCALE = 1e-3
+
+# chunk of history read and accumulated at once
+FIT_CHUNK = timedelta(days=31)
+
+HISTORY_QUERY = (
+    "SELECT e.time, e.hq_power, e.computing_center, p.HQTemperature "
+    "FROM energy_onsite_30min e JOIN powerPrediction p ON p.time = e.time "
+    "WHERE e.time >= ? AND e.time < ? ORDER BY e.time"
+)
+
+
+def demand_features(
+    times: np.ndarray,
+    temperatures: np.ndarray,
+    heating_base=HEATING_BASE,
+    heating_cap=HEATING_CAP,
+) -> np.ndarray:
+    """Feature matrix (half hours x features) of the demand model.
+
+    Args:
+        times (np.ndarray): `datetime64` half hours.
+        temperatures (np.ndarray): Outside temperature of every half hour.
+        heating_base (Union[float, np.ndarray]): Temperature below which the
+            building is heated, per half hour or for all of them.
+        heating_cap (Union[float, np.ndarray]): Temperature below which the
+            heating is at its capacity.
+
+    Returns:
+        np.ndarray: One column per entry of `FEATURES`.
+    """
+    times = np.asarray(times, dtype="datetime64[m]")
+    temperatures = np.asarray(temperatures, dtype=float)
+    occupied = get_calendar().lookup(times).astype(float)
+    minutes = (times - times.astype("datetime64[D]")).astype(float)
+    angle = 2 * np.pi * minutes / (24 * 60)
+    heating = np.maximum(heating_base - temperatures, 0.0)
+    return np.column_stack(
+        [
+            np.ones(len(times)),
+            occupied,
+            occupied * heating,
+            occupied * np.maximum(heating_cap - temperatures, 0.0),
+            heating,
+            np.sin(angle),
+            np.cos(angle),
+        ]
+    )
+
+
+class DemandModel:
+    """Coefficients of the linear demand model.
+
+    Attributes:
+        coef (np.ndarray): Coefficients (features x targets), in kW.
+    """
+
+    def __init__(self, coef: np.ndarray):
+        assert coef.shape == (len(FEATURES), len(TARGETS)), "bad coefficients"
+        self.coef = coef
+
+    @classmethod
+    def rule_based(cls) -> "DemandModel":
+        """The hand-written model: 30 kW office load, 6 kW/degree heating."""
+        coef = np.zeros((len(FEATURES), len(TARGETS)))
+        hq, data_centre = TARGETS.index("hq_power"), TARGETS.index("computing_center")
+        coef[FEATURES.index("occupied"), hq] = 30.0
+        coef[FEATURES.index("occupied_heating"), hq] = 6.0
+        coef[FEATURES.index("occupied_heating_cap"), hq] = -6.0
+        coef[FEATURES.index("intercept"), data_centre] = 200.0
+        return cls(coef)
+
+    def predict(
+        self,
+        times: np.ndarray,
+        temperatures: np.ndarray,
+        heating_base=HEATING_BASE,
+        heating_cap=HEATING_CAP,
+    ) -> Dict[str, np.ndarray]:
+        """Predicts the demand components in kW.
+
+        `heating_base` and `heating_cap` move the heating curve, see
+        `demand_features`; the model was fitted with the defaults.
+
+        Returns:
+            Dict[str, np.ndarray]: `heating` and `hq_other` (their sum is
+                the HQ load) and `data_centre`.
+        """
+        # missing temperatures count as no heating
+        features = np.nan_to_num(
+            demand_features(times, temperatures, heating_base, heating_cap)
+        )
+        hq = TARGETS.index("hq_power")
+        heating_columns = [FEATURES.index(name) for name in HEATING_FEATURES]
+        heating = features[:, heating_columns] @ self.coef[heating_columns, hq]
+        loads = features @ self.coef
+        return {
+            "heating": heating,
+            "hq_other": loads[:, hq] - heating,
+            "data_centre": loads[:, TARGETS.index("computing_center")],
+        }
+
+    def save(self, path: str) -> None:
+        np.savez(path, coef=self.coef, features=np.array(FEATURES))
+
+    @classmethod
+    def load(cls, path: str) -> "DemandModel":
+        with np.load(path) as data:
+            assert list(data["features"]) == FEATURES, f"stale features in {path}"
+            return cls(data["coef"])
+
+
+registry.register(
+    "demand",
+    "demand_model.npz",
+    DemandModel.load,
+    os.path.join(root, "demand_model.npz"),
+)
+
+
+def get_demand_model(version: str = None) -> DemandModel:
+    """Returns the active demand model, or `version`."""
+    return registry.get("demand", version)
+
+
+class NormalEquations:
+    """Running `X^T X` and `X^T y` of a least-squares fit.
+
+    Args:
+        ridge (float): Ridge penalty, keeps features never seen in the
+            history (e.g. no cold days) at zero instead of undetermined.
+    """
+
+    def __init__(self, ridge: float = 1e-3):
+        self.ridge = ridge
+        self.xtx = np.zeros((len(FEATURES), len(FEATURES)))
+        self.xty = np.zeros((len(FEATURES), len(TARGETS)))
+        self.rows = 0
+
+    def add(self, features: np.ndarray, targets: np.ndarray) -> None:
+        keep = np.isfinite(features).all(axis=1) & np.isfinite(targets).all(axis=1)
+        features, targets = features[keep], targets[keep]
+        self.xtx += features.T @ features
+        self.xty += features.T @ targets
+        self.rows += len(features)
+
+    def solve(self) -> DemandModel:
+        assert self.rows, "no history to fit"
+        penalty = self.ridge * np.eye(len(FEATURES))
+        return DemandModel(np.linalg.solve(self.xtx + penalty, self.xty))
+
+
+def fit_demand_model(
+    chunks: Iterable[pd.DataFrame], scale: float = ENERGY_ONSITE_SCALE
+) -> Tuple[DemandModel, int]:
+    """Fits the demand model by least squares over chunks of history.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Frames with `time`, `hq_power`,
+            `computing_center` and `HQTemperature`, e.g. a month each.
+        scale (float): Factor converting the loads to kW.
+
+    Returns:
+        Tuple[DemandModel, int]: The fitted model and the number of rows
+            used.
+    """
+    equations = NormalEquations()
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        features = demand_features(
+            pd.to_datetime(chunk.time).to_numpy("datetime64[m]"),
+            chunk.HQTemperature.to_numpy(dtype=float),
+        )
+        equations.add(features, chunk[TARGETS].to_numpy(dtype=float) * scale)
+    return equations.solve(), equations.rows
+
+
+def read_history(conn, start: datetime, end: datetime) -> Iterable[pd.DataFrame]:
+    """Yields the half-hourly loads and temperatures in `[start, end)`."""
+    chunk_start = pd.Timestamp(start)
+    while chunk_start < end:
+        chunk_end = min(chunk_start + FIT_CHUNK, pd.Timestamp(end))
+        yield conn.read_sql(HISTORY_QUERY, (chunk_start, chunk_end))
+        chunk_start = chunk_end
+
+
+def train_demand_model(
+    conn, start: datetime, end: datetime, version: str = None, activate: bool = True
+) -> Tuple[str, int]:
+    """Fits the demand model on the history and publishes it as a version.
+
+    Returns:
+        Tuple[str, int]: The published version and the number of rows used.
+    """
+    model, rows = fit_demand_model(read_history(conn, start, end))
+    version = version or datetime.utcnow().strftime("fit-%Y%m%dT%H%M%S")
+    registry.publish("demand", version, model.save, activate=activate)
+    return version, rows
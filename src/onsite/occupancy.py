@@ -0,0 +1,238 @@
+"""Precomputed office occupancy calendar.
+
+The occupied half hours (weekdays 9:00-17:00, except bank holidays and
+closures) of a multi-year span are computed once and stored as a packed
+bitset, one bit per half hour. Looking up the mask of a horizon is then a
+slice of the bitset starting at the index of its first half hour.
+
+Bank holidays are those of England and Wales, where the site is, including
+substitute days and the one-off changes announced so far.
+"""
+import datetime
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+
+import src.config as config
+
+SLOTS_PER_DAY = 48
+SLOT = np.timedelta64(30, "m")
+
+DAY_START = 9 * 60  # minutes after midnight
+DAY_END = 17 * 60
+
+# bank holidays moved by proclamation: regular date -> actual date
+MOVED_HOLIDAYS = {
+    datetime.date(2002, 5, 27): datetime.date(2002, 6, 4),
+    datetime.date(2012, 5, 28): datetime.date(2012, 6, 4),
+    datetime.date(2020, 5, 4): datetime.date(2020, 5, 8),
+    datetime.date(2022, 5, 30): datetime.date(2022, 6, 2),
+}
+EXTRA_HOLIDAYS = [
+    datetime.date(1999, 12, 31),
+    datetime.date(2002, 6, 3),
+    datetime.date(2011, 4, 29),
+    datetime.date(2012, 6, 5),
+    datetime.date(2022, 6, 3),
+    datetime.date(2022, 9, 19),
+    datetime.date(2023, 5, 8),
+]
+
+Day = Union[datetime.date, str]
+
+
+def easter_sunday(year: int) -> datetime.date:
+    """Date of Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _weekday_on_or_before(day: datetime.date, weekday: int) -> datetime.date:
+    return day - datetime.timedelta(days=(day.weekday() - weekday) % 7)
+
+
+def _weekday_on_or_after(day: datetime.date, weekday: int) -> datetime.date:
+    return day + datetime.timedelta(days=(weekday - day.weekday()) % 7)
+
+
+def bank_holidays(year: int) -> List[datetime.date]:
+    """Bank holidays of England and Wales in `year`, sorted."""
+    easter = easter_sunday(year)
+    holidays = [
+        easter - datetime.timedelta(days=2),  # Good Friday
+        easter + datetime.timedelta(days=1),  # Easter Monday
+        _weekday_on_or_after(datetime.date(year, 5, 1), 0),  # early May
+        _weekday_on_or_before(datetime.date(year, 5, 31), 0),  # spring
+        _weekday_on_or_before(datetime.date(year, 8, 31), 0),  # summer
+    ]
+    holidays = [MOVED_HOLIDAYS.get(day, day) for day in holidays]
+
+    # New Year's Day, Christmas and Boxing Day move to the next free weekday
+    for day in [
+        datetime.date(year, 1, 1),
+        datetime.date(year, 12, 25),
+        datetime.date(year, 12, 26),
+    ]:
+        while day.weekday() >= 5 or day in holidays:
+            day += datetime.timedelta(days=1)
+        holidays.append(day)
+
+    holidays += [day for day in EXTRA_HOLIDAYS if day.year == year]
+    return sorted(holidays)
+
+
+def parse_closures(spec: str) -> List[Tuple[datetime.date, datetime.date]]:
+    """Parses `YYYY-MM-DD` days and `YYYY-MM-DD/YYYY-MM-DD` ranges.
+
+    Args:
+        spec (str): Comma separated days or inclusive ranges, e.g.
+            `2022-12-28/2022-12-30,2023-04-14`.
+
+    Returns:
+        List[Tuple[datetime.date, datetime.date]]: Inclusive closure ranges.
+    """
+    closures = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, last = item.partition("/")
+        first = datetime.date.fromisoformat(first)
+        last = datetime.date.fromisoformat(last) if last else first
+        assert first <= last, f"closure ends before it starts: {item}"
+        closures.append((first, last))
+    return closures
+
+
+def occupancy(
+    first_day: Day, last_day: Day, closures: Iterable[Tuple[Day, Day]] = ()
+) -> np.ndarray:
+    """Occupied half hours from `first_day` to `last_day` inclusive.
+
+    Returns:
+        np.ndarray: Boolean array of 48 slots per day.
+    """
+    days = np.arange(np.datetime64(first_day, "D"), np.datetime64(last_day, "D") + 1)
+    # 1970-01-01 was a Thursday, shift so that Monday is 0
+    open_days = (days.astype(int) + 3) % 7 < 5
+
+    years = range(days[0].astype(object).year, days[-1].astype(object).year + 1)
+    holidays = np.array(
+        [day for year in years for day in bank_holidays(year)], dtype="datetime64[D]"
+    )
+    open_days &= ~np.isin(days, holidays)
+    for first, last in closures:
+        open_days &= ~(
+            (days >= np.datetime64(first, "D")) & (days <= np.datetime64(last, "D"))
+        )
+
+    minutes = np.arange(SLOTS_PER_DAY) * 30
+    open_slots = (minutes >= DAY_START) & (minutes <= DAY_END)
+    return (open_days[:, None] & open_slots[None, :]).ravel()
+
+
+class OccupancyCalendar:
+    """Bitset of the occupied half hours of a span of years.
+
+    Args:
+        first_year (int): First year of the span.
+        last_year (int): Last year of the span (inclusive).
+        closures (Iterable[Tuple[date, date]]): Extra inclusive closure
+            ranges, e.g. between Christmas and New Year.
+
+    Attributes:
+        start (np.datetime64): First half hour of the span.
+        slots (int): Number of half hours in the span.
+        bits (np.ndarray): Packed occupancy, bit `i` is half hour
+            `start + i * 30min`.
+    """
+
+    def __init__(
+        self,
+        first_year: int,
+        last_year: int,
+        closures: Iterable[Tuple[Day, Day]] = (),
+    ):
+        assert first_year <= last_year, "empty span"
+        self.closures = list(closures)
+        first_day = datetime.date(first_year, 1, 1)
+        last_day = datetime.date(last_year, 12, 31)
+        mask = occupancy(first_day, last_day, self.closures)
+        self.start = np.datetime64(first_day, "m")
+        self.slots = len(mask)
+        self.bits = np.packbits(mask)
+
+    def mask(self, start_time, periods: int = SLOTS_PER_DAY) -> np.ndarray:
+        """Occupancy of `periods` half hours from `start_time`.
+
+        Within the span this only slices the bitset, horizons outside of it
+        or off the half hour grid are computed on the fly.
+        """
+        start = np.datetime64(start_time, "s")
+        offset = start - self.start
+        if offset % SLOT:
+            return self._exact(start + np.arange(periods) * SLOT)
+        index = int(offset // SLOT)
+        if index < 0 or index + periods > self.slots:
+            return self._compute(start_time, periods)
+        first, shift = divmod(index, 8)
+        chunk = self.bits[first : (index + periods + 7) // 8]
+        return np.unpackbits(chunk)[shift : shift + periods].astype(bool)
+
+    def lookup(self, times: np.ndarray) -> np.ndarray:
+        """Occupancy of arbitrary datetime64 half hours."""
+        times = np.asarray(times, dtype="datetime64[s]")
+        if ((times - self.start) % SLOT).any():
+            return self._exact(times)
+        offsets = (times - self.start) // SLOT
+        inside = (offsets >= 0) & (offsets < self.slots)
+        if not inside.all():
+            days = times.astype("datetime64[D]")
+            occupied = occupancy(days.min(), days.max(), self.closures)
+            return occupied[(times - np.datetime64(days.min(), "m")) // SLOT]
+        return (self.bits[offsets >> 3] >> (7 - (offsets & 7)) & 1).astype(bool)
+
+    def _exact(self, times: np.ndarray) -> np.ndarray:
+        # times off the half hour grid, occupied from DAY_START to DAY_END
+        # inclusive on open days
+        if not len(times):
+            return np.zeros(0, dtype=bool)
+        days = times.astype("datetime64[D]")
+        first_day = days.min()
+        open_days = occupancy(first_day, days.max(), self.closures).reshape(
+            -1, SLOTS_PER_DAY
+        )[:, DAY_START // 30]
+        minutes = (times - days).astype("timedelta64[s]").astype(float) / 60
+        return open_days[(days - first_day).astype(int)] & (
+            (minutes >= DAY_START) & (minutes <= DAY_END)
+        )
+
+    def _compute(self, start_time, periods: int) -> np.ndarray:
+        start = np.datetime64(start_time, "m")
+        first_day = start.astype("datetime64[D]")
+        last_day = (start + (periods - 1) * SLOT).astype("datetime64[D]")
+        index = int((start - np.datetime64(first_day, "m")) // SLOT)
+        return occupancy(first_day, last_day, self.closures)[index : index + periods]
+
+
+_calendar = None
+
+
+def get_calendar() -> OccupancyCalendar:
+    """Returns the calendar of this process, built on first use."""
+    global _calendar
+    if _calendar is None:
+        _calendar = OccupancyCalendar(
+            config.OCCUPANCY_FIRST_YEAR,
+            config.OCCUPANCY_LAST_YEAR,
+            parse_closures(config.OFFICE_CLOSURES),
+        )
+    return _calendar
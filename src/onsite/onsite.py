@@ -4,16 +4,28 @@ import datetime
 import numpy as np
 import pandas as pd
 
-from typing import List
+from typing import Dict, List
 
+import src.config as config
 from src.common import interp_30min
-from src.onsite.utils import get_temperatures, temp_to_energy, adjust_datetime
-from src.onsite.utils import create_initial_demand_dataframe, get_active_office_mask
+from src.onsite.demand_model import get_demand_model
+from src.onsite.utils import get_temperatures, heating_energy, adjust_datetime
+from src.onsite.utils import create_initial_demand_dataframe, half_hour_range
+
+DATA_CENTRE_DEMAND = 200.0
+OFFICE_EQUIPMENT_DEMAND = 10.0
+LIGHTING_AND_OTHER_DEMAND = 20.0
+# share of the non-heating HQ load reported as office equipment
+EQUIPMENT_SHARE = OFFICE_EQUIPMENT_DEMAND / (
+    OFFICE_EQUIPMENT_DEMAND + LIGHTING_AND_OTHER_DEMAND
+)
 
 
 def get_energy_demand(
     forecast: pd.DataFrame,
-    start_time=datetime.datetime.now().replace(hour=23, minute=0, second=0),
+    start_time: datetime.datetime = None,
+    periods: int = None,
+    version: str = None,
 ) -> pd.DataFrame:
     """Get the energy demand for the building.
 
@@ -23,40 +35,105 @@ def get_energy_demand(
     Args:
         forecast (dict): Forcast dataframe.
         start_time (datetime.datetime): The datetime to start predicting building demand from.
+            By default the first half hour of the forecast, of the
+            interpolated one unless `periods` is given.
+        periods (int): Number of 30 minute intervals to predict. By default the
+            next 24 hours of the forecast (`interp_30min`), otherwise the
+            hourly forecast temperatures are interpolated over any horizon.
+        version (str): Version of the demand model, defaults to the active one.
 
     Returns: pd.DataFrame: The total energy demand for the building over the next
         24 hours, in 30 minute intervals (48 instances).
     """
-    forecast = interp_30min(forecast)
-    start_time = adjust_datetime(start_time)
+    if periods is None:
+        forecast = interp_30min(forecast)
+    start_time = adjust_datetime(start_time or forecast_start(forecast))
+    if periods is None:
+        temperatures = get_temperatures(forecast)
+    else:
+        temperatures = forecast_temperatures(
+            forecast, half_hour_range(start_time, periods)
+        )
+    return demand_from_temperatures(start_time, temperatures, version)
 
-    demand_dataframe = create_initial_demand_dataframe(start_time)
 
-    active_office_mask = get_active_office_mask(start_time)
+def forecast_start(forecast: pd.DataFrame) -> datetime.datetime:
+    """The first time of the forecast, without a time zone."""
+    times = pd.to_datetime(forecast.time, format=config.DATETIME_FORMAT)
+    return times.min().tz_localize(None).to_pydatetime()
 
-    temperatures_over_coming_24_hours, heating_demand = get_heating_demand(
-        forecast, active_office_mask
-    )
-    demand_dataframe["Heating"] = heating_demand
-    demand_dataframe["HQ Temperature"] = temperatures_over_coming_24_hours
-    demand_dataframe["Data Centre"] = get_data_centre_demand()
-    demand_dataframe["Office Equipment"] = get_office_equipment_demand(
-        active_office_mask
-    )
-    demand_dataframe["LightingOther"] = get_lighting_and_other_demand(
-        active_office_mask
-    )
 
-    demand_dataframe["Total demand"] = (
-        demand_dataframe["Heating"]
-        + demand_dataframe["Data Centre"]
-        + demand_dataframe["Office Equipment"]
-        + demand_dataframe["LightingOther"]
+def forecast_temperatures(forecast: pd.DataFrame, times: np.ndarray) -> np.ndarray:
+    """Linearly interpolates the forecast temperatures at datetime64 `times`.
+
+    Times outside of the forecast get the first or last forecast temperature.
+    """
+    forecast_times = pd.to_datetime(forecast.time, format=config.DATETIME_FORMAT)
+    forecast_times = forecast_times.dt.tz_localize(None).to_numpy("datetime64[m]")
+    order = np.argsort(forecast_times)
+    return np.interp(
+        times.astype("datetime64[m]").astype(float),
+        forecast_times[order].astype(float),
+        forecast["screenTemperature"].to_numpy(dtype=float)[order],
     )
 
+
+def demand_from_temperatures(
+    start_time: datetime.datetime, temperatures: np.ndarray, version: str = None
+) -> pd.DataFrame:
+    """Energy demand of the building for half hours from `start_time`.
+
+    Every component is computed for the whole horizon at once by the demand
+    model (see `demand_model.py`), one interval per temperature.
+
+    Args:
+        start_time (datetime.datetime): The first half hour.
+        temperatures (np.ndarray): Outside temperature of every half hour.
+        version (str): Version of the demand model, defaults to the active one.
+
+    Returns: pd.DataFrame: The demand components and the total demand for
+        every half hour.
+    """
+    temperatures = np.asarray(temperatures, dtype=float)
+    demand_dataframe = create_initial_demand_dataframe(start_time, len(temperatures))
+    times = half_hour_range(start_time, len(temperatures))
+    demand = demand_components(times, temperatures, version)
+
+    demand_dataframe["HQ Temperature"] = temperatures
+    for column, values in demand.items():
+        demand_dataframe[column] = values
     return demand_dataframe
 
 
+def demand_components(
+    times: np.ndarray, temperatures: np.ndarray, version: str = None
+) -> Dict[str, np.ndarray]:
+    """Demand components and total demand at arbitrary half hours.
+
+    Args:
+        times (np.ndarray): `datetime64` half hours.
+        temperatures (np.ndarray): Outside temperature of every half hour.
+        version (str): Version of the demand model, defaults to the active one.
+
+    Returns:
+        Dict[str, np.ndarray]: The columns of `demand_from_temperatures`.
+    """
+    demand = get_demand_model(version).predict(times, temperatures)
+    components = {
+        "Heating": demand["heating"],
+        "Data Centre": demand["data_centre"],
+        "Office Equipment": demand["hq_other"] * EQUIPMENT_SHARE,
+        "LightingOther": demand["hq_other"] * (1 - EQUIPMENT_SHARE),
+    }
+    components["Total demand"] = (
+        components["Heating"]
+        + components["Data Centre"]
+        + components["Office Equipment"]
+        + components["LightingOther"]
+    )
+    return components
+
+
 def get_heating_demand(
     forecast: pd.DataFrame, active_office_mask: List[bool]
 ) -> np.ndarray:
@@ -73,27 +150,25 @@ def get_heating_demand(
     Returns: np.ndarray: The energy demands of the heating system over the next
         24 hours, in 30 minute intervals (48 instances).
     """
-    temperatures_over_coming_24_hours = get_temperatures(forecast)
-    heating_demand = np.zeros(48)
-    for index, _ in enumerate(heating_demand):
-        if active_office_mask[index]:
-            heating_demand[index] = temp_to_energy(
-                temperatures_over_coming_24_hours[index]
-            )
-
-    return temperatures_over_coming_24_hours, heating_demand
+    active_office_mask = np.asarray(active_office_mask, dtype=bool)
+    temperatures = get_temperatures(forecast, len(active_office_mask))
+    heating_demand = np.where(active_office_mask, heating_energy(temperatures), 0.0)
+    return temperatures, heating_demand
 
 
-def get_data_centre_demand() -> np.ndarray:
+def get_data_centre_demand(periods: int = 48) -> np.ndarray:
     """Get the energy demand for the data center.
 
     Returns a numpy array with the energy demand of the data centre over the
     coming 24 hour period, in 30 minute intervals. Currently a dummy function.
 
+    Args:
+        periods (int): Number of 30 minute intervals.
+
     Returns: np.ndarray: The energy demands of the data center over the next 24
         hours, in 30 minute intervals (48 instances).
     """
-    return np.ones(48) * 200
+    return np.full(periods, DATA_CENTRE_DEMAND)
 
 
 def get_office_equipment_demand(active_office_mask: List[bool]) -> np.ndarray:
@@ -109,11 +184,7 @@ def get_office_equipment_demand(active_office_mask: List[bool]) -> np.ndarray:
     Returns: np.ndarray: The energy demands of the office equipment over the
         next 24 hours, in 30 minutes intervals (48 instances).
     """
-    demand = np.zeros(48)
-    for index, _ in enumerate(demand):
-        if active_office_mask[index]:
-            demand[index] = 10
-    return demand
+    return np.asarray(active_office_mask, dtype=bool) * OFFICE_EQUIPMENT_DEMAND
 
 
 def get_lighting_and_other_demand(active_office_mask: List[bool]) -> np.ndarray:
@@ -129,8 +200,4 @@ def get_lighting_and_other_demand(active_office_mask: List[bool]) -> np.ndarray:
     Returns: np.ndarray: The energy demands of the lighting and other equipment
         over the next 24 hours, in 30 minutes intervals (48 instances).
     """
-    demand = np.zeros(48)
-    for index, _ in enumerate(demand):
-        if active_office_mask[index]:
-            demand[index] = 20
-    return demand
+    return np.asarray(active_office_mask, dtype=bool) * LIGHTING_AND_OTHER_DEMAND
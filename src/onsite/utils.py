@@ -1,16 +1,32 @@
-"""Various helper functions to calculate the energy demand of the building.
-
-Todo:
-    get_active_office_mask() Should account for bank holidays and Christmas.
-"""
+"""Various helper functions to calculate the energy demand of the building."""
 
 import datetime
+import numpy as np
 import pandas as pd
 
-from typing import List
+from typing import List, Union
+
+from src.onsite.occupancy import SLOT, SLOTS_PER_DAY, get_calendar
+
+
+def half_hour_range(
+    start_time: Union[datetime.datetime, np.datetime64], periods: int = SLOTS_PER_DAY
+) -> np.ndarray:
+    """Get `periods` half hour steps from `start_time` as a datetime64 array.
+
+    Args:
+        start_time (datetime.datetime): Start time of the range.
+        periods (int): Number of 30 minute steps.
+
+    Returns: np.ndarray: `datetime64[m]` array of the steps.
+    """
+    start = np.datetime64(start_time, "m")
+    return start + np.arange(periods) * SLOT
 
 
-def get_next_24_hour_datetime(start_time: datetime.datetime) -> List[datetime.datetime]:
+def get_next_24_hour_datetime(
+    start_time: datetime.datetime, periods: int = SLOTS_PER_DAY
+) -> List[datetime.datetime]:
     """Get datetime objects for the next 24 hours.
 
     Returns an array of datetime objects of the next 24 hour interval, in 30
@@ -18,20 +34,31 @@ def get_next_24_hour_datetime(start_time: datetime.datetime) -> List[datetime.da
 
     Args: start_time (datetime.datetime): Start time of the 24 hour
         period.
+        periods (int): Number of 30 minute steps, 48 for 24 hours.
 
     Returns: List[datetime.datetime]: An array of datetime objects of the next
         24 hour interval in 30 minute steps from the given start time (48
         instances).
     """
-    date_times = []
-    for index in range(48):
-        minutes_to_add = index * 30
-        temp_time = start_time + datetime.timedelta(minutes=minutes_to_add)
-        date_times.append(temp_time)
-    return date_times
+    return half_hour_range(start_time, periods).astype("datetime64[us]").tolist()
+
+
+def office_mask(times: np.ndarray) -> np.ndarray:
+    """Boolean occupancy mask of datetime64 half hours.
+
+    True on working days 9:00-17:00, bank holidays and closures excluded.
 
+    Args:
+        times (np.ndarray): `datetime64` array of half hours.
+
+    Returns: np.ndarray: Boolean array, True when the office is in use by staff.
+    """
+    return get_calendar().lookup(times)
 
-def get_active_office_mask(start_time: datetime.datetime) -> List[bool]:
+
+def get_active_office_mask(
+    start_time: datetime.datetime, periods: int = SLOTS_PER_DAY
+) -> List[bool]:
     """Returns a boolean array for office occupancy for the next 24 hours.
 
     Returns an array of booleans (True/False) of 30 minute intervals where True
@@ -39,21 +66,12 @@ def get_active_office_mask(start_time: datetime.datetime) -> List[bool]:
 
     Args: start_time (datetime.datetime): Start time of the 24 hour
         period.
+        periods (int): Number of 30 minute steps, 48 for 24 hours.
 
     Returns: List[bool]: An array of booleans of the next 24 hour period where
         True is when the office will be in use by staff.
     """
-    following_24_hours_times = get_next_24_hour_datetime(start_time)
-    mask = [False for _ in range(48)]
-
-    day_start = datetime.time(9, 0, 0)
-    day_end = datetime.time(17, 0, 0)
-
-    for index, val in enumerate(following_24_hours_times):
-        # val.weekday() < 5 checks the datetime in question isn't on the weekend
-        if day_start <= val.time() <= day_end and val.weekday() < 5:
-            mask[index] = True
-    return mask
+    return get_calendar().mask(start_time, periods).tolist()
 
 
 def temp_to_energy(temp: int) -> int:
@@ -74,7 +92,21 @@ def temp_to_energy(temp: int) -> int:
     return (-6 * temp) + 90
 
 
-def get_temperatures(forecast: pd.DataFrame) -> List[int]:
+def heating_energy(temps: np.ndarray) -> np.ndarray:
+    """Vectorized `temp_to_energy`, the heating curve clipped to 0-120 kW.
+
+    Args:
+        temps (np.ndarray): Outside temperatures in degrees celsius.
+
+    Returns:
+        np.ndarray: Power used by the heating system in kilowatts.
+    """
+    return np.clip(-6.0 * np.asarray(temps, dtype=float) + 90.0, 0.0, 120.0)
+
+
+def get_temperatures(
+    forecast: pd.DataFrame, periods: int = SLOTS_PER_DAY
+) -> np.ndarray:
     """Get the tempreture of the site for the next 24 hours.
 
     Get the temperature of the site for the next 24 hours in 30 minute
@@ -82,37 +114,38 @@ def get_temperatures(forecast: pd.DataFrame) -> List[int]:
 
     Args:
         forecast (dict): Forcast dataframe.
+        periods (int): Number of 30 minute steps, 48 for 24 hours.
 
-    Returns: List[int]: The temperature in celsius of the site for the next 24
+    Returns: np.ndarray: The temperature in celsius of the site for the next 24
         hours in 30 minute intervals (48 instances).
     """
     temperatures = forecast["screenTemperature"].to_numpy(dtype="float")
-    if len(temperatures) == 49:
-        temperatures = temperatures[:-1]
-    return temperatures.tolist()
+    return temperatures[:periods]
 
 
-def create_initial_demand_dataframe(start_time: datetime.datetime) -> pd.DataFrame:
+def create_initial_demand_dataframe(
+    start_time: datetime.datetime, periods: int = SLOTS_PER_DAY
+) -> pd.DataFrame:
     """
     Creates the initial empty dataframe used when calculating the energy demand
     of the building.
 
     Args:
         start_time (datetime.datetime): Start time of the 24 hour period.
+        periods (int): Number of 30 minute steps, 48 for 24 hours.
 
     Returns:
         pd.DataFrame: Each row is a time interval, in 30 minute periods, for the
                       next 11pm-11pm slot
     """
-
-    times = []
-    for i in range(48):
-        new_time = start_time + datetime.timedelta(minutes=30 * i)
-        times.append(new_time.strftime("%Y-%m-%dT%H:%M:%SZ"))
-
-    active_office_mask = get_active_office_mask(start_time)
-
-    data = {"DateTime": times, "Active office mask": active_office_mask}
+    times = half_hour_range(start_time, periods)
+    # same as strftime("%Y-%m-%dT%H:%M:%SZ"), without a Python loop
+    date_times = np.datetime_as_string(times, unit="s", timezone="UTC")
+
+    data = {
+        "DateTime": date_times.astype(object),
+        "Active office mask": get_calendar().mask(start_time, periods),
+    }
 
     initial_data_frame = pd.DataFrame(data)
     initial_data_frame["Heating"] = 0
@@ -1 +1 @@
-from src.pricing.pricing import predict_price_tomorrow
+from src.pricing.pricing import predict_price_batch, predict_price_tomorrow
@@ -0,0 +1,178 @@
+"""Incremental (recursive least squares) training of the linear price model.
+
+The price model predicts the 24 hourly prices of day `d + 2` from the prices
+of day `d` as `prices @ w + b`. Each new day of prices completes one training
+pair, which updates `w` and `b` in O(features^2) without refitting over the
+history.
+"""
+from datetime import date, timedelta
+from typing import Dict, Union
+
+import fcntl
+import numpy as np
+import os
+import pandas as pd
+
+from src.common.model_registry import registry
+from src.pricing import pricing
+import src.config as config
+
+HORIZON = timedelta(days=2)
+
+
+class OnlinePriceModel:
+    """Recursive least squares learner for the price model weights.
+
+    Attributes:
+        theta (np.ndarray): Weights with the bias as the last row, (25, 24).
+        P (np.ndarray): Inverse feature covariance, (25, 25).
+        forgetting (float): Forgetting factor in (0, 1], lower values adapt
+            faster to recent days.
+        history (Dict[date, np.ndarray]): Prices of the last few days, which
+            are still waiting for their target day.
+    """
+
+    def __init__(
+        self,
+        w: np.ndarray,
+        b: np.ndarray,
+        delta: float = 1e-4,
+        forgetting: float = 1.0,
+        P: np.ndarray = None,
+        history: Dict[date, np.ndarray] = None,
+    ):
+        assert 0 < forgetting <= 1, "forgetting factor must be in (0, 1]"
+        n_features = w.shape[0] + 1
+        self.theta = np.vstack([w, b[None, :]]).astype(float)
+        # a small delta trusts the initial weights, a large one the new data
+        self.P = np.eye(n_features) * delta if P is None else P
+        self.forgetting = forgetting
+        self.history = history or {}
+
+    @property
+    def w(self) -> np.ndarray:
+        return self.theta[:-1]
+
+    @property
+    def b(self) -> np.ndarray:
+        return self.theta[-1]
+
+    def update(self, x: np.ndarray, y: np.ndarray) -> None:
+        """Single RLS step for the features `x` and targets `y`."""
+        x = np.append(np.asarray(x, dtype=float), 1.0)
+        Px = self.P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        self.theta += np.outer(gain, np.asarray(y, dtype=float) - x @ self.theta)
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+
+    def observe_day(self, day: date, prices: np.ndarray) -> int:
+        """Adds a day of 24 hourly prices, returns the number of updates made.
+
+        Days seen before, the ones in `history` and the older ones it dropped,
+        are skipped: their training pairs were already used.
+        """
+        prices = np.asarray(prices, dtype=float)
+        assert prices.shape == (pricing.HOURS,), f"expect {pricing.HOURS} prices"
+        if day in self.history or (
+            self.history and day <= max(self.history) - HORIZON * 2
+        ):
+            return 0
+        updates = 0
+        if day - HORIZON in self.history:
+            self.update(self.history[day - HORIZON], prices)
+            updates += 1
+        if day + HORIZON in self.history:
+            self.update(prices, self.history[day + HORIZON])
+            updates += 1
+        self.history[day] = prices
+        latest = max(self.history)
+        self.history = {
+            d: p for d, p in self.history.items() if d > latest - HORIZON * 2
+        }
+        return updates
+
+    def observe(self, price_df: pd.DataFrame) -> int:
+        """Adds every day of `market_index`-style data in date order."""
+        matrix = pricing.price_matrix(price_df).sort_index()
+        return sum(
+            self.observe_day(day.date(), prices)
+            for day, prices in zip(matrix.index, matrix.to_numpy(dtype=float))
+        )
+
+    def save(self, path: str) -> None:
+        """Atomically persists the learner state."""
+        days = sorted(self.history)
+        pricing.atomic_savez(
+            path,
+            theta=self.theta,
+            P=self.P,
+            forgetting=np.array(self.forgetting),
+            days=np.array([d.toordinal() for d in days], dtype=np.int64),
+            prices=np.array([self.history[d] for d in days]).reshape(
+                -1, pricing.HOURS
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "OnlinePriceModel":
+        with np.load(path) as state:
+            theta = state["theta"]
+            history = {
+                date.fromordinal(int(d)): p
+                for d, p in zip(state["days"], state["prices"])
+            }
+            return cls(
+                theta[:-1],
+                theta[-1],
+                forgetting=float(state["forgetting"]),
+                P=state["P"],
+                history=history,
+            )
+
+
+def default_state_path() -> str:
+    """`config.PRICE_MODEL_STATE`, or a file of the model registry."""
+    if config.PRICE_MODEL_STATE:
+        return config.PRICE_MODEL_STATE
+    assert registry.root, (
+        "online price model updates need MODEL_REGISTRY_DIR or "
+        "PRICE_MODEL_STATE, the source tree is not written to"
+    )
+    os.makedirs(os.path.join(registry.root, "pricing"), exist_ok=True)
+    return os.path.join(registry.root, "pricing", "price_model_state.npz")
+
+
+def update_price_model(price_df: pd.DataFrame, state_path: str = None) -> int:
+    """Updates and hot-swaps the price model with new days of prices.
+
+    The learner state is loaded (or initialised from the active weights),
+    updated, and persisted once the new weights are. The update holds an
+    exclusive file lock so concurrent workers do not lose updates.
+
+    Args:
+        price_df (pd.DataFrame): New `market_index`-style rows.
+        state_path (str): Learner state file, defaults to
+            `config.PRICE_MODEL_STATE` or a file of the model registry.
+
+    Returns:
+        int: Number of training pairs used.
+
+    With a model registry the new weights are published as a new, active
+    version of the `pricing` model, without one they replace the
+    `PRICE_MODEL_WEIGHTS` file; the weights shipped with the code are never
+    replaced.
+    """
+    state_path = state_path or default_state_path()
+    pricing.check_weights_writable()
+    with open(state_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(state_path):
+            model = OnlinePriceModel.load(state_path)
+        else:
+            model = OnlinePriceModel(*pricing.get_weights())
+        updates = model.observe(price_df)
+        # weights first, a state saved without them would skip its days later
+        if updates:
+            pricing.save_weights(model.w, model.b)
+        model.save(state_path)
+    return updates
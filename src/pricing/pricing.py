@@ -1,16 +1,85 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
 import numpy as np
+import os
 import pandas as pd
+import tempfile
+
+from src.common.model_registry import BUILTIN, registry
+import src.config as config
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+HOURS = 24
+
+root = os.path.dirname(__file__)
+weights_path = config.PRICE_MODEL_WEIGHTS or os.path.join(
+    root, "price_model_weights.npz"
+)
+
+
+def load_weights(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Loads the linear model weights from an .npz file."""
+    with np.load(path) as weights:
+        return weights["w"], weights["b"]
+
+
+registry.register("pricing", "price_model_weights.npz", load_weights, weights_path)
+
 
-# load weights
-with np.load("src/pricing/price_model_weights.npz") as weights:
-    w = weights["w"]
-    b = weights["b"]
+def get_weights(version: str = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the weights of the active model version, or of `version`.
 
+    The weights are cached by the model registry and only reloaded when their
+    file changes, which lets every worker pick up new weights without a restart.
+    """
+    return registry.get("pricing", version)
 
-def predict_price_tomorrow(price_df):
-    global w, b
-    price_df.date = pd.to_datetime(price_df.date, format="%Y-%m-%d %H:%M:%S")
+
+def atomic_savez(path: str, **arrays: np.ndarray) -> None:
+    """Writes an .npz file next to `path` and renames it into place."""
+    fd, tmp_path = tempfile.mkstemp(suffix=".npz", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def check_weights_writable() -> None:
+    """Fails unless new weights have somewhere to go besides the source tree."""
+    assert registry.root or config.PRICE_MODEL_WEIGHTS, (
+        "saving price model weights needs MODEL_REGISTRY_DIR or "
+        "PRICE_MODEL_WEIGHTS, the weights shipped with the code are not replaced"
+    )
+
+
+def save_weights(w: np.ndarray, b: np.ndarray, version: str = None) -> str:
+    """Persists new weights and makes them the active ones.
+
+    With a model registry directory the weights are published as a new version
+    (timestamped unless `version` is given), otherwise the `PRICE_MODEL_WEIGHTS`
+    file is replaced atomically.
+
+    Returns:
+        str: The version now active.
+    """
+    check_weights_writable()
+    if not registry.root:
+        atomic_savez(weights_path, w=w, b=b)
+        return BUILTIN
+    version = version or datetime.utcnow().strftime("online-%Y%m%dT%H%M%S%f")
+    registry.publish(
+        "pricing", version, lambda path: np.savez(path, w=w, b=b), activate=True
+    )
+    return version
+
+
+def predict_price_tomorrow(price_df, version: str = None):
+    w, b = get_weights(version)
+    price_df.date = pd.to_datetime(price_df.date, format=DATE_FORMAT)
     price_df["datetime"] = price_df.date + price_df.period.map(
         lambda t: timedelta(hours=t - 1)
     )
@@ -21,3 +90,69 @@ def predict_price_tomorrow(price_df):
     price_tmr = price_tmr.reset_index()
     price_tmr.columns = ["time", "price"]
     return price_tmr
+
+
+def price_matrix(price_df: pd.DataFrame, group_by: List[str] = None) -> pd.DataFrame:
+    """Pivots `market_index`-style rows into one row of 24 prices per day.
+
+    Args:
+        price_df (pd.DataFrame): Data with `date`, `period` and `price` columns.
+        group_by (List[str]): Extra key columns identifying a day.
+
+    Returns:
+        pd.DataFrame: Prices indexed by the (parsed) `date` and `group_by`
+            keys, with one column per period. Missing hours are forward filled
+            as in `asfreq().ffill()`.
+    """
+    keys = ["date"] + list(group_by or [])
+    for col in keys + ["period", "price"]:
+        assert col in price_df.columns, f"missing column: {col}"
+
+    frame = price_df[keys + ["period", "price"]].copy()
+    frame["date"] = pd.to_datetime(frame.date, format=DATE_FORMAT)
+    first = int(frame.period.min())
+    periods = np.arange(first, first + HOURS)
+    assert frame.period.isin(periods).all(), f"expect {HOURS} consecutive periods"
+
+    matrix = frame.set_index(keys + ["period"]).price.unstack("period")
+    matrix = matrix.reindex(columns=periods).ffill(axis=1)
+    assert not matrix.isna().to_numpy().any(), "missing first hour of a day"
+    return matrix
+
+
+def predict_price_batch(
+    price_df: pd.DataFrame, group_by: List[str] = None, version: str = None
+):
+    """Predicts the prices two days ahead for many days at once.
+
+    Every distinct `date` (and `group_by` key, e.g. a market) in `price_df` is
+    one day of 24 hourly prices. The days are stacked into a (days x 24)
+    matrix so all predictions come from a single matrix product.
+
+    Args:
+        price_df (pd.DataFrame): `market_index`-style data with `date`,
+            `period` and `price` columns.
+        group_by (List[str]): Extra key columns identifying a day, these are
+            carried over to the output.
+        version (str): Model version to use, defaults to the active one.
+
+    Returns:
+        pd.DataFrame: `time` and `price` of the predicted hours (plus the
+            `group_by` columns), in the same layout as `predict_price_tomorrow`.
+    """
+    keys = ["date"] + list(group_by or [])
+    matrix = price_matrix(price_df, group_by)
+    periods = matrix.columns.to_numpy()
+
+    w, b = get_weights(version)
+    prices = np.round(matrix.to_numpy(dtype=float) @ w + b, 2)
+
+    # vectorized datetime construction: day + (period - 1) hours + 2 days
+    days = matrix.index.get_level_values("date").to_numpy(dtype="datetime64[ns]")
+    offsets = (periods - 1).astype("timedelta64[h]") + np.timedelta64(2, "D")
+    times = days[:, None] + offsets[None, :]
+
+    price_tmr = pd.DataFrame({"time": times.ravel(), "price": prices.ravel()})
+    for key in keys[1:]:
+        price_tmr[key] = np.repeat(matrix.index.get_level_values(key), HOURS)
+    return price_tmr
@@ -16,6 +16,7 @@ import pandas as pd
 import pvlib as pv
 
 from src.common import interp_30min
+from src.common.timing import stage
 import src.config as config
 
 
@@ -109,12 +110,14 @@ def get_incident_power(
     times = pd.DatetimeIndex(
         forecast["time"]
     )  # define times to model sun position / insolation from
-    solar_pos = location.get_solarposition(
-        times
-    )  # calculate solar position at defined location on defined times
-    clearsky = location.get_clearsky(
-        times
-    )  # calculate insolation at location for date range
+    with stage("solar_position"):
+        solar_pos = location.get_solarposition(
+            times
+        )  # calculate solar position at defined location on defined times
+    with stage("clearsky"):
+        clearsky = location.get_clearsky(
+            times
+        )  # calculate insolation at location for date range
     ghi = clearsky.ghi  # calculate insolation incident on tilted solar panel
     flux_density = (
         ghi * np.sin(np.deg2rad(solar_pos["apparent_elevation"]) + np.deg2rad(tilt))
@@ -173,25 +176,46 @@ def get_generated_power(
     Returns:
         pd.Series: Predicted solar array output for each timestep of forecast in Watts.
     """
-    output_power = incident_power * total_efficiency  # Watts
-    output_power[
-        output_power > max_array_output
-    ] = max_array_output  # cap power output at max power output of array
+    output_power = cap_output_power(incident_power * total_efficiency, max_array_output)
+    generated_power = list(integrate_power(output_power))
+    generated_power.append(0.0)  # 23:00 - 00:00 interval needs a value for array shapes
+
+    return pd.DataFrame(data={"time": datetimes, "SolarPower": generated_power})
+
+
+def cap_output_power(output_power: pd.Series, max_array_output: float) -> pd.Series:
+    """Caps the output power (W) at the maximum output of the array."""
+    output_power[output_power > max_array_output] = max_array_output
+    return output_power
+
+
+def integrate_power(output_power, intervals=None) -> np.ndarray:
+    """Integrates the output power over the intervals between forecast steps.
+
+    Interval `i` only depends on the output power of steps `i` and `i + 1`,
+    so after a change of a few steps only their neighbouring intervals need
+    to be integrated again.
+
+    Args:
+        output_power (pd.Series): Output power at each of the 49 forecast steps.
+        intervals (np.ndarray): Indices of the intervals to integrate, all 48
+            by default.
+
+    Returns:
+        np.ndarray: Generated power of every requested interval.
+    """
     hours_since_23 = np.linspace(0, 24, 49)
     power_curve = interp1d(
         hours_since_23, output_power
     )  # interpolate power into function of time
-    generated_power = []
-    for i in range(len(hours_since_23) - 1):
-        lower_limit = hours_since_23[i]
-        upper_limit = hours_since_23[i + 1]
-        integral = quad(
-            power_curve, lower_limit, upper_limit
-        )  # integrate hourly intervals
-        generated_power.append(integral[0])  # Watts/hr
-    generated_power.append(0.0)  # 23:00 - 00:00 interval needs a value for array shapes
-
-    return pd.DataFrame(data={"time": datetimes, "SolarPower": generated_power})
+    if intervals is None:
+        intervals = range(len(hours_since_23) - 1)
+    with stage("quad"):
+        generated_power = [
+            quad(power_curve, hours_since_23[i], hours_since_23[i + 1])[0]  # Watts/hr
+            for i in intervals
+        ]
+    return np.array(generated_power, dtype=float)
 
 
 def predict_solar(
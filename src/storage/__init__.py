@@ -0,0 +1,3 @@
+from src.storage.storage import Storage
+from src.storage.mariadb_storage import MariaDBStorage
+from src.storage.sqlite_storage import SQLiteStorage
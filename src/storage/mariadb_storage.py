@@ -0,0 +1,26 @@
+from typing import List
+
+from src.storage.storage import Storage
+
+
+class MariaDBStorage(Storage):
+    """Storage backed by the MariaDB server shared with Node-RED."""
+
+    dialect = "mariadb"
+
+    @classmethod
+    def connect(cls, **kwargs) -> "MariaDBStorage":
+        """Connects with `mariadb.connect(**kwargs)`."""
+        # imported here so the SQLite backend works without the connector
+        import mariadb
+
+        return cls(mariadb.connect(**kwargs))
+
+    def upsert_query(self, table: str, columns: List[str]) -> str:
+        cols = ["time"] + columns
+        placeholders = ", ".join("?" for _ in cols)
+        updates = ", ".join(f"{col} = VALUES({col})" for col in columns)
+        return (
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders})"
+            f" ON DUPLICATE KEY UPDATE {updates}"
+        )
@@ -0,0 +1,39 @@
+import sqlite3
+from typing import List
+
+from src.storage.storage import Storage
+
+
+class SQLiteStorage(Storage):
+    """Embedded storage in a single SQLite file, no database server needed.
+
+    Timestamps are stored as `YYYY-MM-DD HH:MM:SS` text, which compares and
+    sorts like the MariaDB `DATETIME` columns.
+    """
+
+    dialect = "sqlite"
+    # files whose schema was created by this process
+    _initialized = set()
+
+    @classmethod
+    def connect(cls, path: str = ":memory:") -> "SQLiteStorage":
+        """Opens (and if needed creates) the database at `path`."""
+        conn = sqlite3.connect(path, timeout=30)
+        if path != ":memory:":
+            # readers do not block the writer, needed with several workers
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        storage = cls(conn)
+        if path == ":memory:" or path not in cls._initialized:
+            storage.create_schema()
+            cls._initialized.add(path)
+        return storage
+
+    def upsert_query(self, table: str, columns: List[str]) -> str:
+        cols = ["time"] + columns
+        placeholders = ", ".join("?" for _ in cols)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns)
+        return (
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders})"
+            f" ON CONFLICT(time) DO UPDATE SET {updates}"
+        )
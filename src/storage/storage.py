@@ -0,0 +1,173 @@
+"""Database access shared by the bidders, CO2 and prediction persistence.
+
+`Storage` wraps a DB-API connection (it forwards `cursor`, `commit`,
+`close`, ... so it can be used wherever a connection is expected) and adds
+the few dialect specific pieces: parameter formatting, upserts and the schema
+with its time indexes. Backends subclass it and implement its abstract
+methods, see `MariaDBStorage` and `SQLiteStorage`.
+
+Queries shared by the backends stick to what MariaDB and SQLite both
+understand: `CREATE TABLE IF NOT EXISTS`, `REPLACE INTO` and `?` parameters.
+"""
+import re
+import time
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import Any, Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+from src.common.metrics import DB_OPEN
+from src.common.timing import stage
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# `"{name}"` placeholders of the query templates used by the bidders
+TEMPLATE_PARAM = re.compile(r'"\{(\w+)\}"')
+
+TABLES = {
+    "energy_onsite": "time DATETIME NOT NULL, wind1 DOUBLE, wind2 DOUBLE, "
+    "wind3 DOUBLE, wind4 DOUBLE, windA DOUBLE, windB DOUBLE, solar DOUBLE, "
+    "hq_power DOUBLE, computing_center DOUBLE",
+    "carbon_dioxide": "time DATETIME NOT NULL, intensity DOUBLE",
+    "powerPrediction": "time DATETIME PRIMARY KEY, WindSpeed DOUBLE, "
+    "WindPower DOUBLE, SolarPower DOUBLE, HQPowerDemand DOUBLE, "
+    "HQTemperature DOUBLE",
+    "pricePrediction": "time DATETIME PRIMARY KEY, price DOUBLE",
+}
+
+# tables queried by time ranges without a primary key on time
+TIME_INDEXES = ["energy_onsite", "carbon_dioxide"]
+
+
+def to_param(value: Any) -> Any:
+    """Converts timestamps to strings both backends compare correctly."""
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return pd.Timestamp(value).strftime(TIME_FORMAT)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def bind_template(template: str, **kwargs) -> Tuple[str, tuple]:
+    """Turns a query template into a `?`-parameterised query and its params."""
+    params = [kwargs[name] for name in TEMPLATE_PARAM.findall(template)]
+    query = TEMPLATE_PARAM.sub("?", template).format(**kwargs)
+    return query, tuple(to_param(p) for p in params)
+
+
+class Storage(ABC):
+    """A database connection with backend specific helpers.
+
+    Attributes:
+        conn: The wrapped DB-API connection.
+        dialect (str): Name of the backend.
+    """
+
+    dialect = None
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed = False
+        DB_OPEN.inc(backend=self.dialect)
+
+    def __getattr__(self, name):
+        # behave like the wrapped connection (cursor, commit, rollback)
+        return getattr(self.conn, name)
+
+    @classmethod
+    @abstractmethod
+    def connect(cls, *args, **kwargs) -> "Storage":
+        """Opens a connection to the backend."""
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            DB_OPEN.dec(backend=self.dialect)
+        self.conn.close()
+
+    def create_schema(self) -> None:
+        """Creates the tables and time indexes if they do not exist yet."""
+        cursor = self.conn.cursor()
+        for table, columns in TABLES.items():
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+        for table in TIME_INDEXES:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_time ON {table} (time)"
+            )
+        self.conn.commit()
+
+    def read_sql(self, query: str, params: Sequence = ()) -> pd.DataFrame:
+        """Runs a `?`-parameterised query, the `time` column is parsed."""
+        params = tuple(to_param(p) for p in params)
+        with stage("read_sql"):
+            frame = pd.read_sql(query, self.conn, params=params)
+        if "time" in frame.columns:
+            frame["time"] = pd.to_datetime(frame.time)
+        return frame
+
+    def read_template(self, template: str, **kwargs) -> pd.DataFrame:
+        """Runs a query template with `"{name}"` placeholders as parameters.
+
+        The bidders declare their queries as e.g.
+        `... WHERE time > "{start_date}"`; the placeholders are bound as query
+        parameters instead of being formatted into the SQL.
+        """
+        return self.read_sql(*bind_template(template, **kwargs))
+
+    def run_statement(self, query: str, params: Sequence = ()) -> int:
+        """Runs a `?`-parameterised statement in its own transaction.
+
+        Returns:
+            int: Number of rows changed.
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, tuple(to_param(p) for p in params))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return cursor.rowcount
+
+    @abstractmethod
+    def upsert_query(self, table: str, columns: List[str]) -> str:
+        """Returns an insert-or-update statement keyed on `time`."""
+
+    def upsert(self, table: str, columns: List[str], rows: List[tuple]) -> int:
+        """Upserts `(time, *columns)` rows in a single transaction."""
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(self.upsert_query(table, columns), rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return len(rows)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of rows of every table of the schema."""
+        cursor = self.conn.cursor()
+        counts = {}
+        for table in TABLES:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+        return counts
+
+    def benchmark(
+        self, templates: Dict[str, str], repeat: int = 5, **kwargs
+    ) -> Dict[str, float]:
+        """Times query templates, to compare backends on the same data.
+
+        Returns:
+            Dict[str, float]: Best of `repeat` wall times (seconds) per query.
+        """
+        timings = {}
+        for name, template in templates.items():
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                self.read_template(template, **kwargs)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+        return timings
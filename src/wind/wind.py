@@ -13,14 +13,24 @@ import pandas as pd
 import pickle as p
 
 from src.common import interp_30min
+from src.common.model_registry import registry
 import src.config as config
 
-# load model
 root = os.path.dirname(__file__)
 
-wind_model = None
-with open(os.path.join(root, "wind_model.pkl"), "rb") as f:
-    wind_model = p.load(f)
+
+def load_wind_model(path: str):
+    """Loads the pickled turbine power curve."""
+    with open(path, "rb") as f:
+        return p.load(f)
+
+
+registry.register(
+    "wind", "wind_model.pkl", load_wind_model, os.path.join(root, "wind_model.pkl")
+)
+
+# load model
+wind_model = registry.get("wind")
 
 
 def get_wind_speed(forecast: pd.DataFrame) -> pd.DataFrame:
@@ -38,7 +48,9 @@ def get_wind_speed(forecast: pd.DataFrame) -> pd.DataFrame:
 
 
 def get_wind_power(
-    windspeed: Union[list, np.ndarray, pd.Series, float], height: Union[int, float] = 10
+    windspeed: Union[list, np.ndarray, pd.Series, float],
+    height: Union[int, float] = 10,
+    version: str = None,
 ) -> np.ndarray:
     """Converts windspeed to power.
      Converts a windspeed or set of windspeeds at a given height to power
@@ -48,6 +60,8 @@ def get_wind_power(
         windspeed (list, np.ndarray, float  : Windspeed or set of
                    pd.Series)                 windspeeds in m/s.
         height (int, float)                 : Rotor height (default is 10m)
+        version (str)                       : Wind model version (default is
+                                              the active version)
     Returns:
         np.ndarray object corresponding to the power generated (in kW).
     Raises:
@@ -69,14 +83,15 @@ def get_wind_power(
 
     windspeed *= correction
     windspeed[windspeed >= 30] = 30  # Truncate excess speeds
-    return n_turbines * wind_model(windspeed)
+    return n_turbines * registry.get("wind", version)(windspeed)
 
 
-def get_wind_prediction(forecast: pd.DataFrame) -> pd.DataFrame:
+def get_wind_prediction(forecast: pd.DataFrame, version: str = None) -> pd.DataFrame:
     """Wrapper function to return array of predicted wind power generation for forecast timesteps.
 
     Args:
         forecast (dict): Forcast dataframe.
+        version (str): Wind model version, defaults to the active version.
 
     Returns:
         wind_report (pd.DataFrame): The wind speed and predicted wind energy output of wind turbines over the
@@ -85,7 +100,7 @@ def get_wind_prediction(forecast: pd.DataFrame) -> pd.DataFrame:
     altitude = config.ALTITUDE
     forecast = interp_30min(forecast)
     wind_speed = get_wind_speed(forecast)
-    wind_power = get_wind_power(wind_speed["windSpeed10m"], altitude)
+    wind_power = get_wind_power(wind_speed["windSpeed10m"], altitude, version)
     wind_report = pd.DataFrame(
         data={
             "time": wind_speed["time"],
@@ -13,15 +13,19 @@ _os.chdir(_os.path.dirname(_os.path.abspath(__file__)))
 _os.environ["LOCATION_LAT"] = "52.1051"
 _os.environ["LOCATION_LON"] = "-3.6680"
 
-from src.bidding import slimjab_bidder as _slimjab_bidder, util as _util
+from src.bidding import slimjab_bidder as _slimjab_bidder
+from src.common import load_date_indexed_csv as _load_date_indexed_csv
 from src.onsite import onsite as _onsite
 from src.pricing import pricing as _pricing
 from src.solar import solar as _solar
 from src.wind import wind as _wind
 
 # Load our mocked/cached API data
-_dayahead = _pd.read_csv(Path(__file__).absolute().parent.parent / "agile_snails_coding_challenge/dummy_data/market_index.csv")
-_weather = _pd.read_csv(Path(__file__).absolute().parent.parent / "agile_snails_coding_challenge/dummy_data/weather_mock.csv")
+# The CSVs are parsed once into a date-partitioned cache next to them,
+# later imports memory-map the cache instead
+_dummy_data = Path(__file__).absolute().parent.parent / "agile_snails_coding_challenge/dummy_data"
+_dayahead = _load_date_indexed_csv(_dummy_data / "market_index.csv", "date")
+_weather = _load_date_indexed_csv(_dummy_data / "weather_mock.csv", "time")
 
 _os.chdir(_original_wd)
 
@@ -39,25 +43,23 @@ def get_price_and_quantity(date: _dt.date) -> _pd.DataFrame:
     result (pd.DataFrame): A Pandas DataFrame indexed by the ID of the hour,
     with columns for `volume` and `price`, where the latter is negative for
     importing and positive for exporting.
+
+    The function keeps no per-call global state, so several dates can be
+    evaluated concurrently, e.g. with `concurrent.futures.ThreadPoolExecutor`.
     """
     start = _dt.datetime.combine(date, _dt.time(23))
     times = [(start + _dt.timedelta(minutes=30) * i).isoformat() for i in range(48)]
-
-    # Patch get_output_template to use the date we specify rather than "today"
-    _slimjab_bidder.get_output_template = lambda: _util.get_output_template(
-        dt=(start + _dt.timedelta(days=1)).date()
-    )
+    applying_date = (start + _dt.timedelta(days=1)).date()
 
     # Get needed data from the mocked APIs
     # Previously managed by Node Red
-    forecast = _weather[
-        (_weather.time > start.isoformat())
-        & (_weather.time < (start + _dt.timedelta(hours=26)).isoformat())
-    ].copy()
+    end = start + _dt.timedelta(hours=26)
+    forecast = _weather.between(start.date(), end.date())
+    forecast = forecast[
+        (forecast.time > start.isoformat()) & (forecast.time < end.isoformat())
+    ].reset_index(drop=True)
     bare_prices = (
-        _dayahead[_dayahead.date == start.date().isoformat()]
-        .sort_values(by=["period"])
-        .price.to_numpy()
+        _dayahead.on(start.date()).sort_values(by=["period"]).price.to_numpy()
     )
 
     # Reformat imported data to match expected format for
@@ -97,9 +99,11 @@ def get_price_and_quantity(date: _dt.date) -> _pd.DataFrame:
     # Construct bid, previously done by call from Node Red into the server
     # If errors occur, give up as likely some mocked data are missing.
     try:
-        result = _slimjab_bidder.slimjab_bidder(price=price_df, power=power_df)
-    except:
-        raise ValueError("Unable to predict for {date}.")
+        result = _slimjab_bidder.slimjab_bidder(
+            price=price_df, power=power_df, applying_date=applying_date
+        )
+    except Exception:
+        raise ValueError(f"Unable to predict for {date}.")
 
     # Reformat bid for simplicity of output
     result["quantity"] = result.volume * (-1) ** (result.type == "BUY")
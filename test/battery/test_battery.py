@@ -0,0 +1,78 @@
+import itertools
+import time
+
+import numpy as np
+import pytest
+
+from src.battery import Battery, dispatch
+from src.battery.battery import settlement
+
+
+def brute_force(net_power, prices, battery, states, import_premium):
+    """Best value over every path of the state of charge grid."""
+    levels = np.linspace(0, battery.capacity, states)
+    initial = int(round(battery.initial_soc * (states - 1)))
+    loss = np.sqrt(battery.efficiency)
+    best = -np.inf
+    for path in itertools.product(range(states), repeat=len(net_power)):
+        if path[-1] < initial:
+            continue
+        stored = np.diff(levels[[initial, *path]])
+        if (np.abs(stored) > battery.power + 1e-9).any():
+            continue
+        charge = np.where(stored > 0, stored / loss, stored * loss)
+        value = settlement(net_power - charge, prices, import_premium).sum()
+        best = max(best, value)
+    return best
+
+
+def test_dispatch_matches_brute_force():
+    rng = np.random.default_rng(1)
+    battery = Battery(capacity=4.0, power=2.0, efficiency=0.81, initial_soc=0.25)
+    for _ in range(5):
+        net_power = rng.normal(0, 3, 5)
+        prices = rng.uniform(10, 100, 5)
+        schedule = dispatch(net_power, prices, battery, states=5, import_premium=20)
+        expected = brute_force(net_power, prices, battery, 5, 20)
+        assert schedule.value == pytest.approx(expected)
+        assert schedule.value == pytest.approx(
+            settlement(schedule.position, prices, 20).sum()
+        )
+
+
+def test_dispatch_shifts_energy_to_expensive_hours():
+    battery = Battery(capacity=100.0, power=50.0, efficiency=0.81, initial_soc=0.0)
+    prices = np.array([10.0, 10.0, 100.0, 100.0])
+    schedule = dispatch(np.zeros(4), prices, battery, states=101)
+
+    assert schedule.charge[:2] == pytest.approx([50 / 0.9, 50 / 0.9])
+    assert schedule.charge[2:] == pytest.approx([-45.0, -45.0])
+    assert schedule.soc == pytest.approx([50.0, 100.0, 50.0, 0.0])
+    assert schedule.value > 0
+
+    # not worth the losses at a flat price
+    flat = dispatch(np.zeros(4), np.full(4, 50.0), battery, states=101)
+    assert (flat.charge == 0).all()
+    assert flat.value == 0
+
+
+def test_dispatch_stores_surplus_with_import_premium():
+    battery = Battery(capacity=10.0, power=10.0, efficiency=1.0, initial_soc=0.0)
+    net_power = np.array([10.0, -10.0])
+    schedule = dispatch(net_power, np.full(2, 50.0), battery, 11, import_premium=5)
+
+    assert schedule.position == pytest.approx([0.0, 0.0])
+    assert schedule.value == pytest.approx(0.0)
+
+
+def test_dispatch_is_fast():
+    rng = np.random.default_rng(0)
+    battery = Battery(capacity=500.0, power=250.0)
+    net_power = rng.normal(0, 200, 48)
+    prices = rng.uniform(20, 200, 48)
+
+    start = time.perf_counter()
+    schedule = dispatch(net_power, prices, battery, states=1000, step=0.5)
+    assert time.perf_counter() - start < 1.0
+    assert len(schedule.charge) == 48
+    assert (schedule.soc >= 0).all() and (schedule.soc <= 500 + 1e-9).all()
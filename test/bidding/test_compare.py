@@ -0,0 +1,90 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from flask import Flask, g
+
+from src.bidding.compare import evaluate_bidders, side_by_side
+from src.bidding.util import BIDDERS, get_output_template, register_bidder
+from src.storage import SQLiteStorage
+
+PRICE_QUERY = 'SELECT * FROM pricePrediction WHERE time > "{start_date}"'
+ARGS = {"start_date": lambda: date(2022, 1, 1)}
+
+
+@pytest.fixture
+def bidders():
+    registered = dict(BIDDERS)
+
+    @register_bidder("flat", args=ARGS, data={"price": PRICE_QUERY})
+    def flat(price, **kwargs):
+        price["price"] = 0.0  # must not leak into the other bidders' inputs
+        df = get_output_template(kwargs["applying_date"])
+        df["volume"] = 1.0
+        return df
+
+    @register_bidder("follow", args=ARGS, data={"prices": PRICE_QUERY})
+    def follow(prices, **kwargs):
+        df = get_output_template(kwargs["applying_date"])
+        df["price"] = prices.price.to_numpy()[:24]
+        df["type"] = "SELL"
+        return df
+
+    @register_bidder("broken", args=ARGS, data={"price": PRICE_QUERY})
+    def broken(**kwargs):
+        return None
+
+    yield
+    BIDDERS.clear()
+    BIDDERS.update(registered)
+
+
+@pytest.fixture
+def storage():
+    storage = SQLiteStorage.connect(":memory:")
+    times = pd.date_range("2022-01-02", periods=48, freq="H")
+    storage.upsert(
+        "pricePrediction",
+        ["price"],
+        [(t.strftime("%Y-%m-%d %H:%M:%S"), float(i)) for i, t in enumerate(times)],
+    )
+    queries = []
+    storage.conn.set_trace_callback(queries.append)
+    with Flask(__name__).app_context():
+        g.get_conn = lambda: storage
+        yield storage, queries
+    storage.close()
+
+
+def test_evaluate_bidders_share_the_snapshot(bidders, storage):
+    _, queries = storage
+    applying_date = date(2022, 1, 4)
+    results, counts = evaluate_bidders(["flat", "follow", "broken"], applying_date)
+
+    assert counts == {"declared": 3, "executed": 1}
+    assert len([q for q in queries if q.startswith("SELECT")]) == 1
+    assert "error" in results["broken"]
+
+    follow = results["follow"]["orders"]
+    assert list(follow.price) == [float(i) for i in range(24)]
+    assert (follow.applying_date == applying_date.isoformat()).all()
+
+    table = side_by_side(
+        {name: r["orders"] for name, r in results.items() if "orders" in r}
+    )
+    assert len(table) == 24
+    assert list(table.columns) == [
+        "applying_date",
+        "hour_ID",
+        "flat.volume",
+        "flat.price",
+        "flat.type",
+        "follow.volume",
+        "follow.price",
+        "follow.type",
+    ]
+
+
+def test_evaluate_unknown_bidder(bidders, storage):
+    with pytest.raises(AssertionError):
+        evaluate_bidders(["nope"])
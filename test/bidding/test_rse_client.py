@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src.bidding.order_book import OrderBook
+from src.bidding.rse_client import RSEClient
+from src.bidding.rse_stub import RSEStub
+from src.bidding.submissions import SubmissionStore
+from src.bidding.util import get_output_template
+from src.storage import SQLiteStorage
+
+
+@pytest.fixture
+def orders():
+    return get_output_template()
+
+
+def test_submit_reuses_connection(orders):
+    with RSEStub(key="secret") as stub:
+        client = RSEClient(stub.addr, "secret")
+        results = [client.submit(orders, full=True) for _ in range(5)]
+        client.close()
+
+    assert all(r.status == "ok" and r.attempts == 1 for r in results)
+    assert results[0].response.json() == {"message": "orders set", "orders": 24}
+    assert len(stub.submissions) == 5
+    assert stub.submissions[0]["orders"][0]["applying_date"] == (
+        orders.applying_date[0]
+    )
+    # keep-alive: all requests over a single connection
+    assert stub.connections == 1
+
+
+def test_submit_retries_with_backoff(orders):
+    with RSEStub(fail_first=2) as stub:
+        client = RSEClient(stub.addr, None, retries=3, backoff=0.01)
+        result = client.submit(orders)
+        client.close()
+
+    assert result.status == "ok"
+    assert result.attempts == 3
+    assert stub.requests == 3
+    assert len(stub.submissions) == 1
+
+
+def test_submit_gives_up(orders):
+    with RSEStub(fail_first=10) as stub:
+        client = RSEClient(stub.addr, None, retries=1, backoff=0.01)
+        result = client.submit(orders)
+        client.close()
+
+    assert result.status == "failed"
+    assert result.attempts == 2
+    assert result.to_dict()["status_code"] == 503
+
+
+def test_submit_times_out(orders):
+    with RSEStub(latency=0.5) as stub:
+        client = RSEClient(stub.addr, None, timeout=(1, 0.05), retries=0)
+        result = client.submit(orders)
+        client.close()
+
+    assert result.status == "failed"
+    assert result.response is None
+    assert result.error
+
+
+def test_submit_async_reports_result(orders):
+    done = threading.Event()
+    reported = []
+
+    def callback(result):
+        reported.append(result)
+        done.set()
+
+    with RSEStub(latency=0.05) as stub:
+        client = RSEClient(stub.addr, None)
+        submission_id, future = client.submit_async(orders, callback=callback)
+        assert client.result(submission_id).status in ("pending", "ok")
+        result = future.result(timeout=5)
+        assert done.wait(5)
+        client.close()
+
+    assert result.status == "ok"
+    assert reported == [result]
+    assert client.result(submission_id) is result
+
+
+def test_submit_only_changed_hours(orders):
+    with RSEStub() as stub:
+        client = RSEClient(stub.addr, None)
+        first = client.submit(orders)
+        unchanged = client.submit(orders)
+        updated = orders.copy()
+        updated.loc[[3, 7], "volume"] = 1.5
+        changed = client.submit(updated)
+        client.close()
+
+    assert (first.orders, first.status) == (24, "ok")
+    assert unchanged.status == "skipped" and unchanged.attempts == 0
+    assert changed.orders == 2
+    assert [o["hour_ID"] for o in stub.submissions[-1]["orders"]] == [4, 8]
+    assert client.book.book(orders.applying_date[0])[3]["volume"] == 1.5
+
+    metrics = client.book.metrics
+    assert metrics["submissions"] == 2
+    assert metrics["submissions_skipped"] == 1
+    assert (metrics["hours_sent"], metrics["hours_skipped"]) == (26, 46)
+    assert metrics["bytes_sent"] == sum(
+        len(json.dumps(s).encode()) for s in stub.submissions
+    )
+
+
+def test_failed_submission_is_resent(orders):
+    with RSEStub(fail_first=1) as stub:
+        client = RSEClient(stub.addr, None, retries=0)
+        assert client.submit(orders).status == "failed"
+        assert client.submit(orders).orders == 24
+        client.close()
+
+    assert len(stub.submissions) == 1
+
+
+def test_workers_share_order_book(orders, tmp_path):
+    path = str(tmp_path / "books.sqlite3")
+
+    def connect():
+        return SQLiteStorage.connect(path)
+
+    with RSEStub() as stub:
+        first = RSEClient(stub.addr, None, book=OrderBook(connect=connect))
+        second = RSEClient(stub.addr, None, book=OrderBook(connect=connect))
+        assert first.submit(orders).orders == 24
+        updated = orders.copy()
+        updated.loc[3, "volume"] = 1.5
+        assert second.submit(updated).orders == 1
+        # the RSE holds the book of the second worker, hour 4 is sent again
+        resent = first.submit(orders)
+        assert resent.orders == 1
+        assert second.submit(orders).status == "skipped"
+        first.close()
+        second.close()
+
+    assert [o["hour_ID"] for o in stub.submissions[-1]["orders"]] == [4]
+    assert len(first.book.book(orders.applying_date[0])) == 24
+
+
+def test_unreadable_order_book_sends_all(orders):
+    def connect():
+        return None
+
+    with RSEStub() as stub:
+        client = RSEClient(stub.addr, None, book=OrderBook(connect=connect))
+        assert client.submit(orders).orders == 24
+        assert client.submit(orders).orders == 24
+        client.close()
+
+    assert len(stub.submissions) == 2
+
+
+def test_read_timeout_is_not_retried(orders):
+    with RSEStub(latency=0.3) as stub:
+        client = RSEClient(stub.addr, None, timeout=(1, 0.05), retries=2)
+        result = client.submit(orders)
+        time.sleep(0.5)
+        client.close()
+
+    # the RSE may have set the orders, they are not sent twice
+    assert result.status == "failed" and result.attempts == 1
+    assert stub.requests == 1
+
+
+def test_refused_connection_is_retried(orders):
+    client = RSEClient("127.0.0.1:9", None, retries=1, backoff=0.01)
+    result = client.submit(orders)
+    client.close()
+    assert result.status == "failed" and result.attempts == 2
+
+
+def test_status_of_other_worker(orders, tmp_path):
+    path = str(tmp_path / "submissions.sqlite3")
+
+    def connect():
+        return SQLiteStorage.connect(path)
+
+    with RSEStub() as stub:
+        first = RSEClient(stub.addr, None, submissions=SubmissionStore(connect))
+        second = RSEClient(stub.addr, None, submissions=SubmissionStore(connect))
+        submission_id, future = first.submit_async(orders)
+        future.result(timeout=5)
+        first.close()
+        second.close()
+
+    assert second.result(submission_id) is None
+    status = second.status(submission_id)
+    assert status["status"] == "ok" and status["orders"] == 24
+    assert status == first.status(submission_id)
+    assert second.status("unknown") is None
@@ -0,0 +1,92 @@
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.bidding.scenario_bidder import (
+    expected_values,
+    sample_scenarios,
+    scenario_bidder,
+)
+from src.bidding.util import check_outputs
+
+ARGS = dict(
+    n_scenarios=2000,
+    power_sd=0.25,
+    price_sd=8.0,
+    rho=-0.3,
+    ar=0.7,
+    imbalance_penalty=0.2,
+    seed=0,
+)
+
+
+def make_inputs(days: int, seed: int = 0):
+    times = pd.date_range("2022-01-03", periods=48 * days, freq="30min")
+    rng = np.random.default_rng(seed)
+    power = pd.DataFrame({"time": times, "NetPower": rng.normal(0, 100, len(times))})
+    price = pd.DataFrame(
+        {"time": times[::2], "price": 50 + rng.normal(0, 10, len(times) // 2)}
+    )
+    return power, price
+
+
+def test_sample_scenarios_correlations():
+    power, prices = sample_scenarios(
+        np.full(6, 100.0), np.full(6, 50.0), 20000, 0.1, 5.0, rho=-0.5, ar=0.8, seed=1
+    )
+    assert power.shape == prices.shape == (20000, 6)
+    assert np.allclose(power.std(axis=0), 10.0, rtol=0.05)
+    corr = np.corrcoef(power[:, 0], power[:, 1])[0, 1]
+    assert corr == pytest.approx(0.8, abs=0.03)
+    corr = np.corrcoef(power[:, 0], prices[:, 0])[0, 1]
+    assert corr == pytest.approx(-0.5, abs=0.03)
+
+
+def test_expected_values_match_scenario_loop():
+    rng = np.random.default_rng(2)
+    power = rng.normal(0, 50, (100, 3))
+    prices = rng.normal(50, 10, (100, 3))
+    positions = np.array([[-20.0, 0.0, 30.0]] * 3)
+    limits = np.array([[40.0, 50.0]] * 3)
+    values = expected_values(positions, limits, power, prices, 0.2)
+
+    h, p, l = 1, 2, 0
+    total = 0.0
+    for actual, price in zip(power[:, h], prices[:, h]):
+        position = positions[h, p]
+        accepted = price >= limits[h, l] if position > 0 else price <= limits[h, l]
+        contracted = position if accepted else 0.0
+        imbalance = actual - contracted
+        penalty = 0.8 if imbalance > 0 else 1.2
+        total += contracted * price + imbalance * price * penalty
+    assert values[h, p, l] == pytest.approx(total / 100)
+
+
+def test_scenario_bidder_follows_certain_predictions():
+    power, price = make_inputs(1)
+    args = dict(ARGS, power_sd=1e-9, price_sd=1e-9)
+    result = scenario_bidder(
+        power=power, price=price, **args, applying_date=date(2022, 1, 3)
+    )
+    check_outputs(result)
+
+    expected = power.NetPower.to_numpy().reshape(24, 2).mean(axis=1)
+    assert np.allclose(result.volume, np.abs(expected), rtol=1e-6)
+    assert (result.type == np.where(expected < 0, "BUY", "SELL")).all()
+
+
+def test_scenario_bidder_week_ahead_is_fast():
+    power, price = make_inputs(7)
+    start = time.perf_counter()
+    result = scenario_bidder(
+        power=power, price=price, **ARGS, applying_date=date(2022, 1, 3), days=7
+    )
+    elapsed = time.perf_counter() - start
+
+    check_outputs(result)
+    assert len(result) == 7 * 24
+    # the whole week is planned well within the daily bid deadline
+    assert elapsed < 30
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.battery import Battery
+from src.bidding.slimjab_bidder import slimjab_bidder
+from src.bidding.util import check_outputs, get_output_template
+
+
+def make_inputs(applying_date: date):
+    """Build power and price frames whose values encode the applying date."""
+    start = datetime.combine(applying_date, datetime.min.time())
+    offset = applying_date.toordinal() % 100
+    power = pd.DataFrame(
+        {
+            "time": [
+                (start + timedelta(minutes=30 * i)).isoformat() for i in range(48)
+            ],
+            "NetPower": [offset - 50.0] * 48,
+        }
+    )
+    price = pd.DataFrame(
+        {
+            "time": pd.date_range(start, periods=24, freq="H"),
+            "price": np.arange(24) + offset,
+        }
+    )
+    return power, price
+
+
+def test_slimjab_bidder_uses_applying_date():
+    applying_date = date(2022, 1, 3)
+    power, price = make_inputs(applying_date)
+    result = slimjab_bidder(power=power, price=price, applying_date=applying_date)
+
+    assert len(result) == 24
+    assert (result.applying_date == applying_date.isoformat()).all()
+    assert list(result.price) == list(price.price)
+
+
+def test_slimjab_bidder_concurrent_dates():
+    """Bidding for many dates in parallel must not mix up the dates."""
+    dates = [date(2022, 1, 1) + timedelta(days=i) for i in range(32)]
+
+    def run(applying_date):
+        power, price = make_inputs(applying_date)
+        return slimjab_bidder(power=power, price=price, applying_date=applying_date)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(run, dates))
+
+    for applying_date, result in zip(dates, results):
+        offset = applying_date.toordinal() % 100
+        assert len(result) == 24
+        assert (result.applying_date == applying_date.isoformat()).all()
+        assert np.allclose(result.volume, abs(offset - 50.0))
+        assert np.allclose(result.price, np.arange(24) + offset)
+        assert (result.type == ("BUY" if offset < 50 else "SELL")).all()
+
+
+def test_slimjab_bidder_multi_day_book():
+    first = date(2022, 1, 3)
+    frames = [make_inputs(first + timedelta(days=i)) for i in range(3)]
+    power = pd.concat([p for p, _ in frames], ignore_index=True)
+    price = pd.concat([p for _, p in frames], ignore_index=True)
+    # the third day has no price for the last hour
+    price = price.iloc[:-1]
+
+    result = slimjab_bidder(power=power, price=price, applying_date=first, days=3)
+    check_outputs(result)
+
+    assert len(result) == 3 * 24 - 1
+    assert list(result.applying_date.unique()) == [
+        (first + timedelta(days=i)).isoformat() for i in range(3)
+    ]
+    for i, (_, day_price) in enumerate(frames):
+        day = result[result.applying_date == (first + timedelta(days=i)).isoformat()]
+        assert list(day.price) == list(day_price.price)[: len(day)]
+
+
+def test_output_template_spans_days():
+    template = get_output_template(date(2022, 2, 27), days=3)
+
+    assert len(template) == 72
+    assert list(template.hour_ID[:25]) == list(range(1, 25)) + [1]
+    assert list(template.applying_date.unique()) == [
+        "2022-02-27",
+        "2022-02-28",
+        "2022-03-01",
+    ]
+    check_outputs(template)
+
+    duplicated = pd.concat([template, template.iloc[:1]])
+    with pytest.raises(AssertionError, match="duplicated"):
+        check_outputs(duplicated)
+    with pytest.raises(AssertionError, match="hour_ID"):
+        check_outputs(template.assign(hour_ID=template.hour_ID - 1))
+
+
+def test_slimjab_bidder_bids_after_battery_dispatch():
+    applying_date = date(2022, 1, 3)
+    power, price = make_inputs(applying_date)
+    battery = Battery(capacity=100.0, power=50.0, initial_soc=0.0)
+
+    plain = slimjab_bidder(power=power, price=price, applying_date=applying_date)
+    stored = slimjab_bidder(
+        power=power, price=price, applying_date=applying_date, battery=battery
+    )
+    check_outputs(stored)
+
+    position = np.where(stored.type == "SELL", 1, -1) * stored.volume
+    plain_position = np.where(plain.type == "SELL", 1, -1) * plain.volume
+    # prices rise over the day: buy more early, sell more late
+    assert position.iloc[0] < plain_position.iloc[0]
+    assert position.iloc[-1] > plain_position.iloc[-1]
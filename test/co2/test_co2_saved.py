@@ -0,0 +1,129 @@
+import importlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.co2.co2_saved import (
+    GENERATION_COLUMNS,
+    CO2SavedAccumulator,
+    backfill_co2_rollup,
+    co2_saved_range,
+    compute_co2_saved,
+    hour_rounder,
+    round_to_half_hour,
+)
+from src.common.rollup import Rollup
+from src.storage import SQLiteStorage
+
+# src.co2 exports a `co2_saved` function shadowing the module
+co2_saved_module = importlib.import_module("src.co2.co2_saved")
+
+
+def make_power(times) -> pd.DataFrame:
+    power = pd.DataFrame({"time": pd.to_datetime(times)})
+    for col in GENERATION_COLUMNS + ["hq_power", "computing_center"]:
+        power[col] = 1000.0
+    return power
+
+
+def make_co2(times, intensity=200.0) -> pd.DataFrame:
+    return pd.DataFrame({"time": pd.to_datetime(times), "intensity": intensity})
+
+
+def test_round_to_half_hour_matches_hour_rounder():
+    times = pd.Series(pd.date_range("2022-01-01 22:00", periods=24 * 60, freq="61s"))
+    expected = times.map(hour_rounder)
+    assert (round_to_half_hour(times) == expected).all()
+
+
+def test_compute_co2_saved():
+    power = make_power(["2022-01-01 10:01", "2022-01-01 10:29", "2022-01-01 10:50"])
+    co2 = make_co2(["2022-01-01 10:00", "2022-01-01 10:30", "2022-01-01 11:00"])
+    result = compute_co2_saved(co2, power)
+
+    assert list(result.time) == list(pd.to_datetime(co2.time))
+    # 7 kW for half an hour at 200 g/kWh
+    assert np.allclose(result.co2saved, 7000 * 0.5 / 1000 * 200 / 1000)
+
+
+def test_accumulator_counts_each_half_hour_once():
+    accumulator = CO2SavedAccumulator()
+    co2 = make_co2(["2022-01-01 10:00", "2022-01-01 10:30"])
+    power = make_power(["2022-01-01 09:59", "2022-01-01 10:31"])
+    per_half_hour = 7000 * 0.5 / 1000 * 200 / 1000
+
+    assert len(accumulator.update(co2, power)) == 2
+    assert accumulator.total == pytest.approx(2 * per_half_hour)
+    assert accumulator.last_time == pd.Timestamp("2022-01-01 10:30")
+
+    # rows already counted are ignored when they show up again
+    co2 = make_co2(["2022-01-01 10:30", "2022-01-01 11:00"])
+    power = make_power(["2022-01-01 10:31", "2022-01-01 11:02"])
+    assert len(accumulator.update(co2, power)) == 1
+    assert accumulator.total == pytest.approx(3 * per_half_hour)
+    assert accumulator.latest.time[0] == pd.Timestamp("2022-01-01 11:00")
+
+    # no new rows keeps the latest point and the total
+    assert accumulator.update(co2.iloc[:0], power.iloc[:0]).empty
+    assert accumulator.total == pytest.approx(3 * per_half_hour)
+    assert len(accumulator.latest) == 1
+
+
+@pytest.fixture
+def conn():
+    conn = SQLiteStorage.connect(":memory:")
+    times = pd.date_range("2022-01-01", "2022-01-11", freq="30min", inclusive="left")
+    make_co2(times).to_sql("carbon_dioxide", conn.conn, index=False, if_exists="append")
+    # two power samples per half hour, the later one wins
+    samples = times.union(times + pd.Timedelta("5min"))
+    power = make_power(samples)
+    power["solar"] = np.where(power.time.dt.hour.between(9, 16), 3000.0, 1000.0)
+    power.to_sql("energy_onsite", conn.conn, index=False, if_exists="append")
+    yield conn
+    conn.close()
+
+
+def test_co2_saved_range_raw_and_rollup_agree(conn, monkeypatch):
+    rollup = Rollup("co2_saved", ["co2saved"], "sum")
+    monkeypatch.setattr(co2_saved_module, "co2_rollup", rollup)
+    start, end = datetime(2022, 1, 1), datetime(2022, 1, 11)
+    assert backfill_co2_rollup(start, end, conn=conn) == 10 * 48
+
+    # the day-long range goes through the raw rows, the long one through rollups
+    raw = co2_saved_range(start, start + timedelta(days=1), "1H", conn=conn)
+    assert len(raw) == 24
+    rolled = co2_saved_range(start, end, "1H", conn=conn)
+    assert len(rolled) == 240
+    assert np.allclose(raw.co2saved, rolled.co2saved[:24])
+
+    daily = co2_saved_range(start, end, "1D", conn=conn)
+    assert len(daily) == 10
+    assert np.allclose(daily.co2saved, raw.co2saved.sum())
+    assert daily.co2saved.sum() == pytest.approx(rolled.co2saved.sum())
+
+    # calendar resolutions are served from the daily table
+    assert rollup.route("1M") == "daily"
+    monthly = co2_saved_range(start, end, "1M", conn=conn)
+    assert monthly.co2saved[0] == pytest.approx(daily.co2saved.sum())
+
+
+def test_running_total_kept_in_rollup(conn, monkeypatch):
+    rollup = Rollup("co2_saved", ["co2saved"], "sum")
+    monkeypatch.setattr(co2_saved_module, "co2_rollup", rollup)
+    start, middle, end = (
+        datetime(2022, 1, 1),
+        datetime(2022, 1, 6),
+        datetime(2022, 1, 11),
+    )
+    backfill_co2_rollup(start, middle, conn=conn)
+    half_days = co2_saved_range(start, middle, "1D", conn=conn).co2saved.sum()
+
+    # continues after the latest rolled up half hour, whichever worker asks
+    first = co2_saved_module.co2_saved_incremental(conn=conn)
+    second = co2_saved_module.co2_saved_incremental(conn=conn)
+    assert first.time[0] == pd.Timestamp("2022-01-10 23:30")
+    assert first.co2savedTotal[0] == pytest.approx(2 * half_days)
+    pd.testing.assert_frame_equal(second, first)
+    assert rollup.totals(conn)["co2saved"] == pytest.approx(2 * half_days)
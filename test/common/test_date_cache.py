@@ -0,0 +1,100 @@
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.common.date_cache import load_date_indexed_csv
+
+
+@pytest.fixture
+def weather_csv(tmp_path):
+    start = datetime(2022, 1, 1)
+    times = [(start + timedelta(hours=i)).isoformat() for i in range(24 * 5)]
+    frame = pd.DataFrame(
+        {
+            "time": times,
+            "screenTemperature": np.arange(len(times), dtype=float),
+            "significantWeatherCode": np.arange(len(times)) % 30,
+        }
+    )
+    # shuffle rows so the cache has to sort them
+    frame = frame.sample(frac=1, random_state=0)
+    path = tmp_path / "weather.csv"
+    frame.to_csv(path, index=False)
+    return path
+
+
+def test_lookup_by_date(weather_csv):
+    cache = load_date_indexed_csv(weather_csv, "time")
+
+    assert len(cache) == 24 * 5
+    assert list(cache.dates) == [f"2022-01-0{d}" for d in range(1, 6)]
+
+    day = cache.on(date(2022, 1, 3))
+    assert len(day) == 24
+    assert day.time.str.startswith("2022-01-03").all()
+    assert sorted(day.screenTemperature) == list(np.arange(48, 72, dtype=float))
+
+    days = cache.between(date(2022, 1, 2), "2022-01-04")
+    assert len(days) == 72
+    assert days.time.str[:10].is_monotonic_increasing
+
+    assert cache.on(date(2023, 1, 1)).empty
+    assert list(cache.on(date(2023, 1, 1)).columns) == list(day.columns)
+
+
+def test_cache_is_memory_mapped_and_reused(weather_csv):
+    load_date_indexed_csv(weather_csv, "time")
+    cache_dir = weather_csv.with_suffix(".cache")
+    assert (cache_dir / "meta.json").exists()
+    mtime = (cache_dir / "meta.json").stat().st_mtime_ns
+
+    cache = load_date_indexed_csv(weather_csv, "time")
+    assert (cache_dir / "meta.json").stat().st_mtime_ns == mtime
+    assert all(isinstance(col, np.memmap) for col in cache.columns.values())
+
+    # the cache stands in for the CSV when the source is gone
+    os.remove(weather_csv)
+    assert len(load_date_indexed_csv(weather_csv, "time").on("2022-01-05")) == 24
+
+
+def test_cache_rebuilt_when_source_changes(weather_csv):
+    load_date_indexed_csv(weather_csv, "time")
+    frame = pd.read_csv(weather_csv)
+    frame = frame[frame.time < "2022-01-03"]
+    frame.to_csv(weather_csv, index=False)
+    os.utime(weather_csv, ns=(0, 0))
+
+    cache = load_date_indexed_csv(weather_csv, "time")
+    assert list(cache.dates) == ["2022-01-01", "2022-01-02"]
+
+
+def test_rebuild_swaps_versions(weather_csv):
+    old = load_date_indexed_csv(weather_csv, "time")
+    cache_dir = weather_csv.with_suffix(".cache")
+    assert cache_dir.is_symlink()
+    first_version = cache_dir.resolve()
+
+    frame = pd.read_csv(weather_csv)
+    frame[frame.time < "2022-01-03"].to_csv(weather_csv, index=False)
+    os.utime(weather_csv, ns=(0, 0))
+    new = load_date_indexed_csv(weather_csv, "time")
+
+    assert cache_dir.resolve() != first_version
+    assert not first_version.exists()
+    # the old cache stays readable through its memory maps
+    assert len(old.on("2022-01-05")) == 24
+    assert len(new.on("2022-01-05")) == 0
+
+
+def test_missing_text_values_stay_missing(tmp_path):
+    path = tmp_path / "notes.csv"
+    pd.DataFrame(
+        {"time": ["2022-01-01T00:00", "2022-01-01T01:00"], "note": ["a", None]}
+    ).to_csv(path, index=False)
+
+    day = load_date_indexed_csv(path, "time").on("2022-01-01")
+    assert day.note[0] == "a"
+    assert pd.isna(day.note[1])
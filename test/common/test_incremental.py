@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+
+from src.common.incremental import IncrementalPredictor, changed_rows
+from src.common.met_office_utils import interp_30min
+from src.onsite.onsite import forecast_start, get_energy_demand
+from src.solar import get_solar_prediction
+from src.wind import get_wind_prediction
+
+
+def full_predictions(forecast):
+    start = forecast_start(interp_30min(forecast.copy()))
+    onsite = get_energy_demand(forecast.copy(), start_time=start)
+    return {
+        "wind": get_wind_prediction(forecast.copy()),
+        "solar": get_solar_prediction(forecast.copy()).reset_index(drop=True),
+        "onsite": pd.DataFrame(
+            {
+                "time": onsite["DateTime"],
+                "HQPowerDemand": onsite["Total demand"],
+                "HQTemperature": onsite["HQ Temperature"],
+            }
+        ),
+    }
+
+
+def assert_same_predictions(predictions, forecast):
+    for name, expected in full_predictions(forecast).items():
+        pd.testing.assert_frame_equal(predictions[name], expected, check_dtype=False)
+
+
+def test_changed_rows():
+    previous = pd.DataFrame({"a": [1.0, float("nan"), 3.0]}, index=["x", "y", "z"])
+    current = pd.DataFrame({"a": [float("nan"), 4.0, 3.0]}, index=["y", "z", "w"])
+    assert list(changed_rows(previous, current, ["a"])) == [False, True, True]
+    assert changed_rows(None, current, ["a"]).all()
+
+
+def test_incremental_predictions_match_full_predictions(timeseries):
+    forecast = timeseries.copy()
+    predictor = IncrementalPredictor()
+
+    predictions, work = predictor.predict(forecast)
+    assert_same_predictions(predictions, forecast)
+    assert work["saved"] == 0
+
+    # the first forecast hours are before the predicted day, 10 and 12 are in
+    updated = forecast.copy()
+    updated.loc[10, "screenTemperature"] += 3.0
+    updated.loc[12, "windSpeed10m"] += 2.0
+    predictions, work = predictor.predict(updated)
+    assert_same_predictions(predictions, updated)
+
+    # an hourly change moves the interpolated half hours around it
+    assert work["wind"]["computed"] == 3
+    assert work["onsite"]["computed"] == 3
+    assert work["solar_clearsky"]["computed"] == 0
+    assert work["solar_points"]["computed"] == 3
+    # and the solar intervals on both sides of them
+    assert work["solar_intervals"]["computed"] == 4
+    assert work["saved"] > 0.9
+
+    _, work = predictor.predict(updated)
+    assert work["saved"] == 1
+    assert predictor.metrics["requests"] == 3
+
+
+def test_sites_are_kept_apart(timeseries):
+    predictor = IncrementalPredictor(max_sites=1)
+    predictor.predict(timeseries.copy(), site="a")
+    _, work = predictor.predict(timeseries.copy(), site="b")
+    assert work["saved"] == 0
+    # `a` was dropped to keep a single site
+    _, work = predictor.predict(timeseries.copy(), site="a")
+    assert work["saved"] == 0
+
+    predictor.forget("a")
+    _, work = predictor.predict(timeseries.copy(), site="a")
+    assert work["saved"] == 0
+    _, work = predictor.predict(timeseries.copy(), site="a")
+    assert work["saved"] == pytest.approx(1)
+
+
+def test_sites_shared_through_directory(timeseries, tmp_path):
+    # two processes of the server
+    first = IncrementalPredictor(directory=str(tmp_path))
+    second = IncrementalPredictor(directory=str(tmp_path))
+
+    first.predict(timeseries.copy(), site="a")
+    predictions, work = second.predict(timeseries.copy(), site="a")
+    assert work["saved"] == pytest.approx(1)
+    assert_same_predictions(predictions, timeseries)
+
+    updated = timeseries.copy()
+    updated.loc[10, "screenTemperature"] += 3.0
+    _, work = first.predict(updated, site="a")
+    assert work["onsite"]["computed"] == 3
+
+    second.forget("a")
+    _, work = first.predict(updated, site="a")
+    assert work["saved"] == 0
+
+
+def test_onsite_starts_at_the_forecast(timeseries):
+    predictions, _ = IncrementalPredictor().predict(timeseries.copy())
+    first = interp_30min(timeseries.copy()).time.iloc[0]
+    assert predictions["onsite"].time.iloc[0] == first.replace("Z", ":00Z")
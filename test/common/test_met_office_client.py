@@ -0,0 +1,103 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.common.met_office_client import MetOfficeClient, site_key
+from src.common.met_office_stub import MetOfficeStub
+from src.common.met_office_utils import interp_30min
+from test.samples.sample_data import sample_time_series
+
+LAT, LON = 52.1051, -3.668
+
+
+def test_conditional_requests_over_one_connection(tmp_path):
+    with MetOfficeStub(sample_time_series, key="secret") as stub:
+        client = MetOfficeClient(stub.url, "secret", str(tmp_path))
+        first = client.fetch(LAT, LON)
+        second = client.fetch(LAT, LON)
+        stub.update(sample_time_series[1:])
+        third = client.fetch(LAT, LON)
+        client.close()
+
+    assert [r.status for r in (first, second, third)] == [
+        "fetched",
+        "not_modified",
+        "fetched",
+    ]
+    assert second.received == 0 and second.payload == first.payload
+    assert third.payload["features"][0]["properties"]["timeSeries"] == (
+        sample_time_series[1:]
+    )
+    assert first.payload["features"][0]["geometry"]["coordinates"][:2] == [LON, LAT]
+    assert stub.not_modified == 1
+    assert stub.connections == 1
+    assert client.metrics["fetched"] == 2 and client.metrics["not_modified"] == 1
+
+
+def test_cache_survives_restart_and_outage(tmp_path):
+    with MetOfficeStub(sample_time_series) as stub:
+        client = MetOfficeClient(stub.url, None, str(tmp_path))
+        client.fetch(LAT, LON)
+        client.close()
+
+        # validators are read back from disk, the payload is not sent again
+        client = MetOfficeClient(stub.url, None, str(tmp_path))
+        assert client.fetch(LAT, LON).status == "not_modified"
+        client.close()
+
+    size = client.cache.size(site_key(LAT, LON))
+    assert 0 < size < len(json.dumps(sample_time_series)) / 2
+
+    client = MetOfficeClient(stub.url, None, str(tmp_path), retries=1, backoff=0.01)
+    result = client.fetch(LAT, LON)
+    client.close()
+    assert result.status == "stale" and result.attempts == 2
+    assert result.payload["features"][0]["properties"]["timeSeries"] == (
+        sample_time_series
+    )
+    assert client.metrics["errors"] == 1
+
+
+def test_cache_shared_by_processes(tmp_path):
+    with MetOfficeStub(sample_time_series) as stub:
+        first = MetOfficeClient(stub.url, None, str(tmp_path))
+        second = MetOfficeClient(stub.url, None, str(tmp_path))
+        first.fetch(LAT, LON)
+        assert second.fetch(LAT, LON).status == "not_modified"
+
+        # the newer payload stored by the first is picked up from disk
+        stub.update(sample_time_series[1:])
+        assert first.fetch(LAT, LON).status == "fetched"
+        result = second.fetch(LAT, LON)
+        first.close()
+        second.close()
+
+    assert result.status == "not_modified"
+    assert result.payload["features"][0]["properties"]["timeSeries"] == (
+        sample_time_series[1:]
+    )
+    assert stub.not_modified == 2
+
+
+def test_forecast_matches_posted_forecast(tmp_path):
+    with MetOfficeStub(sample_time_series, fail_first=1) as stub:
+        client = MetOfficeClient(stub.url, None, None, backoff=0.01)
+        forecast = client.forecast(LAT, LON)
+        half_hourly = client.half_hourly(LAT, LON)
+        poll = client.poller(LAT, LON)
+        assert poll() is None
+        stub.update(sample_time_series[:-1])
+        assert len(poll()) == len(sample_time_series) - 1
+        client.close()
+
+    posted = pd.read_json(json.dumps(sample_time_series))
+    pd.testing.assert_frame_equal(forecast, posted)
+    pd.testing.assert_frame_equal(half_hourly, interp_30min(posted.copy()))
+
+
+def test_no_forecast_without_cache():
+    client = MetOfficeClient("http://127.0.0.1:9/hourly", None, None, retries=0)
+    with pytest.raises(AssertionError):
+        client.forecast(LAT, LON)
+    client.close()
@@ -0,0 +1,81 @@
+import multiprocessing
+
+import pytest
+
+from src.common.metrics import Metrics, merge, render
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = Metrics(str(tmp_path))
+    registry.counter("requests_total", "Requests.", ["route"])
+    registry.gauge("in_flight", "Requests being served.")
+    registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    return registry
+
+
+def test_render_text_format(registry):
+    requests = registry.families["requests_total"]
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    registry.families["latency_seconds"].observe(0.05)
+    registry.families["latency_seconds"].observe(0.5)
+    registry.families["latency_seconds"].observe(5)
+    with pytest.raises(AssertionError):
+        requests.inc(status=200)
+
+    text = render(registry.snapshot())
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/a\\"b"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_sum 5.55" in text
+    assert "latency_seconds_count 3" in text
+
+
+def _worker(registry, requests, done=None):
+    registry.families["requests_total"].inc(requests, route="/ok")
+    registry.families["in_flight"].inc()
+    registry.families["latency_seconds"].observe(0.5)
+    registry.flush()
+    if done is not None:
+        done.wait(10)
+
+
+def test_workers_are_aggregated(registry):
+    fork = multiprocessing.get_context("fork")
+    exited = fork.Process(target=_worker, args=(registry, 2))
+    exited.start()
+    exited.join()
+    done = fork.Event()
+    live = fork.Process(target=_worker, args=(registry, 3, done))
+    live.start()
+    try:
+        registry.families["requests_total"].inc(route="/ok")
+        registry.families["in_flight"].inc()
+        for _ in range(100):
+            families = registry.collect()
+            if families["requests_total"]["values"] == [[["/ok"], 6]]:
+                break
+            live.join(0.05)
+    finally:
+        done.set()
+        live.join()
+
+    # counters of exited workers are kept, their gauges dropped
+    assert families["requests_total"]["values"] == [[["/ok"], 6]]
+    assert families["in_flight"]["values"] == [[[], 2]]
+    assert families["latency_seconds"]["values"] == [[[], [[0, 2, 0], 1.0]]]
+
+
+def test_merge_max_gauge():
+    gauge = {"kind": "gauge", "help": "", "labels": [], "aggregate": "max"}
+    merged = merge(
+        [
+            ({"g": {**gauge, "values": [[[], 3]]}}, True),
+            ({"g": {**gauge, "values": [[[], 5]]}}, True),
+            ({"g": {**gauge, "values": [[[], 9]]}}, False),
+        ]
+    )
+    assert merged["g"]["values"] == [[[], 5]]
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from src.common.model_registry import BUILTIN, ModelRegistry
+
+
+def write_text(value):
+    def write(path):
+        with open(path, "w") as f:
+            f.write(value)
+
+    return write
+
+
+@pytest.fixture
+def registry(tmp_path):
+    builtin = tmp_path / "builtin.txt"
+    builtin.write_text("builtin")
+    loads = []
+
+    def loader(path):
+        loads.append(path)
+        with open(path) as f:
+            return f.read()
+
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    registry.register("model", "model.txt", loader, str(builtin))
+    registry.loads = loads
+    return registry
+
+
+def test_builtin_without_registry_dir(tmp_path):
+    builtin = tmp_path / "builtin.txt"
+    builtin.write_text("builtin")
+    registry = ModelRegistry()
+    registry.register("model", "model.txt", lambda p: open(p).read(), str(builtin))
+
+    assert registry.active_version("model") == BUILTIN
+    assert registry.versions("model") == [BUILTIN]
+    assert registry.get("model") == "builtin"
+
+
+def test_publish_activate_and_pin(registry):
+    assert registry.get("model") == "builtin"
+
+    registry.publish("model", "v1", write_text("one"))
+    registry.publish("model", "v2", write_text("two"), activate=True)
+
+    assert registry.versions("model") == [BUILTIN, "v1", "v2"]
+    assert registry.active_version("model") == "v2"
+    assert registry.get("model") == "two"
+    assert registry.get("model", "v1") == "one"
+    assert registry.get("model", BUILTIN) == "builtin"
+
+    registry.activate("model", "v1")
+    assert registry.get("model") == "one"
+
+    with pytest.raises(AssertionError):
+        registry.publish("model", "v1", write_text("again"))
+    with pytest.raises(AssertionError):
+        registry.activate("model", "v3")
+    with pytest.raises(AssertionError):
+        registry.get("model", "../v1")
+
+
+def test_models_are_cached_until_file_changes(registry):
+    registry.publish("model", "v1", write_text("one"), activate=True)
+    for _ in range(10):
+        registry.get("model")
+    assert len(registry.loads) == 1
+
+    # another worker switching versions is picked up on the next call
+    other_worker = ModelRegistry(registry.root)
+    other_worker.register("model", "model.txt", open, "unused")
+    other_worker.publish("model", "v2", write_text("two"), activate=True)
+    assert registry.get("model") == "two"
+    assert len(registry.loads) == 2
+
+    # replacing the file of a version invalidates the cached model
+    path = registry.path("model", "v2")
+    with open(path, "w") as f:
+        f.write("changed")
+    os.utime(path, ns=(0, 0))
+    assert registry.get("model", "v2") == "changed"
+
+
+def test_replaced_file_with_same_mtime_is_reloaded(registry, tmp_path):
+    registry.publish("model", "v1", write_text("one"), activate=True)
+    path = registry.path("model", "v1")
+    assert registry.get("model") == "one"
+
+    # same size and mtime, only the inode tells the files apart
+    replacement = tmp_path / "replacement.txt"
+    replacement.write_text("two")
+    stat = os.stat(path)
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(replacement, path)
+    assert registry.get("model") == "two"
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from src.common.prediction_store import save_power_predictions, save_price_predictions
+from src.storage import SQLiteStorage
+
+
+@pytest.fixture
+def conn():
+    storage = SQLiteStorage.connect(":memory:")
+    storage.execute(
+        "CREATE TRIGGER positive_price BEFORE INSERT ON pricePrediction"
+        " WHEN NEW.price < 0 BEGIN SELECT RAISE(ABORT, 'negative price'); END"
+    )
+    yield storage
+    storage.close()
+
+
+def test_power_predictions_are_merged_by_time(conn):
+    times = ["2022-03-19T00:00Z", "2022-03-19T00:30Z", "2022-03-19T01:00Z"]
+    wind = pd.DataFrame(
+        {"time": times, "WindSpeed": [1.0, 2.0, 3.0], "WindPower": 10.0}
+    )
+    solar = pd.DataFrame({"time": pd.to_datetime(times, utc=True), "SolarPower": 5.0})
+
+    assert save_power_predictions(conn, wind) == 3
+    assert save_power_predictions(conn, solar) == 3
+    # a newer prediction overwrites the previous one
+    save_power_predictions(conn, wind.assign(WindPower=20.0).iloc[:1])
+
+    rows = conn.execute(
+        "SELECT time, WindSpeed, WindPower, SolarPower, HQPowerDemand"
+        " FROM powerPrediction ORDER BY time"
+    ).fetchall()
+    assert rows == [
+        ("2022-03-19 00:00:00", 1.0, 20.0, 5.0, None),
+        ("2022-03-19 00:30:00", 2.0, 10.0, 5.0, None),
+        ("2022-03-19 01:00:00", 3.0, 10.0, 5.0, None),
+    ]
+
+
+def test_price_predictions(conn):
+    price = pd.DataFrame(
+        {"time": pd.date_range("2022-03-20", periods=24, freq="H"), "price": 100.0}
+    )
+    assert save_price_predictions(conn, price) == 24
+    assert conn.execute(
+        "SELECT COUNT(*), SUM(price) FROM pricePrediction"
+    ).fetchone() == (
+        24,
+        2400.0,
+    )
+
+
+def test_failed_upsert_rolls_back(conn):
+    price = pd.DataFrame(
+        {"time": ["2022-03-20 00:00", "2022-03-20 01:00"], "price": [1.0, -1.0]}
+    )
+    with pytest.raises(Exception):
+        save_price_predictions(conn, price)
+    assert conn.execute("SELECT COUNT(*) FROM pricePrediction").fetchone() == (0,)
@@ -0,0 +1,252 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.bidding.util import read_template, BIDDERS
+from src.common.metrics import CACHE_REQUESTS
+from src.common.prediction_store import (
+    MaterializedPredictions,
+    save_price_predictions,
+)
+from src.common.scheduler import (
+    PredictionScheduler,
+    SchedulerInbox,
+    SchedulerLock,
+    next_deadline,
+    set_scheduler,
+)
+from src.storage import SQLiteStorage
+from test.samples.sample_data import sample_time_series
+
+
+class Clock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def sample_prices():
+    return pd.DataFrame(
+        {
+            "date": "2022-03-17 00:00:00",
+            "period": np.arange(1, 25),
+            "price": np.linspace(50, 150, 24),
+        }
+    )
+
+
+@pytest.fixture
+def clock():
+    return Clock(datetime(2022, 3, 19, 8, 0))
+
+
+@pytest.fixture
+def scheduler(clock, tmp_path):
+    path = str(tmp_path / "predictions.sqlite3")
+    scheduler = PredictionScheduler(
+        connect=lambda: SQLiteStorage.connect(path),
+        deadline="11:00",
+        lead=timedelta(hours=1),
+        max_age=timedelta(hours=6),
+        clock=clock,
+    )
+    scheduler.path = path
+    yield scheduler
+    set_scheduler(None)
+
+
+def test_next_deadline():
+    assert next_deadline(datetime(2022, 1, 1, 10), "11:00") == datetime(2022, 1, 1, 11)
+    assert next_deadline(datetime(2022, 1, 1, 11), "11:00") == datetime(2022, 1, 2, 11)
+
+
+def test_covers_prediction_tables_only():
+    for name in ("slimjab-bidder", "scenario-bidder"):
+        for template in BIDDERS[name].data.values():
+            assert MaterializedPredictions.covers(template)
+    for template in BIDDERS["bogo-bidder"].data.values():
+        assert not MaterializedPredictions.covers(template)
+
+
+def test_run_materializes_and_persists(scheduler):
+    assert not scheduler.tick()
+    scheduler.submit_forecast(pd.read_json(json.dumps(sample_time_series)))
+    scheduler.submit_prices(sample_prices())
+    assert scheduler.tick()
+    assert scheduler.warm()
+
+    # the bidders' queries are served from memory while it is as recent
+    set_scheduler(scheduler)
+    storage = SQLiteStorage.connect(scheduler.path)
+    template = BIDDERS["slimjab-bidder"].data["power"]
+    assert scheduler.materialized.current(storage, template)
+    power = read_template(
+        template, start_date="2022-03-18", end_date="2022-03-21", storage=storage
+    )
+    assert len(power) == 48
+    assert power.time.min() == pd.Timestamp("2022-03-19 00:00")
+    price = read_template(
+        BIDDERS["slimjab-bidder"].data["price"],
+        start_date="2022-03-18",
+        end_date="2022-03-21",
+        storage=storage,
+    )
+    assert len(price) == 24
+
+    # wind, solar and onsite share the half hours of the forecast
+    assert storage.stats()["powerPrediction"] == 48
+    assert storage.stats()["pricePrediction"] == 24
+    storage.close()
+
+    metrics = scheduler.metrics
+    assert metrics["runs"] == 1
+    assert metrics["staleness_seconds"] == 0
+    assert metrics["pending_seconds"] is None
+
+
+def test_failed_update_keeps_inputs_pending(scheduler, monkeypatch):
+    scheduler.submit_prices(sample_prices())
+
+    def fail(*args, **kwargs):
+        raise MemoryError("no room")
+
+    monkeypatch.setattr(scheduler.materialized, "update", fail)
+    assert not scheduler.tick()
+    assert scheduler.metrics["failures"] == 1
+    assert scheduler.metrics["last_error"] == "no room"
+    assert scheduler.metrics["pending_seconds"] is not None
+
+    monkeypatch.undo()
+    assert scheduler.tick()
+    assert scheduler.metrics["runs"] == 1
+
+
+def test_deadline_metrics(scheduler, clock):
+    scheduler.submit_prices(sample_prices())
+    assert scheduler.tick()
+
+    # nothing new to predict ahead of the deadline
+    clock.now = datetime(2022, 3, 19, 10, 15)
+    assert not scheduler.tick()
+    assert scheduler.metrics["runs"] == 1
+
+    clock.now = datetime(2022, 3, 19, 11, 1)
+    scheduler.tick()
+    assert scheduler.metrics["deadlines_met"] == 1
+    assert scheduler.metrics["deadline_warnings"] == 0
+
+    # the same inputs are too old for the next deadline
+    clock.now = datetime(2022, 3, 20, 10, 15)
+    assert not scheduler.tick()
+    assert scheduler.metrics["deadline_warnings"] == 1
+    clock.now = datetime(2022, 3, 20, 11, 1)
+    scheduler.tick()
+    metrics = scheduler.metrics
+    assert metrics["deadline_misses"] == 1
+    assert metrics["staleness_seconds"] == (27 * 60 + 1) * 60
+    assert not metrics["warm"]
+
+
+def test_freshness_of_old_inputs(scheduler, clock):
+    # predicted now from prices received seven hours ago
+    scheduler.submit_prices(sample_prices(), received=clock.now - timedelta(hours=7))
+    assert scheduler.tick()
+    assert scheduler.metrics["staleness_seconds"] == 7 * 60 * 60
+    assert not scheduler.warm()
+
+    # inputs received before the deadline but never predicted
+    clock.now = datetime(2022, 3, 19, 11, 1)
+    scheduler.run = lambda: False
+    scheduler.submit_prices(sample_prices(), received=datetime(2022, 3, 19, 10, 50))
+    scheduler.tick()
+    assert scheduler.metrics["deadline_misses"] == 1
+
+
+def test_stale_predictions_fall_back_to_database(scheduler, clock):
+    scheduler.submit_prices(sample_prices())
+    scheduler.tick()
+    set_scheduler(scheduler)
+    clock.now += timedelta(hours=7)
+
+    storage = SQLiteStorage.connect(":memory:")
+    frame = read_template(
+        BIDDERS["slimjab-bidder"].data["price"],
+        start_date="2022-03-18",
+        end_date="2022-03-21",
+        storage=storage,
+    )
+    assert frame.empty
+
+
+def test_cache_counted_only_with_a_scheduler():
+    set_scheduler(None)
+    counts = dict(CACHE_REQUESTS.values)
+    storage = SQLiteStorage.connect(":memory:")
+    read_template(
+        BIDDERS["slimjab-bidder"].data["price"],
+        start_date="2022-03-18",
+        end_date="2022-03-21",
+        storage=storage,
+    )
+    assert CACHE_REQUESTS.values == counts
+
+
+def test_newer_database_predictions_are_read(scheduler):
+    scheduler.submit_prices(sample_prices())
+    scheduler.tick()
+    set_scheduler(scheduler)
+
+    # another process predicted a later day
+    storage = SQLiteStorage.connect(scheduler.path)
+    save_price_predictions(
+        storage,
+        pd.DataFrame(
+            {
+                "time": pd.date_range("2022-03-20", periods=48, freq="30min"),
+                "price": 100.0,
+            }
+        ),
+    )
+    template = BIDDERS["slimjab-bidder"].data["price"]
+    assert not scheduler.materialized.current(storage, template)
+    frame = read_template(
+        template, start_date="2022-03-18", end_date="2022-03-22", storage=storage
+    )
+    storage.close()
+    assert frame.time.max() == pd.Timestamp("2022-03-20 23:30")
+
+
+def test_one_scheduler_process(tmp_path):
+    lock = SchedulerLock(str(tmp_path))
+    other = SchedulerLock(str(tmp_path))
+    assert not other.held_elsewhere()
+    assert lock.acquire()
+    assert not other.acquire()
+    assert other.held_elsewhere() and not lock.held_elsewhere()
+    lock.release()
+    assert other.acquire()
+    other.release()
+
+
+def test_inputs_handed_over_through_inbox(scheduler, tmp_path, clock):
+    inbox = SchedulerInbox(str(tmp_path / "scheduler"))
+    scheduler.inbox = SchedulerInbox(inbox.directory)
+    received = clock.now - timedelta(minutes=5)
+    inbox.put("prices", sample_prices(), received)
+
+    assert scheduler.tick()
+    assert not scheduler.tick()
+    assert (
+        len(scheduler.materialized.storage.read_sql("SELECT * FROM pricePrediction"))
+        == 24
+    )
+    assert inbox.metrics()["runs"] == 1
+
+    inbox.request_run()
+    assert scheduler.tick()
+    assert inbox.metrics()["runs"] == 2
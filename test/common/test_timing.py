@@ -0,0 +1,89 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.common.met_office_utils import interp_30min
+from src.common.timing import (
+    BACKGROUND,
+    Timings,
+    TimingSwitch,
+    measure_overhead,
+    timings,
+)
+from test.samples.sample_data import sample_time_series
+
+
+@pytest.fixture
+def enabled():
+    timings.enabled = True
+    timings.reset()
+    yield timings
+    timings.enabled = False
+    timings.reset()
+
+
+def test_stages_add_up_per_request():
+    probe = Timings(enabled=True)
+    token = probe.begin("power.predict_all")
+    for _ in range(2):
+        with probe.stage("read_sql"):
+            pass
+    with probe.stage("quad"):
+        pass
+    request = probe.end(token)
+
+    assert list(request.stages) == ["read_sql", "quad"]
+    assert request.calls == {"read_sql": 2, "quad": 1}
+    header = request.header()
+    assert header.startswith("read_sql;dur=") and '"2 calls"' in header
+    assert header.split(", ")[-1].startswith("total;dur=")
+
+    snapshot = probe.snapshot()["power.predict_all"]
+    assert snapshot["read_sql"]["count"] == 2
+    assert snapshot["total"]["count"] == 1
+    assert snapshot["quad"]["buckets"][0] == [0.0005, 1]
+
+
+def test_switched_off_and_background(enabled):
+    frame = pd.read_json(json.dumps(sample_time_series))
+    interp_30min(frame.copy())
+    assert timings.snapshot()[BACKGROUND]["interp_30min"]["count"] == 1
+
+    timings.enabled = False
+    interp_30min(frame.copy())
+    with timings.stage("quad"):
+        pass
+    assert timings.snapshot()[BACKGROUND]["interp_30min"]["count"] == 1
+    assert "quad" not in timings.snapshot()[BACKGROUND]
+
+
+def test_overhead_when_off():
+    overhead = measure_overhead(20_000)
+    # an attribute check and a call, far below the stages it wraps (> 0.1 ms)
+    assert overhead["stage_ns"] < 5_000
+    assert overhead["timed_ns"] < 5_000
+
+
+def test_switch_shared_through_file(tmp_path):
+    path = str(tmp_path / "timing.json")
+    first, second = Timings(), Timings()
+    switch = TimingSwitch(first, path)
+    other = TimingSwitch(second, path, interval=0)
+
+    switch.set(True)
+    assert first.enabled and not second.enabled
+    other.poll()
+    assert second.enabled
+
+    # a reset keeps the counts and moves the baseline instead
+    for probe in (first, second):
+        with probe.stage("quad"):
+            pass
+    ((_, _, quad),) = first.histograms()
+    counted = {"background": {"quad": [quad.counts, quad.sum]}}
+    switch.set(False, baseline=counted)
+    other.poll()
+    assert not second.enabled
+    assert other.since_reset(counted) == {}
+    assert first.snapshot()["background"]["quad"]["count"] == 1
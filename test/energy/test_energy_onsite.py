@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.common.rollup import Rollup
+from src.energy import energy_onsite
+from src.energy.energy_onsite import (
+    ENERGY_COLUMNS,
+    compact_energy_onsite,
+    query_energy,
+    refresh_energy_rollup,
+)
+from src.storage import SQLiteStorage
+
+
+def make_rows(start, end) -> pd.DataFrame:
+    times = pd.date_range(start, end, freq="5min", inclusive="left")
+    rows = pd.DataFrame({"time": times.strftime("%Y-%m-%d %H:%M:%S")})
+    for i, col in enumerate(ENERGY_COLUMNS):
+        rows[col] = (np.arange(len(times)) % 12 + i).astype(float)
+    return rows
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    monkeypatch.setattr(
+        energy_onsite, "energy_rollup", Rollup("energy_onsite", ENERGY_COLUMNS)
+    )
+    conn = SQLiteStorage.connect(":memory:")
+    make_rows("2022-01-01", "2022-01-04").to_sql(
+        "energy_onsite", conn.conn, index=False, if_exists="append"
+    )
+    yield conn
+    conn.close()
+
+
+def count(conn, table) -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_refresh_builds_rollups(conn):
+    assert refresh_energy_rollup(conn) == 3 * 24 * 12
+    assert count(conn, "energy_onsite_30min") == 3 * 48
+    assert count(conn, "energy_onsite_hourly") == 3 * 24
+    assert count(conn, "energy_onsite_daily") == 3
+
+    hourly = query_energy(conn, datetime(2022, 1, 1), datetime(2022, 1, 2), "1H")
+    assert len(hourly) == 24
+    # samples 0..11 within every hour
+    assert np.allclose(hourly.wind1, 5.5)
+    assert np.allclose(hourly.computing_center, 5.5 + len(ENERGY_COLUMNS) - 1)
+
+
+def test_refresh_is_incremental(conn):
+    refresh_energy_rollup(conn)
+    make_rows("2022-01-04", "2022-01-04 02:00").to_sql(
+        "energy_onsite", conn.conn, index=False, if_exists="append"
+    )
+    # only the last bucket of the previous refresh and the new rows are read
+    assert refresh_energy_rollup(conn) == 6 + 24
+    assert count(conn, "energy_onsite_30min") == 3 * 48 + 4
+    assert count(conn, "energy_onsite_daily") == 4
+
+    raw = query_energy(conn, datetime(2022, 1, 1), datetime(2022, 1, 5), "20min")
+    rolled = query_energy(conn, datetime(2022, 1, 1), datetime(2022, 1, 5), "1D")
+    assert np.allclose(rolled.wind1, [5.5, 5.5, 5.5, 5.5])
+    assert raw.wind1.mean() == pytest.approx(5.5)
+
+
+def test_query_routing(conn):
+    rollup = energy_onsite.energy_rollup
+    assert rollup.route("30min") == "30min"
+    assert rollup.route("90min") == "30min"
+    assert rollup.route("3H") == "hourly"
+    assert rollup.route("1D") == "daily"
+    assert rollup.route("1W") == "daily"
+
+    raw = query_energy(conn, datetime(2022, 1, 1), datetime(2022, 1, 1, 1))
+    assert len(raw) == 12
+
+
+def test_compaction_keeps_rollups(conn):
+    deleted = compact_energy_onsite(conn, timedelta(days=1))
+    assert deleted == 3 * 24 * 12 - 6
+    assert count(conn, "energy_onsite") == 6
+
+    daily = query_energy(conn, datetime(2022, 1, 1), datetime(2022, 1, 4), "1D")
+    assert len(daily) == 3
+    assert np.allclose(daily.hq_power, 5.5 + ENERGY_COLUMNS.index("hq_power"))
+
+    # the incomplete last bucket is kept raw and refreshed later
+    assert refresh_energy_rollup(conn) == 6
+
+
+def test_refresh_limited_per_call(conn):
+    # a gap of a day in the data does not stall the limited refreshes
+    make_rows("2022-01-05", "2022-01-06").to_sql(
+        "energy_onsite", conn.conn, index=False, if_exists="append"
+    )
+    assert refresh_energy_rollup(conn, max_days=1) == 24 * 12
+    assert count(conn, "energy_onsite_daily") == 1
+    while refresh_energy_rollup(conn, max_days=1) > 6:
+        pass
+    assert count(conn, "energy_onsite_daily") == 4
+    assert count(conn, "energy_onsite_30min") == 4 * 48
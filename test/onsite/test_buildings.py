@@ -0,0 +1,81 @@
+import datetime
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.common.model_registry import registry
+from src.onsite.buildings import BuildingProfile, campus_demand
+from src.onsite.demand_model import FEATURES, TARGETS, DemandModel
+from src.onsite.onsite import get_energy_demand
+from test.samples.sample_data import sample_time_series
+
+
+@pytest.fixture
+def forecast():
+    return pd.read_json(json.dumps(sample_time_series))
+
+
+def test_hq_profile_matches_onsite_demand(forecast):
+    start = datetime.datetime(2022, 3, 21, 23, 0)
+    demand = campus_demand([BuildingProfile("HQ")], forecast, start, periods=96)
+    expected = get_energy_demand(forecast.copy(), start_time=start, periods=96)
+
+    frame = demand.frame("HQ")
+    pd.testing.assert_frame_equal(frame, expected[frame.columns], check_dtype=False)
+
+
+def test_buildings_share_forecast(forecast):
+    start = datetime.datetime(2022, 3, 21, 23, 0)
+    profiles = [
+        BuildingProfile("HQ"),
+        BuildingProfile("Lab", data_centre=0.0, heating_max=30.0),
+        BuildingProfile("Store", office_equipment=0.0, heating_per_degree=0.0),
+    ]
+    demand = campus_demand(profiles, forecast, start, periods=48 * 3)
+
+    assert demand.total.shape == (3, 48 * 3)
+    assert (demand.components["Data Centre"][1] == 0).all()
+    assert demand.components["Heating"][1].max() <= 30.0
+    assert (demand.components["Heating"][2] == 0).all()
+
+    summary = demand.summary().set_index("building")
+    assert list(summary.index) == ["HQ", "Lab", "Store"]
+    assert summary.energy["HQ"] == pytest.approx(demand.total[0].sum() / 2)
+    assert summary.peak_demand["Store"] == pytest.approx(demand.total[2].max())
+    assert summary.peak_time["HQ"].endswith("Z")
+
+
+def test_profile_validation():
+    assert BuildingProfile.from_dict({"name": "Lab", "data_centre": 0}).data_centre == 0
+    with pytest.raises(AssertionError):
+        BuildingProfile.from_dict({"name": "Lab", "pool": 5})
+    with pytest.raises(AssertionError):
+        BuildingProfile("Lab", heating_max=-1)
+    with pytest.raises(AssertionError):
+        campus_demand([BuildingProfile("A"), BuildingProfile("A")], None, None)
+
+
+def test_hq_profile_follows_active_demand_model(forecast, monkeypatch, tmp_path):
+    coef = DemandModel.rule_based().coef.copy()
+    coef[FEATURES.index("occupied"), TARGETS.index("hq_power")] = 45.0
+    coef[FEATURES.index("heating"), TARGETS.index("hq_power")] = 1.5
+    coef[FEATURES.index("hour_cos"), TARGETS.index("computing_center")] = -12.0
+    monkeypatch.setattr(registry, "root", str(tmp_path))
+    registry.publish("demand", "fitted", DemandModel(coef).save, activate=True)
+
+    start = datetime.datetime(2022, 3, 21, 23, 0)
+    demand = campus_demand(
+        [BuildingProfile("HQ"), BuildingProfile("Annex", data_centre=100.0)],
+        forecast,
+        start,
+        periods=96,
+    )
+    expected = get_energy_demand(forecast.copy(), start_time=start, periods=96)
+
+    frame = demand.frame("HQ")
+    pd.testing.assert_frame_equal(frame, expected[frame.columns], check_dtype=False)
+    assert demand.components["Data Centre"][1] == pytest.approx(
+        expected["Data Centre"] / 2
+    )
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.common.rollup import TIME_FORMAT
+from src.energy.energy_onsite import energy_rollup
+from src.onsite.demand_model import (
+    FEATURES,
+    TARGETS,
+    DemandModel,
+    fit_demand_model,
+    read_history,
+)
+from src.onsite.onsite import get_data_centre_demand
+from src.onsite.utils import get_active_office_mask, half_hour_range, heating_energy
+from src.storage import SQLiteStorage
+
+
+def synthetic_history(coef, start="2021-01-01", days=730, seed=0):
+    """Half-hourly loads in W generated by `coef` plus noise."""
+    rng = np.random.default_rng(seed)
+    times = half_hour_range(np.datetime64(start, "m"), days * 48)
+    day = np.arange(len(times)) / 48
+    temperatures = 8 - 10 * np.cos(2 * np.pi * day / 365) + rng.normal(0, 4, len(day))
+    demand = DemandModel(coef).predict(times, temperatures)
+    hq = demand["heating"] + demand["hq_other"]
+    noise = rng.normal(0, 1, (2, len(times)))
+    return pd.DataFrame(
+        {
+            "time": times,
+            "hq_power": (hq + noise[0]) * 1000,
+            "computing_center": (demand["data_centre"] + noise[1]) * 1000,
+            "HQTemperature": temperatures,
+        }
+    )
+
+
+def test_rule_based_matches_hand_written_model():
+    start = np.datetime64("2022-03-21T00:00", "m")
+    temperatures = np.linspace(-15, 25, 48 * 7)
+    times = half_hour_range(start, len(temperatures))
+    mask = get_active_office_mask(start, len(temperatures))
+
+    demand = DemandModel.rule_based().predict(times, temperatures)
+    assert demand["heating"] == pytest.approx(
+        np.where(mask, heating_energy(temperatures), 0.0)
+    )
+    assert demand["hq_other"] == pytest.approx(np.where(mask, 30.0, 0.0))
+    assert demand["data_centre"] == pytest.approx(
+        get_data_centre_demand(len(temperatures))
+    )
+
+
+def test_fit_recovers_coefficients():
+    coef = DemandModel.rule_based().coef.copy()
+    coef[FEATURES.index("heating"), TARGETS.index("hq_power")] = 1.5
+    coef[FEATURES.index("hour_cos"), TARGETS.index("computing_center")] = -12.0
+    history = synthetic_history(coef)
+
+    model, rows = fit_demand_model([history])
+    assert rows == len(history)
+    assert model.coef == pytest.approx(coef, abs=0.1)
+
+    # accumulating monthly chunks gives the same fit
+    chunks = [chunk for _, chunk in history.groupby(history.time.dt.to_period("M"))]
+    chunked, _ = fit_demand_model(chunks)
+    assert chunked.coef == pytest.approx(model.coef)
+
+
+def test_fit_skips_missing_rows():
+    history = synthetic_history(DemandModel.rule_based().coef, days=60)
+    history.loc[::7, "HQTemperature"] = np.nan
+    history.loc[::11, "hq_power"] = np.nan
+    model, rows = fit_demand_model([history])
+    assert rows == len(history.dropna())
+    assert np.isfinite(model.coef).all()
+
+
+def test_read_history_joins_loads_and_temperatures():
+    storage = SQLiteStorage.connect(":memory:")
+    energy_rollup.create_tables(storage)
+    history = synthetic_history(DemandModel.rule_based().coef, days=40)
+    times = history.time.dt.strftime(TIME_FORMAT)
+    storage.upsert(
+        "energy_onsite_30min",
+        ["hq_power", "computing_center"],
+        list(zip(times, history.hq_power, history.computing_center)),
+    )
+    # no temperature for the first day
+    storage.upsert(
+        "powerPrediction",
+        ["HQTemperature"],
+        list(zip(times[48:], history.HQTemperature[48:])),
+    )
+
+    chunks = list(read_history(storage, history.time[0], history.time.iloc[-1]))
+    assert len(chunks) == 2
+    assert sum(len(chunk) for chunk in chunks) == len(history) - 48 - 1
+    model, _ = fit_demand_model(chunks)
+    hq = TARGETS.index("hq_power")
+    assert model.coef[FEATURES.index("occupied"), hq] == pytest.approx(30, abs=1)
+    storage.close()
@@ -0,0 +1,105 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.onsite.occupancy import (
+    OccupancyCalendar,
+    bank_holidays,
+    occupancy,
+    parse_closures,
+)
+from src.onsite.utils import half_hour_range
+
+
+@pytest.mark.parametrize(
+    "year, holidays",
+    [
+        (
+            2020,
+            ["01-01", "04-10", "04-13", "05-08", "05-25", "08-31", "12-25", "12-28"],
+        ),
+        (
+            2021,
+            ["01-01", "04-02", "04-05", "05-03", "05-31", "08-30", "12-27", "12-28"],
+        ),
+        (
+            2022,
+            [
+                "01-03",
+                "04-15",
+                "04-18",
+                "05-02",
+                "06-02",
+                "06-03",
+                "08-29",
+                "09-19",
+                "12-26",
+                "12-27",
+            ],
+        ),
+        (
+            2023,
+            [
+                "01-02",
+                "04-07",
+                "04-10",
+                "05-01",
+                "05-08",
+                "05-29",
+                "08-28",
+                "12-25",
+                "12-26",
+            ],
+        ),
+    ],
+)
+def test_bank_holidays(year, holidays):
+    expected = [datetime.date.fromisoformat(f"{year}-{day}") for day in holidays]
+    assert bank_holidays(year) == expected
+
+
+@pytest.fixture(scope="module")
+def calendar():
+    closures = parse_closures("2022-12-28/2022-12-30, 2023-01-03")
+    return OccupancyCalendar(2021, 2023, closures)
+
+
+def test_mask_slices_the_bitset(calendar):
+    # Friday before the Christmas bank holidays, over two weeks
+    start = datetime.datetime(2022, 12, 23, 23, 0)
+    mask = calendar.mask(start, 14 * 48)
+
+    expected = occupancy("2022-12-23", "2023-01-07", calendar.closures)[46 : 46 + 672]
+    assert np.array_equal(mask, expected)
+    # only Jan 4-6 are working days, 26-27 Dec and Jan 2 are bank holidays
+    occupied_days = np.unique(
+        half_hour_range(start, 14 * 48)[mask].astype("datetime64[D]")
+    )
+    assert occupied_days.astype(str).tolist() == [
+        "2023-01-04",
+        "2023-01-05",
+        "2023-01-06",
+    ]
+    assert np.array_equal(calendar.lookup(half_hour_range(start, 14 * 48)), mask)
+
+
+def test_mask_outside_the_span(calendar):
+    start = datetime.datetime(2023, 12, 31, 0, 0)
+    mask = calendar.mask(start, 4 * 48)
+
+    assert np.array_equal(mask, occupancy("2023-12-31", "2024-01-03")[:192])
+    assert np.array_equal(calendar.lookup(half_hour_range(start, 192)), mask)
+    # New Year's Day is a bank holiday
+    assert mask.reshape(4, 48).sum(axis=1).tolist() == [0, 0, 17, 17]
+
+
+def test_mask_off_the_half_hour_grid(calendar):
+    # 8:15 to 16:45 are occupied from 9:15, as without the calendar
+    start = datetime.datetime(2022, 1, 4, 8, 15)
+    mask = calendar.mask(start)
+    times = half_hour_range(start, 48)
+    minutes = (times - times.astype("datetime64[D]")).astype(int)
+    assert np.array_equal(mask, (minutes >= 9 * 60) & (minutes <= 17 * 60))
+    assert mask.sum() == 16
+    assert np.array_equal(calendar.lookup(times), mask)
@@ -7,6 +7,9 @@ Todo:
 
 """
 
+import datetime
+import json
+
 import pytest
 
 import pandas as pd
@@ -18,6 +21,7 @@ from src.onsite.onsite import (
     get_office_equipment_demand,
     get_lighting_and_other_demand,
 )
+from test.samples.sample_data import sample_time_series
 
 
 def test_get_data_centre_demand() -> None:
@@ -129,3 +133,44 @@ def test_get_lighting_and_other_demand(active_office_mask):
     assert output.shape == (48,)
 
     assert sum(output) == 320
+
+
+def test_get_energy_demand_default_start() -> None:
+    """Without a start time the demand starts at the forecast."""
+    timeseries = pd.read_json(json.dumps(sample_time_series))
+
+    # the next 24 hours of the interpolated forecast
+    output = get_energy_demand(timeseries.copy())
+    assert output["DateTime"][0] == "2022-03-19T00:00:00Z"
+    assert output["DateTime"].iloc[-1] == "2022-03-19T23:30:00Z"
+
+    # any horizon, from the first forecast hour
+    output = get_energy_demand(timeseries.copy(), periods=4)
+    assert output["DateTime"][0] == "2022-03-18T19:00:00Z"
+
+
+def test_get_energy_demand_any_horizon() -> None:
+    """A full year of half hours, temperatures interpolated from the forecast."""
+    # fresh copy, interp_30min modifies the shared fixture in place
+    timeseries = pd.read_json(json.dumps(sample_time_series))
+    start = datetime.datetime(2022, 3, 18, 23, 0)
+    output = get_energy_demand(timeseries.copy(), start_time=start, periods=365 * 48)
+
+    assert output.shape[0] == 365 * 48
+    assert output["DateTime"][0] == "2022-03-18T23:00:00Z"
+    assert output["DateTime"].iloc[-1] == "2023-03-18T22:30:00Z"
+    # 2022-03-18 23:00 lies between the 23:00 forecast hours
+    forecast = timeseries.set_index("time").screenTemperature
+    assert output["HQ Temperature"][0] == forecast["2022-03-18T23:00Z"]
+    assert output["HQ Temperature"][1] == pytest.approx(
+        (forecast["2022-03-18T23:00Z"] + forecast["2022-03-19T00:00Z"]) / 2
+    )
+    # 260 weekdays minus 10 bank holidays, of 17 occupied half hours
+    assert output["Office Equipment"].sum() == pytest.approx(250 * 17 * 10)
+    assert (
+        output["Total demand"]
+        == output["Heating"]
+        + output["Data Centre"]
+        + output["Office Equipment"]
+        + output["LightingOther"]
+    ).all()
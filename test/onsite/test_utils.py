@@ -8,10 +8,14 @@ Todo:
 import datetime
 from typing import List
 
+import numpy as np
 import pytest
 from src.onsite.utils import (
     get_active_office_mask,
     get_next_24_hour_datetime,
+    half_hour_range,
+    heating_energy,
+    office_mask,
     temp_to_energy,
 )
 
@@ -46,6 +50,7 @@ def test_temp_to_energy(temp, expect):
         (datetime.datetime(2021, 5, 14), 17),  # Friday
         (datetime.datetime(2021, 5, 15), 0),  # Saturday
         (datetime.datetime(2021, 5, 16), 0),  # Sunday
+        (datetime.datetime(2021, 5, 10, 8, 15), 16),  # off the half hour grid
     ],
 )
 def test_get_active_office_mask(date: datetime.datetime, working_hours: int):
@@ -158,3 +163,21 @@ def test_get_next_24_hour_datetime(
 
     for i, value in enumerate(output):
         assert value == times[i]
+
+
+def test_heating_energy_matches_temp_to_energy():
+    temps = np.linspace(-20, 25, 91)
+    expected = [temp_to_energy(t) for t in temps]
+    assert np.allclose(heating_energy(temps), expected)
+
+
+def test_office_mask_any_horizon():
+    # Friday 2021-05-14 00:00 over four days
+    times = half_hour_range(datetime.datetime(2021, 5, 14), 4 * 48)
+    mask = office_mask(times)
+
+    assert mask.dtype == bool and mask.shape == (192,)
+    assert mask.reshape(4, 48).sum(axis=1).tolist() == [17, 0, 0, 17]
+    assert get_active_office_mask(datetime.datetime(2021, 5, 14), 4 * 48) == (
+        mask.tolist()
+    )
@@ -0,0 +1,140 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.common.model_registry import registry
+from src.pricing import pricing
+from src.pricing.online import OnlinePriceModel, update_price_model
+import src.config as config
+
+
+def make_days(n_days: int, w: np.ndarray, b: np.ndarray, seed: int = 0):
+    """Prices following `day[d + 2] = day[d] @ w + b` plus noise."""
+    rng = np.random.default_rng(seed)
+    days = [rng.uniform(50, 150, 24), rng.uniform(50, 150, 24)]
+    for _ in range(n_days - 2):
+        days.append(days[-2] @ w + b + rng.normal(0, 20, 24))
+    return days
+
+
+def to_market_index(days, first_day=date(2022, 1, 1)) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                "date": (first_day + timedelta(days=i)).strftime("%Y-%m-%d %H:%M:%S"),
+                "period": period + 1,
+                "price": price,
+            }
+            for i, prices in enumerate(days)
+            for period, price in enumerate(prices)
+        ]
+    )
+
+
+@pytest.fixture
+def true_model():
+    rng = np.random.default_rng(1)
+    return np.eye(24) * 0.6 + rng.normal(0, 0.01, (24, 24)), rng.uniform(10, 30, 24)
+
+
+def test_rls_matches_least_squares(true_model):
+    w, b = true_model
+    model = OnlinePriceModel(np.zeros((24, 24)), np.zeros(24), delta=1e6)
+    days = make_days(200, w, b)
+    updates = sum(
+        model.observe_day(date(2022, 1, 1) + timedelta(days=i), prices)
+        for i, prices in enumerate(days)
+    )
+
+    assert updates == 198
+    assert model.P.shape == (25, 25)
+    assert len(model.history) <= 4
+
+    X = np.hstack([np.array(days[:-2]), np.ones((198, 1))])
+    theta, *_ = np.linalg.lstsq(X, np.array(days[2:]), rcond=None)
+    assert np.allclose(model.w, theta[:-1], atol=1e-3)
+    assert np.allclose(model.b, theta[-1], atol=1e-1)
+
+
+def test_out_of_order_days(true_model):
+    w, b = true_model
+    model = OnlinePriceModel(np.zeros((24, 24)), np.zeros(24))
+    days = make_days(3, w, b)
+    assert model.observe_day(date(2022, 1, 3), days[2]) == 0
+    assert model.observe_day(date(2022, 1, 1), days[0]) == 1
+
+
+def test_update_price_model_hot_swaps_weights(tmp_path, monkeypatch, true_model):
+    monkeypatch.setattr(registry, "root", str(tmp_path))
+    initial_w, _ = pricing.get_weights()
+
+    state_path = str(tmp_path / "state.npz")
+    days = make_days(10, *true_model)
+    assert update_price_model(to_market_index(days[:5]), state_path) == 3
+    first_version = registry.active_version("pricing")
+    assert update_price_model(to_market_index(days[5:], date(2022, 1, 6)), state_path) == 5
+    assert registry.active_version("pricing") != first_version
+
+    # the learner continues from the persisted state instead of refitting
+    model = OnlinePriceModel.load(state_path)
+    assert sorted(model.history)[-1] == date(2022, 1, 10)
+
+    w, b = pricing.get_weights()
+    assert not np.allclose(w, initial_w)
+    assert np.allclose(w, model.w) and np.allclose(b, model.b)
+
+    # older versions stay available for pinning
+    assert np.allclose(pricing.get_weights("builtin")[0], initial_w)
+    assert not np.allclose(pricing.get_weights(first_version)[0], w)
+
+
+def test_days_seen_before_are_skipped(true_model):
+    w, b = true_model
+    model = OnlinePriceModel(np.zeros((24, 24)), np.zeros(24))
+    days = make_days(8, w, b)
+    first = date(2022, 1, 1)
+    for i, prices in enumerate(days):
+        model.observe_day(first + timedelta(days=i), prices)
+    theta = model.theta.copy()
+
+    # re-posted days, still in the history or already dropped from it
+    assert model.observe_day(first + timedelta(days=7), days[7]) == 0
+    assert model.observe_day(first + timedelta(days=1), days[1]) == 0
+    assert np.array_equal(model.theta, theta)
+
+
+def test_update_needs_writable_location(tmp_path, monkeypatch, true_model):
+    monkeypatch.setattr(registry, "root", None)
+    monkeypatch.setattr(config, "PRICE_MODEL_STATE", None)
+    monkeypatch.setattr(config, "PRICE_MODEL_WEIGHTS", None)
+    days = to_market_index(make_days(5, *true_model))
+    with pytest.raises(AssertionError):
+        update_price_model(days)
+    with pytest.raises(AssertionError):
+        update_price_model(days, str(tmp_path / "state.npz"))
+    assert not (tmp_path / "state.npz").exists()
+
+
+def test_state_kept_when_publishing_fails(tmp_path, monkeypatch, true_model):
+    monkeypatch.setattr(registry, "root", str(tmp_path))
+    state_path = str(tmp_path / "state.npz")
+    days = make_days(10, *true_model)
+    update_price_model(to_market_index(days[:5]), state_path)
+    version = registry.active_version("pricing")
+
+    def fail(w, b):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pricing, "save_weights", fail)
+    new_days = to_market_index(days[5:], date(2022, 1, 6))
+    with pytest.raises(OSError):
+        update_price_model(new_days, state_path)
+    assert sorted(OnlinePriceModel.load(state_path).history)[-1] == date(2022, 1, 5)
+
+    # the days are learned once publishing works again
+    monkeypatch.undo()
+    monkeypatch.setattr(registry, "root", str(tmp_path))
+    assert update_price_model(new_days, state_path) == 5
+    assert registry.active_version("pricing") != version
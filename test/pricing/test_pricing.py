@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pricing import predict_price_batch, predict_price_tomorrow
+
+
+def make_market_index(days: int, markets=("N2EX",)) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2022-01-01", periods=days, freq="D")
+    return pd.DataFrame(
+        [
+            {
+                "date": day.strftime("%Y-%m-%d %H:%M:%S"),
+                "period": period,
+                "price": rng.uniform(50, 250),
+                "market": market,
+            }
+            for market in markets
+            for day in dates
+            for period in range(1, 25)
+        ]
+    )
+
+
+def test_predict_price_batch_matches_single_day():
+    market_index = make_market_index(5)
+    result = predict_price_batch(market_index)
+
+    assert list(result.columns) == ["time", "price"]
+    assert len(result) == 5 * 24
+
+    for i, (_, day) in enumerate(market_index.groupby("date")):
+        expected = predict_price_tomorrow(day[["date", "period", "price"]].copy())
+        got = result.iloc[i * 24 : (i + 1) * 24].reset_index(drop=True)
+        assert (got.time == expected.time).all()
+        assert np.allclose(got.price, expected.price)
+
+
+def test_predict_price_batch_group_by_market():
+    market_index = make_market_index(3, markets=("N2EX", "EPEX"))
+    result = predict_price_batch(market_index, group_by=["market"])
+
+    assert len(result) == 2 * 3 * 24
+    assert set(result.market) == {"N2EX", "EPEX"}
+    for market, rows in result.groupby("market"):
+        single = predict_price_batch(market_index[market_index.market == market])
+        assert np.allclose(rows.price, single.price)
+
+
+def test_predict_price_batch_fills_missing_hours():
+    market_index = make_market_index(1)
+    expected = predict_price_tomorrow(market_index.drop(index=[5, 6]).copy())
+    result = predict_price_batch(market_index.drop(index=[5, 6]))
+    assert np.allclose(result.price, expected.price)
+
+    extra_hour = market_index.iloc[[-1]].assign(period=25)
+    with pytest.raises(AssertionError):
+        predict_price_batch(pd.concat([market_index, extra_hour]))
@@ -0,0 +1,85 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from src.storage import MariaDBStorage, SQLiteStorage, Storage
+
+
+@pytest.fixture
+def storage():
+    storage = SQLiteStorage.connect(":memory:")
+    yield storage
+    storage.close()
+
+
+def test_schema_has_time_indexes(storage):
+    indexes = {
+        row[0]
+        for row in storage.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        ).fetchall()
+    }
+    assert {"idx_energy_onsite_time", "idx_carbon_dioxide_time"} <= indexes
+    assert storage.stats() == {
+        "energy_onsite": 0,
+        "carbon_dioxide": 0,
+        "powerPrediction": 0,
+        "pricePrediction": 0,
+    }
+
+
+def test_read_template_binds_parameters(storage):
+    prices = pd.DataFrame(
+        {"time": pd.date_range("2022-01-01", periods=72, freq="H"), "price": 1.0}
+    )
+    storage.upsert(
+        "pricePrediction",
+        ["price"],
+        [
+            (t.strftime("%Y-%m-%d %H:%M:%S"), p)
+            for t, p in zip(prices.time, prices.price)
+        ],
+    )
+
+    # same template syntax as the bidders' queries
+    frame = storage.read_template(
+        'SELECT * FROM pricePrediction WHERE time > "{start_date}" AND time < "{end_date}"',
+        start_date=date(2022, 1, 2),
+        end_date=datetime(2022, 1, 3, 12),
+    )
+    assert len(frame) == 36
+    assert frame.time.dtype.kind == "M"
+    assert frame.time.min() == pd.Timestamp("2022-01-02 00:00")
+
+    # values are never formatted into the SQL
+    frame = storage.read_template(
+        'SELECT * FROM pricePrediction WHERE time < "{start_date}"',
+        start_date='2022" OR "1" = "1',
+    )
+    assert frame.empty
+
+
+def test_upsert_queries():
+    assert MariaDBStorage(None).upsert_query("pricePrediction", ["price"]) == (
+        "INSERT INTO pricePrediction (time, price) VALUES (?, ?)"
+        " ON DUPLICATE KEY UPDATE price = VALUES(price)"
+    )
+    assert SQLiteStorage(None).upsert_query("pricePrediction", ["price"]) == (
+        "INSERT INTO pricePrediction (time, price) VALUES (?, ?)"
+        " ON CONFLICT(time) DO UPDATE SET price = excluded.price"
+    )
+
+
+def test_backends_implement_the_dialect_hooks():
+    with pytest.raises(TypeError):
+        Storage(None)
+
+    class Partial(Storage):
+        dialect = "partial"
+
+        def upsert_query(self, table, columns):
+            return ""
+
+    with pytest.raises(TypeError):
+        Partial(None)
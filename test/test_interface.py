@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+DUMMY_DATA = (
+    Path(__file__).absolute().parent.parent.parent
+    / "agile_snails_coding_challenge/dummy_data"
+)
+
+
+@pytest.mark.skipif(not DUMMY_DATA.is_dir(), reason="mocked API data not available")
+def test_get_price_and_quantity_concurrent():
+    """Evaluating dates in parallel gives the same bids as evaluating them serially."""
+    from team_7564616d_interface import get_price_and_quantity
+
+    dates = [date(2022, 1, 2) + timedelta(days=i) for i in range(8)]
+    expected = [get_price_and_quantity(d) for d in dates]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(get_price_and_quantity, dates))
+
+    for want, got in zip(expected, results):
+        assert want.equals(got)